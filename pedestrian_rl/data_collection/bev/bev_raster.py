@@ -0,0 +1,117 @@
+'''
+Carla-free BEV rasterization kernels.
+
+These functions only take NumPy arrays, so the same code renders BEVs in the main process
+(BEVWrapper.render_many) and in the BEV render pool worker processes (bev_render_pool.py).
+Output layout matches BEVSample.get_bev(): channels (lane, sidewalk, shoulder, vehicle, pedestrian).
+'''
+import cv2
+import numpy as np
+
+from ...utils.geometry import world_to_bev_pixels, local_to_world_2d
+
+
+def pixel_local_grid(width, height, pixel_per_meter):
+    '''
+    (H * W, 2) local [right, forward] offsets of every BEV pixel center.
+    Inverse of the truncating projection in geometry.world_to_bev_pixels.
+    '''
+    rows, cols = np.mgrid[0:height, 0:width]
+    right = (cols + 0.5 - width // 2) / pixel_per_meter
+    forward = (height // 2 - rows - 0.5) / pixel_per_meter
+    return np.stack([right, forward], axis=-1).reshape(-1, 2)
+
+
+def crop_static_layers(grid, origin_xy, resolution, lane_codes, local_grid, hero_xy, hero_yaw, width, height):
+    '''
+    Gather the static layers of K heroes from a world-aligned lane-type raster.
+
+    Args:
+        grid: (rows, cols) integer lane-type raster, rows along y and columns along x.
+        origin_xy: World (x_min, y_min) of the raster lower corner.
+        resolution: Raster cell size in meters.
+        lane_codes: Lane type codes drawn into the output channels, in channel order.
+        local_grid: (H * W, 2) output of pixel_local_grid.
+        hero_xy: (K, 2) hero positions.
+        hero_yaw: (K,) hero yaw angles in radians.
+
+    Returns:
+        static: (K, H, W, len(lane_codes)) uint8 layers (255 where the lane type matches).
+        inside: (K,) bool, False for heroes whose footprint leaves the raster.
+    '''
+    num_heroes = len(hero_xy)
+    world_points = hero_xy[:, None, :] + local_to_world_2d(local_grid[None], hero_yaw[:, None])
+
+    cols = np.floor((world_points[..., 0] - origin_xy[0]) / resolution).astype(np.int64)
+    rows = np.floor((world_points[..., 1] - origin_xy[1]) / resolution).astype(np.int64)
+    inside_px = (rows >= 0) & (rows < grid.shape[0]) & (cols >= 0) & (cols < grid.shape[1])
+
+    lane_types = np.zeros(rows.shape, dtype=grid.dtype)
+    lane_types[inside_px] = grid[rows[inside_px], cols[inside_px]]
+    lane_types = lane_types.reshape(num_heroes, height, width)
+
+    static = np.zeros((num_heroes, height, width, len(lane_codes)), dtype=np.uint8)
+    for channel, lane_code in enumerate(lane_codes):
+        static[..., channel] = (lane_types == lane_code) * 255
+
+    return static, inside_px.all(axis=1)
+
+
+def draw_dynamic_layers(
+        out,
+        hero_ids,
+        hero_xy,
+        hero_yaw,
+        walker_ids,
+        walker_xy,
+        vehicle_corners,
+        pixel_per_meter,
+        hero_ped_size,
+        other_ped_size,
+        vehicle_channel=3,
+        walker_channel=4,
+    ):
+    '''
+    Draw vehicle boxes and walker circles of K heroes into out (K, H, W, C) in place.
+
+    All vehicle corners (V, 4, 2) and walker centers (N, 2) are projected for all heroes in
+    one call each; per hero only visible actors are rasterized. Walkers are drawn in the
+    given order, the hero in color 100 with hero_ped_size and others in 255.
+    '''
+    num_heroes, height, width = out.shape[:3]
+    vehicle_pixels = world_to_bev_pixels(
+        vehicle_corners[None], hero_xy[:, None, None, :], hero_yaw[:, None, None],
+        width, height, pixel_per_meter,
+    ).astype(np.int32)                                                      # (K, V, 4, 2)
+    walker_pixels = world_to_bev_pixels(
+        walker_xy[None], hero_xy[:, None, :], hero_yaw[:, None],
+        width, height, pixel_per_meter,
+    )                                                                       # (K, N, 2)
+
+    vehicle_visible = (
+        (vehicle_pixels[..., 0].max(axis=-1) >= 0) & (vehicle_pixels[..., 0].min(axis=-1) < width)
+        & (vehicle_pixels[..., 1].max(axis=-1) >= 0) & (vehicle_pixels[..., 1].min(axis=-1) < height)
+    )
+    walker_visible = (
+        (walker_pixels[..., 0] >= 0) & (walker_pixels[..., 0] < width)
+        & (walker_pixels[..., 1] >= 0) & (walker_pixels[..., 1] < height)
+    )
+
+    for k in range(num_heroes):
+        vehicle_canvas = np.ascontiguousarray(out[k, :, :, vehicle_channel])
+        # One fillPoly per box: a multi-polygon call leaves holes where boxes overlap
+        for polygon in vehicle_pixels[k][vehicle_visible[k]]:
+            cv2.fillPoly(vehicle_canvas, [polygon], color=255)
+        out[k, :, :, vehicle_channel] = vehicle_canvas
+
+        walker_canvas = np.ascontiguousarray(out[k, :, :, walker_channel])
+        for idx in np.flatnonzero(walker_visible[k]):
+            if walker_ids[idx] == hero_ids[k]:
+                color, radius = 100, hero_ped_size
+            else:
+                color, radius = 255, other_ped_size
+            px, py = walker_pixels[k, idx]
+            cv2.circle(walker_canvas, (int(px), int(py)), radius=radius, color=color, thickness=-1)
+        out[k, :, :, walker_channel] = walker_canvas
+
+    return out
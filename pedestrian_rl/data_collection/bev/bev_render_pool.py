@@ -0,0 +1,260 @@
+import multiprocessing as mp
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ...utils.config_loader import load_config
+from .bev_raster import pixel_local_grid, crop_static_layers, draw_dynamic_layers
+
+
+def _render_worker(static_spec, output_spec, render_params, task_queue, result_queue):
+    '''
+    Worker loop: attach to the shared static raster and output ring, then render the hero
+    chunks received on task_queue until a None sentinel arrives.
+    '''
+    static_shm = shared_memory.SharedMemory(name=static_spec["name"])
+    output_shm = shared_memory.SharedMemory(name=output_spec["name"])
+    try:
+        grid = np.ndarray(static_spec["shape"], dtype=static_spec["dtype"], buffer=static_shm.buf)
+        ring = np.ndarray(output_spec["shape"], dtype=np.uint8, buffer=output_shm.buf)
+        local_grid = pixel_local_grid(render_params["width"], render_params["height"], render_params["pixel_per_meter"])
+
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+
+            slot, start, end = task["slot"], task["start"], task["end"]
+            out = ring[slot, start:end]
+            static, inside = crop_static_layers(
+                grid,
+                static_spec["origin_xy"],
+                static_spec["resolution"],
+                static_spec["lane_codes"],
+                local_grid,
+                task["hero_xy"],
+                task["hero_yaw"],
+                render_params["width"],
+                render_params["height"],
+            )
+            out[..., :static.shape[-1]] = static
+            out[..., static.shape[-1]:] = 0
+            draw_dynamic_layers(
+                out,
+                task["hero_ids"],
+                task["hero_xy"],
+                task["hero_yaw"],
+                task["walker_ids"],
+                task["walker_xy"],
+                task["vehicle_corners"],
+                render_params["pixel_per_meter"],
+                render_params["hero_ped_size"],
+                render_params["other_ped_size"],
+            )
+            result_queue.put((slot, start, inside))
+    finally:
+        static_shm.close()
+        output_shm.close()
+
+
+class BEVRenderPool:
+    '''
+    Process pool that renders orthographic BEVs off the CARLA client thread.
+
+    The static lane-type raster of the BEVWrapper is copied once into shared memory, and
+    every worker attaches to it. Per tick the main process extracts one compact actor
+    snapshot (hero poses, walker centers, vehicle corners) with BEVWrapper.extract_scene,
+    splits the heroes into contiguous chunks, and the workers write finished (H, W, 5)
+    BEVs straight into a shared-memory output ring. Results are identical to
+    BEVWrapper.render_many.
+
+    Attributes:
+        bev_wrapper: BEVWrapper providing the BEV parameters, static raster and scene extraction.
+        num_workers: Number of worker processes.
+        ring_size: Number of output slots; a returned view stays valid for ring_size - 1 more calls.
+        max_heroes: Maximum number of heroes rendered in one call.
+
+    Methods:
+        submit(heroes, snapshot=None):
+            Extract the scene and dispatch rendering; returns a ticket without waiting.
+
+        collect(ticket, copy=True):
+            Wait for a submitted render and return the (K, H, W, 5) uint8 stack.
+
+        render_many(heroes, snapshot=None, copy=True):
+            submit + collect, a drop-in for BEVWrapper.render_many.
+
+        close():
+            Stop the workers and release the shared memory.
+    '''
+    config = load_config("sim_config.json")["bev"].get("render_pool", {})
+
+    def __init__(
+            self,
+            bev_wrapper,
+            num_workers: int = config.get("num_workers", 0),
+            ring_size: int = config.get("ring_size", 2),
+            max_heroes: int = config.get("max_heroes", 64),
+        ):
+        if num_workers <= 0:
+            raise ValueError("BEVRenderPool needs num_workers > 0; use BEVWrapper.render_many in-process instead")
+
+        self.bev_wrapper = bev_wrapper
+        self.num_workers = int(num_workers)
+        self.ring_size = int(ring_size)
+        self.max_heroes = int(max_heroes)
+        self.next_slot = 0
+        self.pending = {}
+        self.workers = []
+
+        # ----- shared static raster -----
+        raster = bev_wrapper.get_static_raster()
+        grid = np.ascontiguousarray(raster.grid)
+        self.static_shm = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+        np.ndarray(grid.shape, dtype=grid.dtype, buffer=self.static_shm.buf)[:] = grid
+        static_spec = {
+            "name": self.static_shm.name,
+            "shape": grid.shape,
+            "dtype": grid.dtype.str,
+            "origin_xy": (raster.x_min, raster.y_min),
+            "resolution": raster.resolution,
+            "lane_codes": bev_wrapper.STATIC_LANE_CODES,
+        }
+
+        # ----- shared output ring -----
+        self.output_shape = (
+            self.ring_size, self.max_heroes, bev_wrapper.height, bev_wrapper.width, len(bev_wrapper.LAYER_ORDER)
+        )
+        self.output_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.output_shape)))
+        self.ring = np.ndarray(self.output_shape, dtype=np.uint8, buffer=self.output_shm.buf)
+        output_spec = {"name": self.output_shm.name, "shape": self.output_shape}
+
+        render_params = {
+            "width": bev_wrapper.width,
+            "height": bev_wrapper.height,
+            "pixel_per_meter": bev_wrapper.pixel_per_meter,
+            "hero_ped_size": bev_wrapper.hero_ped_size,
+            "other_ped_size": bev_wrapper.other_ped_size,
+        }
+
+        # spawn: workers must not inherit the CARLA client threads
+        context = mp.get_context("spawn")
+        self.task_queue = context.Queue()
+        self.result_queue = context.Queue()
+        for _ in range(self.num_workers):
+            worker = context.Process(
+                target=_render_worker,
+                args=(static_spec, output_spec, render_params, self.task_queue, self.result_queue),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+        print(
+            f"[BEVRenderPool] Started {self.num_workers} workers "
+            f"(ring {self.ring_size} x {self.max_heroes} heroes, {self.output_shm.size / 1e6:.1f} MB)"
+        )
+
+    def submit(self, heroes, snapshot=None):
+        heroes = list(heroes)
+        if len(heroes) > self.max_heroes:
+            raise ValueError(f"{len(heroes)} heroes exceed max_heroes={self.max_heroes}")
+
+        slot = self.next_slot
+        if slot in self.pending:
+            raise RuntimeError(f"Output slot {slot} is still in flight; collect it before submitting more")
+        self.next_slot = (slot + 1) % self.ring_size
+
+        scene = self.bev_wrapper.extract_scene(snapshot)
+        hero_ids, hero_xy, hero_yaw = self.bev_wrapper.get_hero_poses(heroes, scene["snapshot"])
+
+        chunk_size = int(np.ceil(len(heroes) / self.num_workers)) if len(heroes) > 0 else 0
+        starts = list(range(0, len(heroes), max(chunk_size, 1)))
+        for start in starts:
+            end = min(start + chunk_size, len(heroes))
+            self.task_queue.put({
+                "slot": slot,
+                "start": start,
+                "end": end,
+                "hero_ids": hero_ids[start:end],
+                "hero_xy": hero_xy[start:end],
+                "hero_yaw": hero_yaw[start:end],
+                "walker_ids": scene["walker_ids"],
+                "walker_xy": scene["walker_xy"],
+                "vehicle_corners": scene["vehicle_corners"],
+            })
+
+        self.pending[slot] = {
+            "heroes": heroes,
+            "remaining": len(starts),
+            "inside": np.ones(len(heroes), dtype=bool),
+        }
+        return slot
+
+    def collect(self, ticket, copy=True, timeout=30.0):
+        while self.pending[ticket]["remaining"] > 0:
+            try:
+                slot, start, inside = self.result_queue.get(timeout=timeout)
+            except queue.Empty as exc:
+                raise RuntimeError("Timed out waiting for BEV render workers") from exc
+            self.pending[slot]["remaining"] -= 1
+            self.pending[slot]["inside"][start:start + len(inside)] = inside
+
+        job = self.pending.pop(ticket)
+        bev = self.ring[ticket, :len(job["heroes"])]
+
+        # Heroes outside the shared raster are redrawn in-process, as in render_many
+        if not job["inside"].all():
+            static = np.ascontiguousarray(bev[..., :3])
+            self.bev_wrapper.fill_static_outside_raster(static, job["heroes"], job["inside"])
+            bev[..., :3] = static
+
+        return bev.copy() if copy else bev
+
+    def render_many(self, heroes, snapshot=None, copy=True):
+        return self.collect(self.submit(heroes, snapshot), copy=copy)
+
+    def close(self):
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+
+        for shm in (self.static_shm, self.output_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.static_shm = None
+        self.output_shm = None
+        self.ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def build_bev_render_pool(bev_wrapper, num_workers=None):
+    '''
+    Return a BEVRenderPool for bev_wrapper when render_pool.num_workers > 0 and the wrapper
+    supports batched rendering (orthographic BEVWrapper), otherwise None. A pool configured
+    for another wrapper (e.g. the default SemanticBEVWrapper collector) is reported, since
+    rendering then stays in-process.
+    '''
+    if num_workers is None:
+        num_workers = BEVRenderPool.config.get("num_workers", 0)
+    if num_workers <= 0:
+        return None
+    if not hasattr(bev_wrapper, "extract_scene"):
+        print(
+            f"[build_bev_render_pool] Warning: bev.render_pool.num_workers={num_workers} is ignored, "
+            f"{type(bev_wrapper).__name__} has no batched renderer (orthographic BEVWrapper only); "
+            f"rendering in-process"
+        )
+        return None
+    return BEVRenderPool(bev_wrapper, num_workers=num_workers)
@@ -3,6 +3,10 @@ import carla
 import cv2
 import time
 from ...utils.config_loader import load_config
+from ...utils.geometry import world_to_bev_pixels, world_to_local_2d, local_to_world_2d, obb_corners
+from ...utils.lane_grid import LaneTypeGrid
+from ...utils.spatial_index import ActorSpatialIndex
+from .bev_raster import pixel_local_grid, crop_static_layers, draw_dynamic_layers
 import math
 
 
@@ -33,21 +37,46 @@ class BEVWrapper:
         world_to_pixel(target_location):
             Convert a world location into BEV pixel coordinates relative to the hero actor.
 
+        world_to_pixels(points, hero_pose=None):
+            Batched version of world_to_pixel for an (N, 2+) array of world points.
+
         draw_actor_layers(actor_type):
             Draw a binary layer for dynamic actors of the given type, such as walkers or vehicles.
 
-        draw_road_layers():
+        draw_road_layers(margin=0.0, hero_transform=None):
             Draw the static road-related BEV layers, including drivable lanes and sidewalks.
 
+        get_static_layers():
+            Return the static layers, reusing the hero's cached render when it barely moved.
+
+        get_static_cache_stats():
+            Report static cache hit rate and mean per-BEV latency.
+
+        render_many(heroes, snapshot=None):
+            Render the (K, H, W, 5) BEV stack of K heroes from one world snapshot. Scene
+            extraction and projection are shared by all heroes, and the static layers are
+            cropped from a cached lane-type raster.
+
         show_target_pedestrian():
             Draw the current hero actor in the CARLA world for visualization and debugging.
     '''
     config = load_config("sim_config.json")["bev"]
-    def __init__(self, cfg, world):
+    LAYER_ORDER = ("lane", "sidewalk", "shoulder", "vehicle", "pedestrian")
+    # Channel holding the hero pedestrian (value 100), see bev_packing
+    HERO_CHANNEL = LAYER_ORDER.index("pedestrian")
+    STATIC_LANE_CODES = (
+        int(carla.LaneType.Driving),
+        int(carla.LaneType.Sidewalk),
+        int(carla.LaneType.Shoulder),
+    )
+
+    def __init__(self, cfg, world, static_raster: LaneTypeGrid = None):
         self.image = None
         self.world = world
         self.hero_actor = None
         self.actor_list = None
+        self.static_raster = static_raster
+        self.pixel_local_grid = None
         if cfg is not None:
             self.config = cfg
         else:
@@ -60,147 +89,386 @@ class BEVWrapper:
         self.other_ped_size = self.config["other_ped_size"]
         self.step_size = self.config["step_size"]
 
+        # Static layer cache: reuse (shift / rotate) the last road render of each hero while
+        # its motion since that render stays under the thresholds
+        static_cache_cfg = self.config.get("static_cache", {})
+        self.static_cache_enabled = bool(static_cache_cfg.get("enabled", False))
+        self.max_static_translation = float(static_cache_cfg.get("max_translation", 1.0))
+        self.max_static_rotation = np.radians(static_cache_cfg.get("max_rotation_deg", 5.0))
+        self.max_static_cache_heroes = int(static_cache_cfg.get("max_heroes", 256))
+        half_diagonal = np.hypot(self.bev_range / 2, self.bev_range / 2)
+        self.static_margin = (
+            self.max_static_translation
+            + half_diagonal * np.sin(self.max_static_rotation)
+            + self.step_size
+        )
+        self.static_cache = {}
+        self.static_cache_stats = {"hits": 0, "misses": 0, "bev_count": 0, "bev_time": 0.0}
+
 
     def get_bev_data(self):
         '''
         Return a dictionary of these layers, which can be stacked into a tensor later.
         '''
+        start_time = time.perf_counter()
         self.actor_list = self.world.get_actors()
-        lane_canvas, sidewalks_canvas, shoulder_canvas = self.draw_road_layers()
-        return {
-            "lane": lane_canvas,
-            "sidewalk": sidewalks_canvas,
-            "shoulder": shoulder_canvas,
+        static_layers = self.get_static_layers()
+        layers = {
+            "lane": static_layers[..., 0],
+            "sidewalk": static_layers[..., 1],
+            "shoulder": static_layers[..., 2],
             "vehicle": self.draw_actor_layers("vehicle"),
             "pedestrian": self.draw_actor_layers("walker"),
             }
-    
+        self.static_cache_stats["bev_count"] += 1
+        self.static_cache_stats["bev_time"] += time.perf_counter() - start_time
+        return layers
 
-    def world_to_pixel(self, target_location):
+    def get_static_layers(self):
         '''
-        Transform world location to image pixel
+        Return the (H, W, 3) lane / sidewalk / shoulder layers of the hero. With the static
+        cache enabled, a padded render is kept per hero and warped to the current pose while
+        the hero moved less than max_translation and turned less than max_rotation_deg.
+        The warp is an approximation (about 2% of the pixels differ from a fresh render),
+        so the cache is off by default.
         '''
+        if not self.static_cache_enabled:
+            return np.stack(self.draw_road_layers(), axis=-1)
+
         hero_transform = self.hero_actor.get_transform()
-        hero_location = hero_transform.location
-        yaw = np.radians(hero_transform.rotation.yaw)
+        hero_xy, hero_yaw = self.pose_from_transform(hero_transform)
+        entry = self.static_cache.get(self.hero_actor.id)
+        if entry is not None:
+            translation = float(np.linalg.norm(hero_xy - entry["xy"]))
+            rotation = abs(float(np.arctan2(np.sin(hero_yaw - entry["yaw"]), np.cos(hero_yaw - entry["yaw"]))))
+            if translation <= self.max_static_translation and rotation <= self.max_static_rotation:
+                self.static_cache_stats["hits"] += 1
+                return self.shift_static_layers(entry, hero_xy, hero_yaw)
+
+        self.static_cache_stats["misses"] += 1
+        entry = {
+            "xy": hero_xy,
+            "yaw": hero_yaw,
+            "layers": np.stack(self.draw_road_layers(margin=self.static_margin, hero_transform=hero_transform), axis=-1),
+        }
+        self.static_cache.pop(self.hero_actor.id, None)
+        self.static_cache[self.hero_actor.id] = entry
+        while len(self.static_cache) > self.max_static_cache_heroes:
+            self.static_cache.pop(next(iter(self.static_cache)))
+
+        pad = (entry["layers"].shape[0] - self.height) // 2
+        return entry["layers"][pad:pad + self.height, pad:pad + self.width].copy()
+
+    def shift_static_layers(self, entry, hero_xy, hero_yaw):
+        '''
+        Warp a cached padded static render taken at (entry["xy"], entry["yaw"]) to the
+        current hero pose with one nearest-neighbor affine warp.
+        '''
+        padded_height, padded_width = entry["layers"].shape[:2]
 
-        dx = target_location.x - hero_location.x
-        dy = target_location.y - hero_location.y
+        # Continuous OpenCV coordinates of dst pixels (0, 0), (1, 0), (0, 1) in the cached render
+        dst = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+        local = np.stack([
+            (dst[:, 0] + 0.5 - self.width // 2) / self.pixel_per_meter,
+            (self.height // 2 - dst[:, 1] - 0.5) / self.pixel_per_meter,
+        ], axis=-1)
+        world = hero_xy + local_to_world_2d(local, hero_yaw)
+        cached_local = world_to_local_2d(world - entry["xy"], entry["yaw"])
+        src_x = padded_width // 2 + cached_local[:, 0] * self.pixel_per_meter - 0.5
+        src_y = padded_height // 2 - cached_local[:, 1] * self.pixel_per_meter - 0.5
+
+        dst_to_src = np.array([
+            [src_x[1] - src_x[0], src_x[2] - src_x[0], src_x[0]],
+            [src_y[1] - src_y[0], src_y[2] - src_y[0], src_y[0]],
+        ], dtype=np.float64)
+        return cv2.warpAffine(
+            entry["layers"],
+            dst_to_src,
+            (self.width, self.height),
+            flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=0,
+        )
+
+    def get_static_cache_stats(self):
+        '''
+        Static cache hit rate and mean per-BEV latency of get_bev_data since the last reset.
+        '''
+        stats = self.static_cache_stats
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": stats["hits"] / lookups if lookups > 0 else 0.0,
+            "bev_count": stats["bev_count"],
+            "mean_bev_ms": stats["bev_time"] / stats["bev_count"] * 1000.0 if stats["bev_count"] > 0 else 0.0,
+        }
+
+    def reset_static_cache(self):
+        self.static_cache = {}
+        self.static_cache_stats = {"hits": 0, "misses": 0, "bev_count": 0, "bev_time": 0.0}
+    
 
-        # Hero local axes in world frame
-        forward_x = np.cos(yaw)
-        forward_y = np.sin(yaw)
-        right_x = -np.sin(yaw)
-        right_y =  np.cos(yaw)
+    def get_hero_pose(self):
+        '''
+        Fetch the hero transform once and return (hero_xy, hero_yaw_rad) for batched projection.
+        '''
+        return self.pose_from_transform(self.hero_actor.get_transform())
 
-        # Project world delta onto hero frame
-        local_forward = dx * forward_x + dy * forward_y
-        local_right   = dx * right_x   + dy * right_y
+    @staticmethod
+    def pose_from_transform(transform):
+        '''
+        (xy, yaw_rad) of a transform that was already fetched, so callers that also need the
+        transform itself make a single get_transform() call.
+        '''
+        xy = np.array([transform.location.x, transform.location.y], dtype=np.float64)
+        return xy, np.radians(transform.rotation.yaw)
 
-        # Map to image: right -> +x, forward -> up (-y)
-        px = int(self.width  // 2 + local_right   * self.pixel_per_meter)
-        py = int(self.height // 2 - local_forward * self.pixel_per_meter)
+    def world_to_pixels(self, points, hero_pose=None):
+        '''
+        Transform an (N, 2+) array of world points to (N, 2) image pixels in one call
+        '''
+        hero_xy, hero_yaw = self.get_hero_pose() if hero_pose is None else hero_pose
+        return world_to_bev_pixels(points, hero_xy, hero_yaw, self.width, self.height, self.pixel_per_meter)
 
-        return px, py
+    def world_to_pixel(self, target_location):
+        '''
+        Transform world location to image pixel
+        '''
+        px, py = self.world_to_pixels([[target_location.x, target_location.y]])[0]
+        return int(px), int(py)
     
     def draw_actor_layers(self, actor_type):
         '''
         Draw layers for actors (walkers and vehicles)
         '''
         canvas = np.zeros((self.height, self.width), dtype=np.uint8)
-        actors = self.actor_list.filter(actor_type + ".*")
-        
-        for actor in actors:
-            extent = actor.bounding_box.extent
-            
-            # Pedestrians (Walkers) as Circles
-            if actor_type == "walker":
+        index = ActorSpatialIndex.for_tick(self.world, actor_list=self.actor_list)
+
+        # Only actors that can reach the image: BEV half diagonal plus the largest box
+        hero_pose = self.get_hero_pose()
+        cull_radius = self.bev_range / 2 * math.sqrt(2) + index.max_extent + 1.0
+        rows = index.query_radius(hero_pose[0], cull_radius, actor_type)
+        if len(rows) == 0:
+            return canvas
+        centers = index.xyz[rows, :2]
+
+        # Pedestrians (Walkers) as Circles
+        if actor_type == "walker":
+            pixels = self.world_to_pixels(centers, hero_pose)
+            for actor_id, (px, py) in zip(index.ids[rows], pixels):
                 # hero pedestrin (larger mark and lighter feature)
-                if actor.id == self.hero_actor.id:
+                if actor_id == self.hero_actor.id:
                     color = 100
                     radius = self.hero_ped_size
                 else:    
                     color = 255
                     radius = self.other_ped_size   
-                px, py = self.world_to_pixel(actor.get_location())
                 if 0 <= px < self.width and 0 <= py < self.height:
-                    cv2.circle(canvas, (px, py), radius=radius, color=color, thickness=-1)
-            
-            # Vehicles as Rotated Rectangles
-            elif actor_type == "vehicle":
-                # Get the 4 corners of the vehicle in world coordinates
-                transform = actor.get_transform()
-                # Calculate the 4 corners relative to the vehicle center
-                corners = [
-                    carla.Location(x=-extent.x, y=-extent.y),
-                    carla.Location(x=extent.x, y=-extent.y),
-                    carla.Location(x=extent.x, y=extent.y),
-                    carla.Location(x=-extent.x, y=extent.y)
-                ]
-                
-                # Transform corners to world coordinates, then to pixels
-                pixel_corners = []
-                for corner in corners:
-                    world_corner = transform.transform(corner)
-                    px, py = self.world_to_pixel(world_corner)
-                    pixel_corners.append([px, py])
-                
-                # Draw the rotated rectangle
-                cv2.fillPoly(canvas, [np.array(pixel_corners, dtype=np.int32)], color=255)
+                    cv2.circle(canvas, (int(px), int(py)), radius=radius, color=color, thickness=-1)
+
+        # Vehicles as Rotated Rectangles
+        elif actor_type == "vehicle":
+            # (V, 4, 2) world corners -> (V, 4, 2) pixels
+            corners = obb_corners(centers, index.yaw[rows], index.extents[rows])
+            pixel_corners = self.world_to_pixels(corners, hero_pose)
+
+            # One fillPoly per box: a multi-polygon call leaves holes where boxes overlap
+            for polygon in pixel_corners.astype(np.int32):
+                cv2.fillPoly(canvas, [polygon], color=255)
 
         return canvas
     
-    def draw_road_layers(self):
-        lane_canvas = np.zeros((self.height, self.width), dtype=np.uint8)
-        sidewalk_canvas = np.zeros((self.height, self.width), dtype=np.uint8)
-        shoulder_canvas = np.zeros((self.height, self.width), dtype=np.uint8)
-
-        search_range = self.bev_range / 2
+    def draw_road_layers(self, margin=0.0, hero_transform=None):
+        '''
+        Draw lane / sidewalk / shoulder layers by sampling waypoints around the hero.
+        margin (meters) pads the canvas on every side, so the static layer cache can shift
+        the render later without exposing empty borders. hero_transform reuses a transform
+        the caller already fetched.
+        '''
+        pad = int(np.ceil(margin * self.pixel_per_meter))
+        height = self.height + 2 * pad
+        width = self.width + 2 * pad
+        lane_canvas = np.zeros((height, width), dtype=np.uint8)
+        sidewalk_canvas = np.zeros((height, width), dtype=np.uint8)
+        shoulder_canvas = np.zeros((height, width), dtype=np.uint8)
+
+        search_range = self.bev_range / 2 + margin
         brush_size = int(self.step_size * self.pixel_per_meter) + 1
 
-        hero_transform = self.hero_actor.get_transform()
+        # One transform RPC for both the waypoint queries and the pixel projection
+        if hero_transform is None:
+            hero_transform = self.hero_actor.get_transform()
+        hero_xy, hero_yaw = self.pose_from_transform(hero_transform)
+        world_map = self.world.get_map()
+
+        # Grid of CARLA actor-frame offsets (x forward, y right), same order as the nested loop
+        offsets = np.arange(-search_range, search_range, self.step_size)
+        grid_x, grid_y = np.meshgrid(offsets, offsets, indexing="ij")
+        local = np.stack([grid_y.ravel(), grid_x.ravel()], axis=-1)  # [right, forward]
+
+        # Project every cell at once; cells outside the canvas never need a waypoint query
+        world_xy = hero_xy + local_to_world_2d(local, hero_yaw)
+        pixels = world_to_bev_pixels(world_xy, hero_xy, hero_yaw, width, height, self.pixel_per_meter)
+        inside = (
+            (pixels[:, 0] >= 0) & (pixels[:, 0] < width) &
+            (pixels[:, 1] >= 0) & (pixels[:, 1] < height)
+        )
+        hero_z = hero_transform.location.z
+
+        # Only the waypoint lookups stay in Python
+        for (wx, wy), (px, py) in zip(world_xy[inside].tolist(), pixels[inside].tolist()):
+            wp = world_map.get_waypoint(
+                carla.Location(x=wx, y=wy, z=hero_z),
+                project_to_road=False,
+                lane_type=carla.LaneType.Any
+            )
+
+            if wp is None:
+                continue
+
+            lane_type = wp.lane_type
+
+            # decide which layer to draw on
+            if lane_type == carla.LaneType.Driving:
+                canvas = lane_canvas
+            elif lane_type == carla.LaneType.Sidewalk:
+                canvas = sidewalk_canvas
+            elif lane_type == carla.LaneType.Shoulder:
+                canvas = shoulder_canvas
+            else:
+                continue
 
-        # Loop through the bev area
-        for x in np.arange(-search_range, search_range, self.step_size):
-            for y in np.arange(-search_range, search_range, self.step_size):
-                target_vector = carla.Vector3D(x, y, 0)
-                world_location = hero_transform.transform(target_vector)
-
-                wp = self.world.get_map().get_waypoint(
-                    world_location,
-                    project_to_road=False,
-                    lane_type=carla.LaneType.Any
-                )
-
-                if wp is None:
-                    continue
-
-                px, py = self.world_to_pixel(world_location)
-                lane_type = wp.lane_type
-
-                if not (0 <= px < self.width and 0 <= py < self.height):
-                    continue
-                
-                # decide which layer to draw on
-                if lane_type == carla.LaneType.Driving:
-                    canvas = lane_canvas
-                elif lane_type == carla.LaneType.Sidewalk:
-                    canvas = sidewalk_canvas
-                elif lane_type == carla.LaneType.Shoulder:
-                    canvas = shoulder_canvas
-                else:
-                    continue
-
-                cv2.rectangle(
-                    canvas,
-                    (px - brush_size // 2, py - brush_size // 2),
-                    (px + brush_size // 2, py + brush_size // 2),
-                    color=255,
-                    thickness=-1
-                )
+            cv2.rectangle(
+                canvas,
+                (int(px) - brush_size // 2, int(py) - brush_size // 2),
+                (int(px) + brush_size // 2, int(py) + brush_size // 2),
+                color=255,
+                thickness=-1
+            )
 
         return lane_canvas, sidewalk_canvas, shoulder_canvas
     
+    def get_static_raster(self) -> LaneTypeGrid:
+        '''
+        Lazily load (or build) the lane-type raster around the configured intersection.
+        '''
+        if self.static_raster is None:
+            intersection = load_config("sim_config.json")["simulation"]["intersection"]
+            self.static_raster = LaneTypeGrid(
+                self.world.get_map(),
+                carla.Location(x=intersection["x"], y=intersection["y"], z=intersection["z"]),
+            )
+        return self.static_raster
+
+    def get_pixel_local_grid(self):
+        '''
+        Cached (H * W, 2) local offsets of every BEV pixel center.
+        '''
+        if self.pixel_local_grid is None:
+            self.pixel_local_grid = pixel_local_grid(self.width, self.height, self.pixel_per_meter)
+        return self.pixel_local_grid
+
+    def extract_scene(self, snapshot=None):
+        '''
+        Collect walker centers and vehicle corners once from a single world snapshot.
+        Actor order follows world.get_actors() so drawing order matches draw_actor_layers.
+        '''
+        if snapshot is None:
+            snapshot = self.world.get_snapshot()
+        self.actor_list = self.world.get_actors()
+        index = ActorSpatialIndex.for_tick(self.world, snapshot=snapshot, actor_list=self.actor_list)
+
+        walkers = np.flatnonzero(index.types == ActorSpatialIndex.TYPE_CODES["walker"])
+        vehicles = np.flatnonzero(index.types == ActorSpatialIndex.TYPE_CODES["vehicle"])
+        return {
+            "snapshot": snapshot,
+            "walker_ids": index.ids[walkers],
+            "walker_xy": index.xyz[walkers, :2],
+            "vehicle_corners": obb_corners(index.xyz[vehicles, :2], index.yaw[vehicles], index.extents[vehicles]),
+        }
+
+    def render_static_many(self, heroes, hero_xy, hero_yaw):
+        '''
+        Crop lane / sidewalk / shoulder layers of K heroes from the static raster in one
+        gather. Heroes whose footprint leaves the raster fall back to draw_road_layers.
+        Returns a (K, H, W, 3) uint8 array.
+        '''
+        raster = self.get_static_raster()
+        static, inside = crop_static_layers(
+            raster.grid,
+            (raster.x_min, raster.y_min),
+            raster.resolution,
+            self.STATIC_LANE_CODES,
+            self.get_pixel_local_grid(),
+            hero_xy,
+            hero_yaw,
+            self.width,
+            self.height,
+        )
+        self.fill_static_outside_raster(static, heroes, inside)
+        return static
+
+    def fill_static_outside_raster(self, static, heroes, inside):
+        '''
+        Redraw the static layers of heroes outside the raster with draw_road_layers.
+        '''
+        previous_hero = self.hero_actor
+        for k in np.flatnonzero(~np.asarray(inside)):
+            self.hero_actor = heroes[k]
+            static[k] = np.stack(self.draw_road_layers(), axis=-1)
+        self.hero_actor = previous_hero
+
+    def get_hero_poses(self, heroes, snapshot):
+        '''
+        (K,) hero ids, (K, 2) positions and (K,) yaw angles (radians) read from one snapshot.
+        '''
+        hero_ids = np.zeros(len(heroes), dtype=np.int64)
+        hero_xy = np.zeros((len(heroes), 2), dtype=np.float64)
+        hero_yaw = np.zeros(len(heroes), dtype=np.float64)
+        for k, hero in enumerate(heroes):
+            hero_snapshot = snapshot.find(hero.id)
+            transform = hero.get_transform() if hero_snapshot is None else hero_snapshot.get_transform()
+            hero_ids[k] = hero.id
+            hero_xy[k] = [transform.location.x, transform.location.y]
+            hero_yaw[k] = np.radians(transform.rotation.yaw)
+        return hero_ids, hero_xy, hero_yaw
+
+    def render_many(self, heroes, snapshot=None):
+        '''
+        Render BEVs for K heroes from one actor snapshot.
+
+        Args:
+            heroes: List of K hero actors (walkers).
+            snapshot: Optional carla.WorldSnapshot; the current one is fetched if None.
+
+        Returns:
+            (K, H, W, 5) uint8 stack with channels in LAYER_ORDER, the same layout as
+            BEVSample.get_bev().
+        '''
+        heroes = list(heroes)
+        bev = np.zeros((len(heroes), self.height, self.width, len(self.LAYER_ORDER)), dtype=np.uint8)
+        if len(heroes) == 0:
+            return bev
+
+        scene = self.extract_scene(snapshot)
+        hero_ids, hero_xy, hero_yaw = self.get_hero_poses(heroes, scene["snapshot"])
+
+        bev[..., 0:3] = self.render_static_many(heroes, hero_xy, hero_yaw)
+        draw_dynamic_layers(
+            bev,
+            hero_ids,
+            hero_xy,
+            hero_yaw,
+            scene["walker_ids"],
+            scene["walker_xy"],
+            scene["vehicle_corners"],
+            self.pixel_per_meter,
+            self.hero_ped_size,
+            self.other_ped_size,
+        )
+        return bev
+
     def show_target_pedestrian(self):
         '''
         Visualize target pedestrian in CARLA
@@ -257,6 +525,8 @@ class BEVSample:
         show_intersection_info():
             Set the spectator view and draw multiple intersection-related debug visualizations.
     '''
+    HERO_CHANNEL = BEVWrapper.HERO_CHANNEL
+
     def __init__(self, actor: carla.Walker, bev_wrapper: BEVWrapper):
         self.wrapper = bev_wrapper
         self.actor = actor
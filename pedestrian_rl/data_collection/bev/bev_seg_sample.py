@@ -8,6 +8,8 @@ import cv2
 import numpy as np
 
 from ...utils.config_loader import load_config
+from ...utils.geometry import world_to_pinhole_pixels, obb_corners
+from .semantic_mosaic import SemanticMosaic
 
 
 class SemanticBEVWrapper:
@@ -18,6 +20,11 @@ class SemanticBEVWrapper:
     points it downward, reads the raw semantic image, and converts the CARLA semantic
     tags into a compact multi-channel BEV tensor.
 
+    With use_mosaic (bev.semantic_mosaic.enabled), no camera is attached: road / sidewalk /
+    obstacle classes are cropped from a pre-captured SemanticMosaic in the hero frame, and
+    vehicles / pedestrians are drawn from actor geometry. Heroes outside the mosaic fall
+    back to the camera.
+
     Notes:
         - This is a perspective top-down semantic view, not a true orthographic map BEV.
         - We use the raw semantic tag IDs, not the CityScapes palette image.
@@ -27,6 +34,9 @@ class SemanticBEVWrapper:
     '''
 
     config = load_config("sim_config.json")["bev"]
+    # Channels of SemanticBEVSample.get_bev(); the hero pedestrian (value 100) is in HERO_CHANNEL
+    LAYER_ORDER = ("road", "sidewalk", "vehicle", "pedestrian", "obstacles")
+    HERO_CHANNEL = LAYER_ORDER.index("pedestrian")
 
     # CARLA 0.9.16 semantic tag IDs from the official sensor docs.
     TAGS = {
@@ -70,7 +80,9 @@ class SemanticBEVWrapper:
         image_size_y: Optional[int] = config["size"][1],
         fov: float = config["fov"],
         sensor_tick: float = 0.0,
-        hybrid: bool = True
+        hybrid: bool = True,
+        use_mosaic: bool = config.get("semantic_mosaic", {}).get("enabled", False),
+        mosaic: Optional[SemanticMosaic] = None,
     ):
         self.world = world
         self.hero_actor = None
@@ -97,6 +109,10 @@ class SemanticBEVWrapper:
         self.last_image = None
         self.last_tag_map = None
 
+        # Static classes cropped from a pre-captured mosaic instead of a per-hero camera
+        self.use_mosaic = bool(use_mosaic)
+        self.mosaic = mosaic
+
     def _build_sensor_bp(self):
         blueprint_library = self.world.get_blueprint_library()
         sensor_bp = blueprint_library.find("sensor.camera.semantic_segmentation")
@@ -166,6 +182,13 @@ class SemanticBEVWrapper:
         if actor is None:
             raise ValueError("actor cannot be None")
 
+        # Mosaic mode needs no camera; drop a fallback camera left on another hero
+        if self.use_mosaic:
+            if self.hero_actor is not None and self.hero_actor.id != actor.id:
+                self.destroy_sensor()
+            self.hero_actor = actor
+            return
+
         need_reattach = False
 
         if self.hero_actor is None:
@@ -286,9 +309,53 @@ class SemanticBEVWrapper:
         }
         return layers
 
+    def get_mosaic(self) -> SemanticMosaic:
+        if self.mosaic is None:
+            intersection = load_config("sim_config.json")["simulation"]["intersection"]
+            self.mosaic = SemanticMosaic(
+                self.world,
+                carla.Location(x=intersection["x"], y=intersection["y"], z=intersection["z"]),
+            )
+        return self.mosaic
+
+    def get_mosaic_layers(self):
+        '''
+        Static layers cropped from the mosaic in the hero frame, vehicles and pedestrians
+        drawn from actor geometry. Returns None when the footprint leaves the mosaic.
+        '''
+        hero_transform = self.hero_actor.get_transform()
+        tag_map, inside = self.get_mosaic().crop(
+            [hero_transform.location.x, hero_transform.location.y],
+            np.radians(hero_transform.rotation.yaw),
+            self.width,
+            self.height,
+            self.camera_height,
+            self.fov,
+        )
+        if not inside:
+            return None
+
+        self.last_tag_map = tag_map
+        layers = self.tag_map_to_layers(tag_map)
+        layers["vehicle"] = self.draw_actor_layers("vehicle")
+        layers["pedestrian"] = self.draw_actor_layers("walker")
+        return layers
+
     def get_bev_data(self):
         self.world.tick()
         self.actor_list = self.world.get_actors()
+
+        if self.use_mosaic:
+            layers = self.get_mosaic_layers()
+            if layers is not None:
+                return layers
+
+            # Outside the mosaic: fall back to the camera for this hero
+            if self.sensor is None or not self.sensor.is_alive:
+                self.attach_to_actor(self.hero_actor)
+                self.world.tick()
+                self.actor_list = self.world.get_actors()
+
         image = self._get_latest_image(timeout=20.0)
         tag_map = self.image_to_tag_map(image)
         self.last_tag_map = tag_map
@@ -335,63 +402,66 @@ class SemanticBEVWrapper:
         Draw layers for actors (walkers and vehicles)
         '''
         canvas = np.zeros((self.height, self.width), dtype=np.uint8)
-        actors = self.actor_list.filter(actor_type + ".*")
-        
-        for actor in actors:            
+        actors = list(self.actor_list.filter(actor_type + ".*"))
+        if len(actors) == 0:
+            return canvas
+
+        # Vehicles as rotated rectangles (used when static classes come from the mosaic)
+        if actor_type == "vehicle":
+            transforms = [actor.get_transform() for actor in actors]
+            corners = obb_corners(
+                np.array([[t.location.x, t.location.y] for t in transforms], dtype=np.float64),
+                np.radians([t.rotation.yaw for t in transforms]),
+                np.array([[a.bounding_box.extent.x, a.bounding_box.extent.y] for a in actors], dtype=np.float64),
+            )
+            for polygon in self.world_to_pixels(corners).astype(np.int32):
+                cv2.fillPoly(canvas, [polygon], color=255)
+            return canvas
+
+        if actor_type != "walker":
+            return canvas
+
+        # Project every walker in one call with a single hero transform fetch
+        locations = [actor.get_location() for actor in actors]
+        pixels = self.world_to_pixels([[loc.x, loc.y] for loc in locations])
+
+        for actor, (px, py) in zip(actors, pixels):
             # Pedestrians (Walkers) as Circles
-            if actor_type == "walker" and not None:
-                # hero pedestrin (larger mark and lighter feature)
-                if actor.id == self.hero_actor.id:
-                    color = 100
-                    radius = self.hero_ped_size
-                else:    
-                    color = 255
-                    radius = self.other_ped_size   
-                px, py = self.world_to_pixel(actor.get_location())
-                if 0 <= px < self.width and 0 <= py < self.height:
-                    cv2.circle(canvas, (px, py), radius=radius, color=color, thickness=-1)
+            # hero pedestrin (larger mark and lighter feature)
+            if actor.id == self.hero_actor.id:
+                color = 100
+                radius = self.hero_ped_size
+            else:    
+                color = 255
+                radius = self.other_ped_size   
+            if 0 <= px < self.width and 0 <= py < self.height:
+                cv2.circle(canvas, (int(px), int(py)), radius=radius, color=color, thickness=-1)
 
         return canvas
+
+    def world_to_pixels(self, points, hero_pose=None):
+        '''
+        Project an (N, 2+) array of world points to (N, 2) semantic camera image pixels
+        using top-down pinhole geometry.
+        '''
+        if hero_pose is None:
+            hero_transform = self.hero_actor.get_transform()
+            hero_pose = (
+                np.array([hero_transform.location.x, hero_transform.location.y], dtype=np.float64),
+                np.radians(hero_transform.rotation.yaw),
+            )
+        hero_xy, hero_yaw = hero_pose
+        return world_to_pinhole_pixels(
+            points, hero_xy, hero_yaw, self.width, self.height, self.camera_height, self.fov
+        )
     
     def world_to_pixel(self, target_location: carla.Location):
         '''
         Project world location to semantic camera image pixels
         using top-down pinhole geometry.
         '''
-
-        hero_transform = self.hero_actor.get_transform()
-        hero_location = hero_transform.location
-        yaw_rad = np.radians(hero_transform.rotation.yaw)
-
-        dx = target_location.x - hero_location.x
-        dy = target_location.y - hero_location.y
-
-        # hero local frame
-        forward_x = np.cos(yaw_rad)
-        forward_y = np.sin(yaw_rad)
-        right_x = -np.sin(yaw_rad)
-        right_y = np.cos(yaw_rad)
-
-        local_forward = dx * forward_x + dy * forward_y
-        local_right = dx * right_x + dy * right_y
-
-        # camera footprint on ground from pinhole geometry
-        half_fov_x = np.radians(self.fov * 0.5)
-        half_width_m = self.camera_height * np.tan(half_fov_x)
-
-        aspect_ratio = float(self.height) / float(self.width)
-        half_height_m = half_width_m * aspect_ratio
-
-        # normalize to [-1, 1]
-        u = local_right / half_width_m
-        v = local_forward / half_height_m
-
-        # image coords
-        px = int(round((u + 1.0) * 0.5 * (self.width - 1)))
-        py = int(round((1.0 - (v + 1.0) * 0.5) * (self.height - 1)))
-
-
-        return px, py
+        px, py = self.world_to_pixels([[target_location.x, target_location.y]])[0]
+        return int(px), int(py)
     
     def show_target_pedestrian(self):
         '''
@@ -410,6 +480,7 @@ class SemanticBEVSample:
     '''
     Helper class to fetch semantic top-down BEV for one actor.
     '''
+    HERO_CHANNEL = SemanticBEVWrapper.HERO_CHANNEL
 
     def __init__(self, actor: carla.Walker, bev_wrapper: SemanticBEVWrapper):
         self.wrapper = bev_wrapper
@@ -420,13 +491,7 @@ class SemanticBEVSample:
         self.wrapper.set_hero_actor(self.actor)
         layers = self.wrapper.get_bev_data()
 
-        self.feature_tensor = np.stack([
-            layers["road"],
-            layers["sidewalk"],
-            layers["vehicle"],
-            layers["pedestrian"],
-            layers["obstacles"],
-        ], axis=-1)
+        self.feature_tensor = np.stack([layers[name] for name in self.wrapper.LAYER_ORDER], axis=-1)
         return self.feature_tensor
 
     def visualize_bev(self):
@@ -0,0 +1,257 @@
+import os
+import queue
+import time
+
+import carla
+import numpy as np
+
+from ...utils.config_loader import load_config
+from ...utils.sim_utils import cleanup_simulation
+from ...utils.geometry import (
+    local_to_world_2d,
+    pinhole_half_extent,
+    pinhole_pixels_to_local,
+    world_to_pinhole_pixels,
+)
+
+
+class SemanticMosaic:
+    '''
+    Georeferenced top-down mosaic of CARLA semantic tags over the intersection region.
+
+    The static classes seen by SemanticBEVWrapper (road, sidewalk, buildings, ...) do not
+    change during an episode, so this class captures them once: a single downward semantic
+    camera is moved over a grid of tile centers, and every mosaic cell takes its tag from
+    the tile whose center is nearest (least parallax). The mosaic is stored per town and
+    region on disk. Per-hero static tag maps are then cropped from it in the hero frame
+    with the same pinhole footprint as the live camera, without any sensor.
+
+    Capture with an empty world: vehicles and pedestrians in view end up in the mosaic.
+
+    Attributes:
+        world: CARLA world object used for the capture.
+        town: Town name used in the cache file name.
+        x_min, y_min: World coordinates of the mosaic origin (lower corner).
+        resolution: Mosaic cell size in meters.
+        tags: (rows, cols) uint8 semantic tags, rows along y and columns along x.
+        cache_path: Path of the persisted .npz mosaic.
+
+    Methods:
+        capture():
+            Move the capture camera over all tiles and fill the mosaic.
+
+        crop(hero_xy, hero_yaw, width, height, camera_height, fov):
+            Return the (H, W) tag map seen by a top-down pinhole camera above the hero and
+            whether the whole footprint lies inside the mosaic.
+    '''
+    config = load_config("sim_config.json")["bev"].get("semantic_mosaic", {})
+    UNLABELED = 0
+    DYNAMIC_TAGS = (12, 13, 14, 15, 16, 17, 18, 19)     # pedestrian, rider, car ... bicycle
+
+    def __init__(
+            self,
+            world: carla.World,
+            location: carla.Location,
+            half_size: float = config.get("half_size", 40.0),
+            resolution: float = config.get("resolution", 0.1),
+            camera_height: float = config.get("camera_height", 50.0),
+            fov: float = config.get("fov", 20.0),
+            tile_size: int = config.get("tile_size", 512),
+            tile_overlap: float = config.get("tile_overlap", 0.2),
+            settle_ticks: int = config.get("settle_ticks", 2),
+            cache_dir: str = config.get("cache_dir", "datasets/cache/semantic_mosaic"),
+        ):
+        self.world = world
+        self.town = os.path.basename(world.get_map().name)
+        self.location = location
+        self.half_size = float(half_size)
+        self.resolution = float(resolution)
+        self.camera_height = float(camera_height)
+        self.fov = float(fov)
+        self.tile_size = int(tile_size)
+        self.tile_overlap = float(tile_overlap)
+        self.settle_ticks = int(settle_ticks)
+
+        self.x_min = float(location.x) - self.half_size
+        self.y_min = float(location.y) - self.half_size
+        self.num_cells = int(np.ceil(2.0 * self.half_size / self.resolution))
+        self.cache_path = os.path.join(
+            cache_dir,
+            f"{self.town}_x{location.x:.1f}_y{location.y:.1f}_h{self.half_size:.1f}_r{self.resolution:.2f}"
+            f"_c{self.camera_height:.0f}_f{self.fov:.0f}.npz",
+        )
+
+        self.tags = None
+        self.load_or_capture()
+
+    def load_or_capture(self):
+        if os.path.exists(self.cache_path):
+            with np.load(self.cache_path) as data:
+                self.tags = data["tags"].astype(np.uint8)
+            print(f"[SemanticMosaic] Loaded {self.tags.shape} mosaic from {self.cache_path}")
+            return
+
+        self.capture()
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.savez_compressed(
+            self.cache_path,
+            tags=self.tags,
+            origin=np.array([self.x_min, self.y_min], dtype=np.float64),
+            resolution=np.float64(self.resolution),
+            camera_height=np.float64(self.camera_height),
+            fov=np.float64(self.fov),
+        )
+        print(f"[SemanticMosaic] Saved mosaic to {self.cache_path}")
+
+    def tile_centers(self):
+        '''
+        World x / y coordinates of the tile centers. Tiles step by the camera footprint
+        shrunk by tile_overlap so neighbouring tiles overlap.
+        '''
+        half_width_m, _ = pinhole_half_extent(self.tile_size, self.tile_size, self.camera_height, self.fov)
+        stride = 2.0 * half_width_m * (1.0 - self.tile_overlap)
+        num_tiles = int(np.ceil(2.0 * self.half_size / stride))
+        offsets = (np.arange(num_tiles) - (num_tiles - 1) / 2.0) * stride
+        return self.location.x + offsets, self.location.y + offsets, stride
+
+    def _cell_centers(self):
+        centers = (np.arange(self.num_cells) + 0.5) * self.resolution
+        return self.x_min + centers, self.y_min + centers
+
+    def _wait_for_frame(self, image_queue, frame, timeout=20.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                image = image_queue.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                break
+            if image.frame >= frame:
+                return image
+        raise RuntimeError(f"Timed out waiting for semantic mosaic tile at frame {frame}")
+
+    def capture(self):
+        start_time = time.time()
+        tile_xs, tile_ys, stride = self.tile_centers()
+        cell_xs, cell_ys = self._cell_centers()
+
+        # Nearest tile of every mosaic column / row
+        tile_col = np.clip(np.rint((cell_xs - tile_xs[0]) / stride).astype(np.int64), 0, len(tile_xs) - 1)
+        tile_row = np.clip(np.rint((cell_ys - tile_ys[0]) / stride).astype(np.int64), 0, len(tile_ys) - 1)
+
+        blueprint = self.world.get_blueprint_library().find("sensor.camera.semantic_segmentation")
+        blueprint.set_attribute("image_size_x", str(self.tile_size))
+        blueprint.set_attribute("image_size_y", str(self.tile_size))
+        blueprint.set_attribute("fov", str(self.fov))
+        blueprint.set_attribute("sensor_tick", "0.0")
+
+        camera_z = self.location.z + self.camera_height
+        sensor = self.world.spawn_actor(
+            blueprint,
+            carla.Transform(
+                carla.Location(x=float(tile_xs[0]), y=float(tile_ys[0]), z=camera_z),
+                carla.Rotation(pitch=-90.0, yaw=0.0, roll=0.0),
+            ),
+        )
+        image_queue = queue.Queue()
+        sensor.listen(image_queue.put)
+
+        tags = np.full((self.num_cells, self.num_cells), self.UNLABELED, dtype=np.uint8)
+        try:
+            for i, tile_x in enumerate(tile_xs):
+                cols = np.flatnonzero(tile_col == i)
+                for j, tile_y in enumerate(tile_ys):
+                    rows = np.flatnonzero(tile_row == j)
+                    if len(cols) == 0 or len(rows) == 0:
+                        continue
+
+                    sensor.set_transform(carla.Transform(
+                        carla.Location(x=float(tile_x), y=float(tile_y), z=camera_z),
+                        carla.Rotation(pitch=-90.0, yaw=0.0, roll=0.0),
+                    ))
+                    frame = None
+                    for _ in range(self.settle_ticks):
+                        frame = self.world.tick()
+                    image = self._wait_for_frame(image_queue, frame)
+                    bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))
+                    tile_tags = bgra[:, :, 2]
+
+                    # The yaw-0 camera is a "hero" at the tile center facing world +x
+                    cell_points = np.stack(np.meshgrid(cell_xs[cols], cell_ys[rows]), axis=-1)
+                    pixels = world_to_pinhole_pixels(
+                        cell_points, (tile_x, tile_y), 0.0,
+                        self.tile_size, self.tile_size, self.camera_height, self.fov,
+                    )
+                    px = np.clip(pixels[..., 0], 0, self.tile_size - 1)
+                    py = np.clip(pixels[..., 1], 0, self.tile_size - 1)
+                    tags[np.ix_(rows, cols)] = tile_tags[py, px]
+        finally:
+            sensor.stop()
+            sensor.destroy()
+
+        dynamic_fraction = float(np.isin(tags, self.DYNAMIC_TAGS).mean())
+        if dynamic_fraction > 0:
+            print(
+                f"[SemanticMosaic] Warning: {dynamic_fraction:.2%} of the mosaic shows vehicles or "
+                f"pedestrians; capture with an empty world for a clean static mosaic"
+            )
+
+        self.tags = tags
+        print(
+            f"[SemanticMosaic] Captured {len(tile_xs) * len(tile_ys)} tiles into a {tags.shape} mosaic "
+            f"in {time.time() - start_time:.1f}s"
+        )
+
+    def crop(self, hero_xy, hero_yaw, width, height, camera_height, fov):
+        '''
+        Crop the tag map a top-down pinhole camera above the hero would see. Works for one
+        hero (hero_xy (2,), scalar yaw) or K heroes (hero_xy (K, 2), hero_yaw (K,)).
+
+        Returns:
+            tag_map: (H, W) or (K, H, W) uint8 tags, UNLABELED outside the mosaic.
+            inside: bool or (K,) bool, True when the whole footprint lies inside the mosaic.
+        '''
+        hero_xy = np.asarray(hero_xy, dtype=np.float64)
+        hero_yaw = np.asarray(hero_yaw, dtype=np.float64)
+        batched = hero_xy.ndim == 2
+        hero_xy = hero_xy.reshape(-1, 2)
+        hero_yaw = hero_yaw.reshape(-1)
+
+        pixels = np.stack(np.meshgrid(np.arange(width), np.arange(height)), axis=-1).reshape(-1, 2)
+        local = pinhole_pixels_to_local(pixels, width, height, camera_height, fov)
+        world = hero_xy[:, None, :] + local_to_world_2d(local[None], hero_yaw[:, None])
+
+        cols = np.floor((world[..., 0] - self.x_min) / self.resolution).astype(np.int64)
+        rows = np.floor((world[..., 1] - self.y_min) / self.resolution).astype(np.int64)
+        inside_px = (rows >= 0) & (rows < self.num_cells) & (cols >= 0) & (cols < self.num_cells)
+
+        tag_map = np.full(rows.shape, self.UNLABELED, dtype=np.uint8)
+        tag_map[inside_px] = self.tags[rows[inside_px], cols[inside_px]]
+        tag_map = tag_map.reshape(-1, height, width)
+        inside = inside_px.all(axis=1)
+
+        if batched:
+            return tag_map, inside
+        return tag_map[0], bool(inside[0])
+
+
+if __name__ == "__main__":
+    sim_config = load_config("sim_config.json")["simulation"]
+    client = carla.Client("localhost", 2000)
+    client.set_timeout(20.0)
+    world = client.get_world()
+
+    settings = world.get_settings()
+    settings.synchronous_mode = True
+    settings.fixed_delta_seconds = sim_config["fixed_delta_seconds"]
+    world.apply_settings(settings)
+
+    # Remove vehicles / pedestrians so only static classes are captured
+    cleanup_simulation(world)
+    world.tick()
+
+    intersection_position = carla.Location(
+        x=sim_config["intersection"]["x"],
+        y=sim_config["intersection"]["y"],
+        z=sim_config["intersection"]["z"],
+    )
+    SemanticMosaic(world, intersection_position)
@@ -0,0 +1,218 @@
+import numpy as np
+
+
+class PedColumns:
+    '''
+    Growable struct-of-arrays holding the samples of one pedestrian in one episode.
+
+    Every field is a preallocated array whose first size rows are valid; appending a sample
+    writes one row per field and doubles the capacity when it is full. BEVs, which dominate
+    the memory, go into fixed blocks of bev_block_rows rows instead, so at most one partly
+    filled block is allocated in excess and growing never copies them. There are no BEV
+    blocks in trajectory-only recording.
+
+    Attributes:
+        ped_id: Pedestrian ID.
+        size: Number of stored samples.
+        capacity: Allocated rows.
+        arrays: Field name -> (capacity, ...) array, in write_ped_arrays column names.
+        bev_blocks: List of (bev_block_rows, H, W, C) uint8 blocks, or None without BEVs.
+        scenes: Tick scene of every sample (trajectory-only recording), else None entries.
+
+    Methods:
+        append(ped_info):
+            Copy one PedestrianStateAction into the next row.
+
+        bev(row):
+            BEV of one stored sample.
+
+        columns():
+            Valid rows of every field sorted by frame_id (views when already sorted and
+            the BEVs fit in one block).
+
+        nbytes():
+            Allocated bytes of all columns.
+    '''
+    FIELDS = {
+        "frame_id": ((), np.int32),
+        "timestamp": ((), np.float64),
+        "current_location": ((3,), np.float32),
+        "velocity": ((3,), np.float32),
+        "speed": ((), np.float32),
+        "yaw_heading": ((), np.float32),
+        "goal_location": ((3,), np.float32),
+        "target_speed": ((), np.float32),
+        "target_direction": ((3,), np.float32),
+    }
+
+    def __init__(self, ped_id, initial_capacity=32, bev_block_rows=16):
+        self.ped_id = ped_id
+        self.size = 0
+        self.capacity = max(1, int(initial_capacity))
+        self.bev_block_rows = max(1, int(bev_block_rows))
+        self.arrays = {
+            name: np.empty((self.capacity,) + shape, dtype=dtype) for name, (shape, dtype) in self.FIELDS.items()
+        }
+        self.bev_blocks = None
+        self.scenes = []
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, array in self.arrays.items():
+            grown = np.empty((self.capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+
+    def append(self, ped_info):
+        state, action = ped_info.state, ped_info.action
+        bev_data = state["bev_data"]
+        if (bev_data is not None) != (self.bev_blocks is not None) and self.size > 0:
+            raise ValueError(f"Samples of ped {self.ped_id} mix samples with and without BEV")
+        if self.size == self.capacity:
+            self._grow()
+
+        row = self.size
+        arrays = self.arrays
+        arrays["frame_id"][row] = ped_info.state_action_pair["frame_id"]
+        timestamp = ped_info.state_action_pair["timestamp"]
+        arrays["timestamp"][row] = getattr(timestamp, "elapsed_seconds", timestamp)
+        if bev_data is not None:
+            block, block_row = divmod(row, self.bev_block_rows)
+            if self.bev_blocks is None:
+                self.bev_blocks = []
+            if block == len(self.bev_blocks):
+                self.bev_blocks.append(np.empty((self.bev_block_rows,) + np.shape(bev_data), dtype=np.uint8))
+            self.bev_blocks[block][block_row] = bev_data
+        arrays["current_location"][row] = state["current_location"]
+        arrays["velocity"][row] = state["velocity"]
+        arrays["speed"][row] = state["speed"]
+        arrays["yaw_heading"][row] = state["yaw_heading"]
+        goal_location = state["goal_location"]
+        if hasattr(goal_location, "x"):     # carla.Location
+            goal_location = (goal_location.x, goal_location.y, goal_location.z)
+        arrays["goal_location"][row] = goal_location
+        arrays["target_speed"][row] = action["target_speed"]
+        arrays["target_direction"][row] = action["target_direction"]
+        self.scenes.append(ped_info.scene)
+        self.size += 1
+
+    def bev(self, row):
+        return self.bev_blocks[row // self.bev_block_rows][row % self.bev_block_rows]
+
+    def columns(self):
+        columns = {name: array[:self.size] for name, array in self.arrays.items()}
+        if self.bev_blocks is not None:
+            # One block is returned as a view, several are joined with one copy
+            bev_data = self.bev_blocks[0] if len(self.bev_blocks) == 1 else np.concatenate(self.bev_blocks)
+            columns["bev_data"] = bev_data[:self.size]
+        frame_ids = columns["frame_id"]
+        if np.any(frame_ids[1:] < frame_ids[:-1]):
+            order = np.argsort(frame_ids, kind="stable")
+            columns = {name: array[order] for name, array in columns.items()}
+        return columns
+
+    def nbytes(self):
+        bev_bytes = sum(block.nbytes for block in self.bev_blocks) if self.bev_blocks is not None else 0
+        return bev_bytes + sum(array.nbytes for array in self.arrays.values())
+
+
+class SampleView:
+    '''
+    Read-only record view of one buffered sample with the PedestrianStateAction interface
+    (ped_id, state, action, state_action_pair, scene). The dicts are built on access.
+    '''
+    __slots__ = ("_columns", "_row")
+
+    def __init__(self, columns: PedColumns, row):
+        self._columns = columns
+        self._row = row
+
+    @property
+    def ped_id(self):
+        return self._columns.ped_id
+
+    @property
+    def scene(self):
+        return self._columns.scenes[self._row]
+
+    @property
+    def state(self):
+        arrays = self._columns.arrays
+        return {
+            "bev_data": self._columns.bev(self._row) if self._columns.bev_blocks is not None else None,
+            "current_location": arrays["current_location"][self._row],
+            "velocity": arrays["velocity"][self._row],
+            "speed": float(arrays["speed"][self._row]),
+            "yaw_heading": float(arrays["yaw_heading"][self._row]),
+            "goal_location": arrays["goal_location"][self._row],
+        }
+
+    @property
+    def action(self):
+        arrays = self._columns.arrays
+        return {
+            "target_speed": float(arrays["target_speed"][self._row]),
+            "target_direction": arrays["target_direction"][self._row],
+        }
+
+    @property
+    def state_action_pair(self):
+        arrays = self._columns.arrays
+        return {
+            "ped ID": self.ped_id,
+            "state": self.state,
+            "action": self.action,
+            "frame_id": int(arrays["frame_id"][self._row]),
+            "timestamp": float(arrays["timestamp"][self._row]),
+        }
+
+
+class EpisodeBuffer:
+    '''
+    Columnar episode buffer of DataSampler: one PedColumns per pedestrian.
+
+    Sampled PedestrianStateAction objects are copied into the columns on append and can be
+    dropped afterwards, so an episode holds one array row per sample instead of three dicts
+    of small arrays, and episode_ped_columns / convert_to_dataset write the columns to HDF5
+    directly. Iterating yields SampleView records grouped by pedestrian.
+
+    Attributes:
+        peds: Pedestrian ID -> PedColumns, in order of the first sample.
+        num_samples: Number of stored samples.
+
+    Methods:
+        append(ped_info):
+            Store one PedestrianStateAction sample.
+
+        ped_columns():
+            {ped_id: columns} in the write_ped_arrays layout, sorted by frame_id.
+
+        nbytes():
+            Allocated bytes of all columns.
+    '''
+
+    def __init__(self, initial_capacity=32):
+        self.initial_capacity = initial_capacity
+        self.peds = {}
+        self.num_samples = 0
+
+    def append(self, ped_info):
+        columns = self.peds.get(ped_info.ped_id)
+        if columns is None:
+            columns = self.peds[ped_info.ped_id] = PedColumns(ped_info.ped_id, self.initial_capacity)
+        columns.append(ped_info)
+        self.num_samples += 1
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        for columns in self.peds.values():
+            for row in range(columns.size):
+                yield SampleView(columns, row)
+
+    def ped_columns(self):
+        return {ped_id: columns.columns() for ped_id, columns in self.peds.items()}
+
+    def nbytes(self):
+        return sum(columns.nbytes() for columns in self.peds.values())
@@ -17,11 +17,16 @@ class PedestrianStateAction:
             and target direction.
         state_action_pair: Dictionary that groups pedestrian ID, state, action,
             frame ID, and timestamp into one record.
+        scene: Optional actor state of the sampled tick (trajectory-only recording, see
+            utils/trajectory_log.py); shared by all samples of the same tick.
 
     Methods:
         set_bev(bev_data):
             Set the BEV observation for the pedestrian state.
 
+        set_scene(scene):
+            Attach the actor state of the sampled tick.
+
         set_location(current_location):
             Set the pedestrian's current 3D location.
 
@@ -73,11 +78,15 @@ class PedestrianStateAction:
             "frame_id": frame_id,
             "timestamp": timestamp
         }
+        self.scene = None
 
     # ---------- state setter ----------
     def set_bev(self, bev_data):
         self.state["bev_data"] = bev_data
 
+    def set_scene(self, scene):
+        self.scene = scene
+
     def set_location(self, current_location: np.ndarray):
         self.state["current_location"] = current_location
 
@@ -9,6 +9,7 @@ import torch.nn.functional as F
 
 from .cnn_encoder import CNNEncoder
 from ..utils.config_loader import load_config
+from ..utils.bev_packing import HERO_CHANNEL, pack_bev, unpack_bev_torch
 
 sim_config = load_config("sim_config.json")
 MAX_SPEED = sim_config["simulation"]["pedestrian"]["speed_range"][1]
@@ -220,20 +221,39 @@ class TwinCritic(nn.Module):
 
 
 class ReplayBuffer:
-    '''Replay buffer for TD3 training.'''
+    '''
+    Replay buffer for TD3 training.
+
+    With pack_bev=True the BEVs of obs / next_obs are stored as uint8 bitplanes
+    (bev_packing.pack_bev) under "bev_packed" instead of dense float32 "bev_data",
+    about 25x less memory per transition. TD3Agent.move_obs_to_device expands them on
+    the training device. hero_channel is the HERO_CHANNEL of the BEV class producing
+    the observations.
+    '''
 
-    def __init__(self, capacity=200000):
+    def __init__(self, capacity=200000, pack_bev=False, hero_channel=HERO_CHANNEL):
         self.capacity = int(capacity)
+        self.pack_bev = bool(pack_bev)
+        self.hero_channel = int(hero_channel)
+        self.bev_width = None
         self.buffer = deque(maxlen=self.capacity)
 
     def __len__(self):
         return len(self.buffer)
 
+    def _store_bev(self, obs):
+        if not self.pack_bev:
+            return "bev_data", np.asarray(obs["bev_data"], dtype=np.float32)
+        self.bev_width = np.shape(obs["bev_data"])[1]
+        return "bev_packed", pack_bev(obs["bev_data"], hero_channel=self.hero_channel)
+
     def push(self, obs, action, reward, next_obs, done):
         '''Store one transition.'''
+        bev_key, bev = self._store_bev(obs)
+        _, next_bev = self._store_bev(next_obs)
         transition = {
             "obs": {
-                "bev_data": np.asarray(obs["bev_data"], dtype=np.float32),
+                bev_key: bev,
                 "velocity_local": np.asarray(obs["velocity_local"], dtype=np.float32),
                 "goal_rel_local": np.asarray(obs["goal_rel_local"], dtype=np.float32),
                 "yaw_sin": np.float32(obs["yaw_sin"]),
@@ -243,7 +263,7 @@ class ReplayBuffer:
             "action": np.asarray(action, dtype=np.float32),
             "reward": np.float32(reward),
             "next_obs": {
-                "bev_data": np.asarray(next_obs["bev_data"], dtype=np.float32),
+                bev_key: next_bev,
                 "velocity_local": np.asarray(next_obs["velocity_local"], dtype=np.float32),
                 "goal_rel_local": np.asarray(next_obs["goal_rel_local"], dtype=np.float32),
                 "yaw_sin": np.float32(next_obs["yaw_sin"]),
@@ -257,9 +277,10 @@ class ReplayBuffer:
     def sample(self, batch_size):
         '''Sample one mini-batch.'''
         batch = random.sample(self.buffer, batch_size)
+        bev_key = "bev_packed" if self.pack_bev else "bev_data"
 
         obs = {
-            "bev_data": np.stack([item["obs"]["bev_data"] for item in batch], axis=0),
+            bev_key: np.stack([item["obs"][bev_key] for item in batch], axis=0),
             "velocity_local": np.stack([item["obs"]["velocity_local"] for item in batch], axis=0),
             "goal_rel_local": np.stack([item["obs"]["goal_rel_local"] for item in batch], axis=0),
             "yaw_sin": np.asarray([item["obs"]["yaw_sin"] for item in batch], dtype=np.float32),
@@ -268,7 +289,7 @@ class ReplayBuffer:
         }
 
         next_obs = {
-            "bev_data": np.stack([item["next_obs"]["bev_data"] for item in batch], axis=0),
+            bev_key: np.stack([item["next_obs"][bev_key] for item in batch], axis=0),
             "velocity_local": np.stack([item["next_obs"]["velocity_local"] for item in batch], axis=0),
             "goal_rel_local": np.stack([item["next_obs"]["goal_rel_local"] for item in batch], axis=0),
             "yaw_sin": np.asarray([item["next_obs"]["yaw_sin"] for item in batch], dtype=np.float32),
@@ -313,6 +334,8 @@ class TD3Agent:
         exploration_speed_noise=0.15,
         exploration_direction_noise=0.20,
         replay_capacity=200000,
+        replay_pack_bev=False,
+        replay_hero_channel=HERO_CHANNEL,
         dropout=0.10,
         device="cuda",
     ):
@@ -359,12 +382,22 @@ class TD3Agent:
             weight_decay=critic_weight_decay,
         )
 
-        self.replay_buffer = ReplayBuffer(capacity=replay_capacity)
+        self.replay_buffer = ReplayBuffer(
+            capacity=replay_capacity, pack_bev=replay_pack_bev, hero_channel=replay_hero_channel,
+        )
 
     def move_obs_to_device(self, obs):
-        '''Move one observation batch to device.'''
+        '''Move one observation batch to device, expanding packed BEVs there.'''
+        if "bev_packed" in obs:
+            packed = torch.as_tensor(obs["bev_packed"], dtype=torch.uint8, device=self.device)
+            bev_data = unpack_bev_torch(
+                packed, width=self.replay_buffer.bev_width, hero_channel=self.replay_buffer.hero_channel,
+            )
+        else:
+            bev_data = torch.as_tensor(obs["bev_data"], dtype=torch.float32, device=self.device)
+
         return {
-            "bev_data": torch.as_tensor(obs["bev_data"], dtype=torch.float32, device=self.device),
+            "bev_data": bev_data,
             "velocity_local": torch.as_tensor(obs["velocity_local"], dtype=torch.float32, device=self.device),
             "goal_rel_local": torch.as_tensor(obs["goal_rel_local"], dtype=torch.float32, device=self.device),
             "yaw_sin": torch.as_tensor(obs["yaw_sin"], dtype=torch.float32, device=self.device),
@@ -40,6 +40,7 @@ def main():
     except KeyboardInterrupt:
         print(f"\n[{model_name} PolicyRunner] Stopped by user.")
     finally:
+        runner.close()
         cv2.destroyAllWindows()
 
 
@@ -1,76 +1,69 @@
 import carla
 import os
+import random
 import time
 import cv2
+import h5py
+import numpy as np
 from ..utils.config_loader import load_config
-from ..utils.sim_utils import Spector, CrossroadPedestrians, AggressiveVehicles, refresh_sim, spawn_actors
+from ..utils.sim_utils import Spector, IntersectionRegion, get_intersections
 from ..data_collection.bev.bev_sample import BEVWrapper
 from ..data_collection.bev.bev_seg_sample import SemanticBEVWrapper, SemanticBEVSample
-from ..utils.data_utils import DataSampler, convert_to_dataset
+from ..data_collection.bev.bev_render_pool import build_bev_render_pool
+from ..utils.data_utils import (
+    INDEX_GROUP,
+    DataSampler,
+    convert_to_dataset,
+    episode_group_name,
+    iter_episode_names,
+    parse_episode_id,
+)
+from ..utils.dataset_shards import ShardWriter, write_manifest
+from ..utils.collection_checkpoint import CollectionCheckpoint
+from ..utils.sample_filter import SampleFilter
+from ..utils.spatial_index import ActorSpatialIndex
+from ..utils.lane_grid import LaneTypeGrid
+from ..utils.trajectory_log import TrajectoryLogWriter, scene_from_index
+from ..utils.live_dataset import LiveDatasetWriter
 
 '''TODO: Increase dataset quality
 Create a logic that sample pedestrians in the certain area only or every n steps (in the intersection)
 '''
 
-def data_sampling_sim(output_file=True, no_rendering_mode=True, show_bev=False, print_out_data=False):
-    # ----- connect to CARLA -----
+def data_sampling_sim(
+        output_file=True,
+        no_rendering_mode=True,
+        show_bev=False,
+        print_out_data=False,
+        shard_id=None,
+        host="localhost",
+        port=2000,
+        tm_port=None,
+        num_episode=None,
+    ):
+    '''
+    Collect num_episode episodes into the dataset (a single HDF5 file, or one shard of a
+    sharded dataset). num_episode counts the episodes of the whole output, so a resumed run
+    only collects the missing ones. A session that fails with a RuntimeError (CARLA crash or
+    timeout) is reconnected and continued up to dataset.resume.max_retries times in a row.
+    With dataset.recording.mode = "trajectory" no BEVs are rendered; the actor state of every
+    sampled tick is logged instead (trajectory_log.py, tools/render_trajectories.py).
+    With dataset.live.enabled the file is written in the SWMR live layout (live_dataset.py)
+    so BC training can read it while collection is still running.
+    '''
     config = load_config("sim_config.json")
-    num_episode = config["dataset"]["num_episode"]
+    if num_episode is None:
+        num_episode = config["dataset"]["num_episode"]
     num_ped_per_episode = config["dataset"]["num_ped_per_episode"]
     sample_every_n_steps = config["dataset"]["sample_every_n_steps"]
     min_samples_per_episode = config["dataset"]["min_samples_per_episode"]
     sim_config = config["simulation"]
     fixed_delta_time = sim_config["fixed_delta_seconds"]
-
-
-    client = carla.Client("localhost", 2000)
-    client.set_timeout(10.0)
-    world = client.get_world()
-
-    settings = world.get_settings()
-    settings.synchronous_mode = True
-    settings.fixed_delta_seconds = fixed_delta_time
-    settings.no_rendering_mode = no_rendering_mode
-    world.apply_settings(settings)
-
-    # ----- setup scenario -----
-    intersection_position = carla.Location(
-        x=sim_config["intersection"]["x"],
-        y=sim_config["intersection"]["y"],
-        z=sim_config["intersection"]["z"],
-    )
-    distance = sim_config["intersection"]["dist"]
-
-    spector = Spector(world, location=intersection_position + carla.Location(z=50), dist=distance)
-    aggressive_vehicles = AggressiveVehicles(client, world, location=intersection_position)
-    crossroad_pedestrians = CrossroadPedestrians(world, location=intersection_position)
-    # bev_wrapper = BEVWrapper(cfg=None, world=world)
-    bev_wrapper = SemanticBEVWrapper(cfg=None, world=world)
-
-    sampler = DataSampler(
-        world=world,
-        bev_wrapper=bev_wrapper,
-        crossroad_pedestrians=crossroad_pedestrians,
-        config=config,
-        bev_sample_class=SemanticBEVSample
-    )
-
-    # ----- refresh conditions -----
-    stuck_detection_config = config["simulation"]["stuck_detection"]
-    refresh_conditions = {
-        "time_out": stuck_detection_config["time_out"],
-        "start time": world.get_snapshot().timestamp.elapsed_seconds,
-        "vehicle": {
-            "velocity_threshold": stuck_detection_config["vehicle"]["velocity_threshold"],
-            "stuck_tracker": {},
-            "stuck_time_limit": stuck_detection_config["vehicle"]["stuck_time_limit"],
-            "stuck_count_limit": stuck_detection_config["vehicle"]["stuck_count_limit"],
-        },
-        "pedestrian": {
-            "dist": stuck_detection_config["pedestrian"]["dist"],
-            "min_peds": stuck_detection_config["pedestrian"]["min_pedestrians"],
-        },
-    }
+    resume_config = config["dataset"].get("resume", {})
+    recording_config = config["dataset"].get("recording", {})
+    record_trajectory = recording_config.get("mode", "bev") == "trajectory"
+    # BEV class of the collected samples; its HERO_CHANNEL goes into the stored BEV attrs
+    bev_sample_class = SemanticBEVSample
 
     # ----- output path -----
     output_path = os.path.join(
@@ -78,145 +71,369 @@ def data_sampling_sim(output_file=True, no_rendering_mode=True, show_bev=False,
         config["dataset"]["file_name"]
     )
 
-    episode_idx = 0
-
-    # ----- initial spawn -----
-    spawn_actors(
-        world=world,
-        spector=spector,
-        aggressive_vehicles=aggressive_vehicles,
-        crossroad_pedestrians=crossroad_pedestrians,
-    )
-    sampler.select_target_ped_ids()
-
-    def respawn_same_episode(reason):
-        nonlocal ped_index
-        print(f"--- RESAMPLE SAME EPISODE: {reason} ---")
-        print("Discarding current episode buffer and respawning actors...")
-
-        refresh_conditions["start time"] = world.get_snapshot().timestamp.elapsed_seconds
-        refresh_conditions["vehicle"]["stuck_tracker"] = {}
-
-        sampler.reset_episode_tracking()
-        ped_index = None
-
-        spawn_actors(
-            world=world,
-            spector=spector,
-            aggressive_vehicles=aggressive_vehicles,
-            crossroad_pedestrians=crossroad_pedestrians,
+    # Sharded output: one shard file per collector under <save_path>/<file stem>/
+    sharding_config = config["dataset"].get("sharding", {})
+    if shard_id is None and sharding_config.get("enabled", False):
+        shard_id = sharding_config.get("shard_id", 0)
+    shard_writer = None
+    if shard_id is not None:
+        dataset_dir = os.path.join(config["dataset"]["save_path"], os.path.splitext(config["dataset"]["file_name"])[0])
+        shard_writer = ShardWriter(dataset_dir, shard_id, config=config)
+        output_path = shard_writer.path
+
+    # Trajectory-only recording: one log file, BEV datasets are rendered from it offline
+    trajectory_writer = None
+    if record_trajectory:
+        if shard_writer is not None:
+            raise ValueError("dataset.recording.mode = trajectory writes a single log file; disable dataset.sharding")
+        output_path = os.path.join(
+            config["dataset"]["save_path"],
+            recording_config.get("trajectory_file_name", "trajectories.h5"),
         )
-        sampler.select_target_ped_ids()
-
-    try:
-        ped_index = None
-        while True:
-            if episode_idx == num_episode:
-                print(f"\nSampling finished: collected {episode_idx} episodes.")
-                print(f"Dataset saved to: {output_path}")
-                break
-
-            for _ in range(sample_every_n_steps):
-                world.tick()
-
-            # ----- refresh episode if needed -----
-            sim_state, should_refresh = refresh_sim(
-                world=world,
-                refresh_conditions=refresh_conditions,
-                intersection_position=intersection_position
+        if output_file:
+            trajectory_writer = TrajectoryLogWriter(output_path)
+
+    # Live (SWMR) output: readers pick up every committed episode while the file is open
+    live_writer = None
+    if config["dataset"].get("live", {}).get("enabled", False) and output_file:
+        if shard_writer is not None or trajectory_writer is not None:
+            raise ValueError("dataset.live writes one BEV dataset file; disable dataset.sharding and trajectory recording")
+        live_writer = LiveDatasetWriter(output_path, hero_channel=bev_sample_class.HERO_CHANNEL)
+
+    # ----- resume from the progress checkpoint -----
+    # A shard continues after the episodes its sidecar records, a single file after its checkpoint
+    episode_idx = shard_writer.sidecar["num_episodes"] if shard_writer is not None else 0
+    checkpoint = None
+    if output_file and resume_config.get("enabled", False):
+        checkpoint = CollectionCheckpoint(output_path, config=config)
+        if shard_writer is not None:
+            checkpoint.resume()
+        elif live_writer is not None:
+            # Committed episodes cannot be rewritten: adopt those the checkpoint missed
+            checkpoint.resume([episode_group_name(idx) for idx in live_writer.episode_ids])
+            for idx, num_samples in sorted(live_writer.episode_ids.items()):
+                if episode_group_name(idx) not in checkpoint.state["completed_episodes"]:
+                    checkpoint.record_episode(idx, episode_group_name(idx), num_samples)
+            episode_idx = checkpoint.next_episode_idx()
+        else:
+            existing_episode_names = []
+            existing_episodes = {}
+            if os.path.exists(output_path):
+                with h5py.File(output_path, "r") as file:
+                    existing_episode_names = iter_episode_names(file)
+                    for name in existing_episode_names:
+                        if parse_episode_id(name) is not None:
+                            num_samples = sum(int(ped["frame_id"].shape[0]) for ped in file[name].values())
+                            existing_episodes[name] = (parse_episode_id(name), num_samples)
+            checkpoint.resume(existing_episode_names)
+            if checkpoint.existed:
+                # Groups the checkpoint does not list were interrupted mid-write: collect them again
+                interrupted = checkpoint.unlisted_episodes(existing_episode_names)
+                if interrupted:
+                    with h5py.File(output_path, "a") as file:
+                        for name in interrupted:
+                            del file[name]
+                        if INDEX_GROUP in file:
+                            del file[INDEX_GROUP]
+                    print(f"[CollectionCheckpoint] removed {len(interrupted)} interrupted episodes: {interrupted}")
+            else:
+                # Dataset written before checkpointing: its groups keep their ids
+                checkpoint.adopt_episodes(existing_episodes)
+            episode_idx = checkpoint.next_episode_idx()
+    elif live_writer is not None and live_writer.episode_ids:
+        episode_idx = max(live_writer.episode_ids) + 1
+    if (checkpoint is None or not checkpoint.rng_restored) and config["dataset"].get("seed") is not None:
+        random.seed(config["dataset"]["seed"])
+        np.random.seed(config["dataset"]["seed"])
+
+    intersections = get_intersections(sim_config)
+
+    # Optional collection-time thinning of near-duplicate samples, one filter per region
+    sample_filters = None
+    if config["dataset"].get("sample_filter", {}).get("enabled", False):
+        sample_filters = [SampleFilter() for _ in intersections]
+
+    def run_session():
+        '''Connect to CARLA and collect episodes until episode_idx reaches num_episode.'''
+        nonlocal episode_idx
+
+        # ----- connect to CARLA -----
+        client = carla.Client(host, port)
+        client.set_timeout(10.0)
+        world = client.get_world()
+
+        settings = world.get_settings()
+        settings.synchronous_mode = True
+        settings.fixed_delta_seconds = fixed_delta_time
+        settings.no_rendering_mode = no_rendering_mode
+        world.apply_settings(settings)
+
+        # ----- setup scenario -----
+        # One IntersectionRegion per intersection, all advanced by the same world.tick()
+        regions = [
+            IntersectionRegion(client, world, intersection, name=f"intersection_{k}", tm_port=tm_port)
+            for k, intersection in enumerate(intersections)
+        ]
+        distance = intersections[0]["dist"]
+
+        spector = Spector(world, location=regions[0].location + carla.Location(z=50), dist=distance)
+        # bev_wrapper = BEVWrapper(cfg=None, world=world)
+        bev_wrapper = SemanticBEVWrapper(cfg=None, world=world)
+        # Worker-process rendering (bev.render_pool.num_workers > 0, orthographic BEVWrapper only)
+        bev_render_pool = None if record_trajectory else build_bev_render_pool(bev_wrapper)
+        # Pool rendering and trajectory recording do not tick the world, the camera-based wrappers tick per BEV
+        if bev_render_pool is None and not record_trajectory:
+            ticks_per_step = sample_every_n_steps
+            if len(regions) > 1 and not hasattr(bev_wrapper, "extract_scene"):
+                print(
+                    f"[data_sampling_sim] {type(bev_wrapper).__name__} ticks per BEV: samples of one pedestrian are "
+                    f"~{len(regions) * num_ped_per_episode} ticks apart with {len(regions)} intersections, "
+                    f"and future_steps spans {len(regions)}x the single-intersection horizon"
+                )
+        else:
+            ticks_per_step = max(1, sample_every_n_steps)
+
+        if trajectory_writer is not None:
+            # Lane-type raster of the whole town, built once per town and reused by the offline renderer
+            town_raster = LaneTypeGrid.for_town(
+                world.get_map(),
+                margin=recording_config.get("raster_margin", 10.0),
+                resolution=recording_config.get("raster_resolution", 0.25),
+            )
+            trajectory_writer.set_attrs(
+                town=town_raster.town,
+                static_raster=os.path.abspath(town_raster.cache_path),
+                static_lane_codes=np.asarray(BEVWrapper.STATIC_LANE_CODES, dtype=np.int32),
+                fixed_delta_seconds=fixed_delta_time,
             )
 
-            if should_refresh:
-                print(f"--- {sim_state} ---")
-                print("Refreshing simulation...")
-
-                if output_file:
-                    episode_data = sampler.get_episode_buffer()
-                    sample_counts = len(episode_data)
-                    if sample_counts < min_samples_per_episode:
-                        respawn_same_episode(reason=f" only {sample_counts} samples (< {min_samples_per_episode})")
+        slots = [
+            {
+                "region": region,
+                "sampler": DataSampler(
+                    world=world,
+                    bev_wrapper=bev_wrapper,
+                    crossroad_pedestrians=region.crossroad_pedestrians,
+                    config=config,
+                    bev_sample_class=bev_sample_class,
+                    bev_render_pool=bev_render_pool,
+                    record_bev=not record_trajectory,
+                ),
+                "sample_filter": sample_filters[k] if sample_filters is not None else None,
+                "ped_index": None,
+            }
+            for k, region in enumerate(regions)
+        ]
+
+        def respawn_region(slot, reason=None):
+            region = slot["region"]
+            if reason is not None:
+                print(f"--- RESAMPLE SAME EPISODE [{region.name}]: {reason} ---")
+                print("Discarding current episode buffer and respawning actors...")
+
+            slot["sampler"].reset_episode_tracking()
+            if slot["sample_filter"] is not None:
+                slot["sample_filter"].reset_episode()
+            slot["ped_index"] = None
+
+            region.spawn()
+            slot["sampler"].select_target_ped_ids(candidate_ids=region.walker_ids())
+
+        # ----- initial spawn -----
+        for k, slot in enumerate(slots):
+            if slot["sample_filter"] is not None:
+                slot["sample_filter"].reset_episode()
+            slot["region"].spawn(cleanup_world=(k == 0))
+            slot["sampler"].select_target_ped_ids(candidate_ids=slot["region"].walker_ids())
+        spector.set_spector()
+
+        try:
+            while True:
+                if episode_idx >= num_episode:
+                    print(f"\nSampling finished: collected {episode_idx} episodes.")
+                    print(f"Dataset saved to: {output_path}")
+                    break
+
+                for _ in range(ticks_per_step):
+                    world.tick()
+
+                # ----- refresh regions if needed -----
+                active_slots = []
+                for slot in slots:
+                    region, sampler = slot["region"], slot["sampler"]
+                    sim_state, should_refresh = region.check_refresh()
+
+                    if should_refresh:
+                        print(f"--- [{region.name}] {sim_state} ---")
+                        print("Refreshing region...")
+
+                        if output_file:
+                            episode_data = sampler.get_episode_buffer()
+                            sample_counts = len(episode_data)
+                            if sample_counts < min_samples_per_episode:
+                                respawn_region(slot, reason=f" only {sample_counts} samples (< {min_samples_per_episode})")
+                                continue
+
+                            if trajectory_writer is not None:
+                                episode_name = trajectory_writer.write_episode(
+                                    episode_idx,
+                                    episode_data,
+                                    goals=region.crossroad_pedestrians.ped_goal_loc,
+                                )
+                            elif shard_writer is not None:
+                                episode_name = shard_writer.write_episode(
+                                    episode_data, hero_channel=bev_sample_class.HERO_CHANNEL,
+                                )
+                            elif live_writer is not None:
+                                episode_name = live_writer.write_episode(episode_idx, episode_data)
+                            else:
+                                convert_to_dataset(
+                                    episode_idx=episode_idx,
+                                    episode_data=episode_data,
+                                    output_path=output_path,
+                                    hero_channel=bev_sample_class.HERO_CHANNEL,
+                                )
+                                episode_name = episode_group_name(episode_idx)
+                            if checkpoint is not None:
+                                checkpoint.record_episode(episode_idx, episode_name, sample_counts)
+
+                        if slot["sample_filter"] is not None:
+                            slot["sample_filter"].commit_episode()
+                        if checkpoint is not None and shard_writer is None:
+                            episode_idx = checkpoint.next_episode_idx()
+                        else:
+                            episode_idx += 1
+                        if episode_idx >= num_episode:
+                            break
+
+                        respawn_region(slot)
                         continue
 
-                    convert_to_dataset(
-                        episode_idx=episode_idx,
-                        episode_data=episode_data,
-                        output_path=output_path
-                    )
-
-                episode_idx += 1
-
-                refresh_conditions["start time"] = world.get_snapshot().timestamp.elapsed_seconds
-                refresh_conditions["vehicle"]["stuck_tracker"] = {}
-
-                sampler.reset_episode_tracking()
-
-                spawn_actors(
-                    world=world,
-                    spector=spector,
-                    aggressive_vehicles=aggressive_vehicles,
-                    crossroad_pedestrians=crossroad_pedestrians,
-                )
+                    sample_peds = sampler.get_sample_pedestrians()
+                    num_sample_peds = len(sample_peds)
 
-                sampler.select_target_ped_ids()
-                continue
+                    # Check if the peds in sample_peds meet the required number
+                    if num_sample_peds < num_ped_per_episode:
+                        respawn_region(slot, reason=f"target pedestrian missing ({num_sample_peds}/{num_ped_per_episode} alive)")
+                        continue
 
-            # ----- sample current frame -----
-            snapshot = world.get_snapshot()
-            timestamp = snapshot.timestamp
-            frame_id = snapshot.timestamp.frame
+                    # Sample only one pedestrian per region and tick
+                    if (slot["ped_index"] is None) or (slot["ped_index"] >= num_sample_peds):
+                        slot["ped_index"] = 0
+                    active_slots.append((slot, sample_peds[slot["ped_index"]]))
 
-            sample_peds = sampler.get_sample_pedestrians()
-            num_sample_peds = len(sample_peds)
+                if episode_idx >= num_episode:
+                    continue
 
-            # Check if the peds in sample_peds meet the required number
-            if num_sample_peds < num_ped_per_episode:
-                respawn_same_episode(reason=f"target pedestrian missing ({num_sample_peds}/{num_ped_per_episode} alive)")
-                continue
-            
-            # Sample only one pedestrian per tick
-            if (ped_index is None) or (ped_index >= num_sample_peds):
-                ped_index = 0
+                # ----- sample current frame -----
+                snapshot = world.get_snapshot()
+                timestamp = snapshot.timestamp
+                frame_id = snapshot.timestamp.frame
+
+                # One pool render for the heroes of every region (empty without a pool)
+                prerendered = slots[0]["sampler"].render_bevs([ped for _, ped in active_slots], snapshot=snapshot)
+                # Actor state of this tick for trajectory-only recording, shared by every region
+                scene = None
+                if record_trajectory and active_slots:
+                    scene = scene_from_index(ActorSpatialIndex.for_tick(world, snapshot=snapshot), timestamp)
+
+                for slot, ped in active_slots:
+                    sampler, sample_filter = slot["sampler"], slot["sample_filter"]
+
+                    # Try to sample the bev if the pedestrian is alive; or resample the current episode
+                    try:
+                        ped_info, bev_sample = sampler.sample_single_pedestrian(
+                            ped=ped,
+                            frame_id=frame_id,
+                            timestamp=timestamp,
+                            bev_data=prerendered.get(ped.id),
+                        )
+                    except RuntimeError as exc:
+                        respawn_region(slot, reason=exc)
+                        continue
+                    if scene is not None:
+                        ped_info.set_scene(scene)
+
+                    keep_sample = True
+                    if sample_filter is not None:
+                        index = ActorSpatialIndex.for_tick(world, snapshot=snapshot)
+                        _, vehicle_distance = index.nearest(ped_info.state["current_location"][:2])
+                        keep_sample = sample_filter.keep(ped_info, vehicle_distance=vehicle_distance)
+                    if keep_sample:
+                        sampler.append_sample(ped_info)
+                    slot["ped_index"] += 1
+
+                    # Visualize the last pedestrian of the first region
+                    if slot is not slots[0] or slot["ped_index"] != 1:
+                        continue
 
-            # Try to sample the bev if the pedestrian is alive; or resample the current episode
+                    if print_out_data:
+                        print(
+                            f"\n[Ped Sample] "
+                            f"ped_id={ped_info.ped_id} | frame={frame_id}\n"
+                            f"  location         : {ped_info.state['current_location']}\n"
+                            f"  velocity         : {ped_info.state['velocity']}\n"
+                            # f"  speed            : {ped_info.state['speed']}\n"
+                            # f"  motion_heading   : {ped_info.state['motion_heading']}\n"
+                            f"  yaw_heading   : {ped_info.state['yaw_heading']}\n"
+                            # f"  target_speed     : {ped_info.action['target_speed']}\n"
+                            f"  target_direction : {ped_info.action['target_direction']}\n"
+                        )
+
+                    if show_bev:
+                        try: 
+                            image = bev_sample.visualize_bev()
+                        except RuntimeError as exc:
+                            respawn_region(slot, reason=exc)
+                            continue
+                        cv2.imshow("BEV Debug Tool", image)
+                        if cv2.waitKey(1) & 0xFF == ord("q"):
+                            return
+        finally:
+            if bev_render_pool is not None:
+                bev_render_pool.close()
+            bev_wrapper.close()
+            cv2.destroyAllWindows()
+
+    # ----- collect, reconnecting after transient client errors -----
+    # Reconnecting is part of resuming: without dataset.resume the first failure is raised
+    max_retries = resume_config.get("max_retries", 0) if resume_config.get("enabled", False) else 0
+    retry_wait_s = resume_config.get("retry_wait_s", 10.0)
+    failures = 0
+    try:
+        while True:
+            episodes_before = episode_idx
             try:
-                ped_info, bev_sample = sampler.sample_single_pedestrian(
-                    ped=sample_peds[ped_index],
-                    frame_id=frame_id,
-                    timestamp=timestamp
-                )
+                run_session()
+                break
             except RuntimeError as exc:
-                respawn_same_episode(reason=exc)
-                continue
-
-            sampler.append_sample(ped_info)
-            ped_index +=1
-
-            # Visualize the last pedestrian
-            if (print_out_data) and (ped_index==1):
-                print(
-                    f"\n[Ped Sample] "
-                    f"ped_id={ped_info.ped_id} | frame={frame_id}\n"
-                    f"  location         : {ped_info.state['current_location']}\n"
-                    f"  velocity         : {ped_info.state['velocity']}\n"
-                    # f"  speed            : {ped_info.state['speed']}\n"
-                    # f"  motion_heading   : {ped_info.state['motion_heading']}\n"
-                    f"  yaw_heading   : {ped_info.state['yaw_heading']}\n"
-                    # f"  target_speed     : {ped_info.action['target_speed']}\n"
-                    f"  target_direction : {ped_info.action['target_direction']}\n"
-                )
-
-            if (show_bev) and (ped_index==1):
-                try: 
-                    image = bev_sample.visualize_bev()
-                except RuntimeError as exc:
-                    respawn_same_episode(reason=exc)
-                    continue
-                cv2.imshow("BEV Debug Tool", image)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    return
+                # Only consecutive failures without a completed episode count against the limit
+                failures = 1 if episode_idx > episodes_before else failures + 1
+                if failures > max_retries:
+                    raise
+                print(f"--- SESSION FAILED: {exc} ---")
+                print(f"Reconnecting to {host}:{port} in {retry_wait_s:.0f}s (retry {failures}/{max_retries}), "
+                      f"resuming at episode {episode_idx}...")
+                if checkpoint is not None:
+                    checkpoint.record_retry(exc)
+                time.sleep(retry_wait_s)
     finally:
-        bev_wrapper.close()
-        cv2.destroyAllWindows()
+        if shard_writer is not None and output_file:
+            write_manifest(shard_writer.dataset_dir)
+        if live_writer is not None:
+            live_writer.close()
+        if sample_filters is not None and output_file:
+            sample_filter = sample_filters[0]
+            for other in sample_filters[1:]:
+                sample_filter.merge_stats(other)
+            stem = os.path.splitext(os.path.basename(output_path))[0]
+            stats_path = os.path.join(os.path.dirname(output_path), f"sample_filter_{stem}.json")
+            summary = sample_filter.save_stats(stats_path)
+            print(
+                f"[SampleFilter] kept {summary['kept']}/{summary['seen']} samples "
+                f"({100.0 * summary['kept_fraction']:.1f}%), {summary['dropped_bev_mb']:.1f} MB raw BEV and "
+                f"{summary['epoch_samples_saved_pct']:.1f}% of every training epoch saved: {stats_path}"
+            )
         
 
 def visualize_sampled_data():
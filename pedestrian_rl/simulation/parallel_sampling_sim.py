@@ -0,0 +1,319 @@
+'''
+Parallel data collection: one data_sampling_sim worker per CARLA server, each writing its
+own shard of the sharded dataset (see utils/dataset_shards.py).
+
+    worker k  ->  RPC port base_port + k * port_stride, TM port base_tm_port + k * port_stride,
+                  shard first_shard_id + k, GPU gpus[k % len(gpus)]
+
+With --fake the CARLA servers are replaced by idle python processes and the workers write
+synthetic episodes (and crash at random), so the orchestration can be tested without CARLA.
+'''
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from ..utils.config_loader import load_config
+from ..utils.dataset_shards import ShardWriter, shard_file_name, write_json_atomic, write_manifest
+
+
+def split_episodes(num_episode, num_workers):
+    '''Even split of the episode budget; the first workers take the remainder.'''
+    base, remainder = divmod(int(num_episode), int(num_workers))
+    return [base + (1 if k < remainder else 0) for k in range(num_workers)]
+
+
+def _read_sidecar(sidecar_path):
+    if not os.path.exists(sidecar_path):
+        return {"num_episodes": 0, "num_samples": 0}
+    with open(sidecar_path, "r") as file:
+        return json.load(file)
+
+
+def carla_collection_worker(shard_id, host, port, tm_port, num_episode):
+    '''Worker process: fill shard_id up to num_episode episodes from the CARLA server at host:port.'''
+    # Imported here so the orchestrator process itself does not need CARLA
+    from .data_sampling_sim import data_sampling_sim
+
+    data_sampling_sim(
+        output_file=True,
+        no_rendering_mode=True,
+        show_bev=False,
+        print_out_data=False,
+        shard_id=shard_id,
+        host=host,
+        port=port,
+        tm_port=tm_port,
+        num_episode=num_episode,
+    )
+
+
+def fake_collection_worker(shard_id, host, port, tm_port, num_episode, dataset_dir, crash_prob=0.0,
+                           peds_per_episode=3, steps_per_ped=50, episode_time_s=0.5, seed=None):
+    '''
+    Stand-in for carla_collection_worker: writes synthetic episodes through ShardWriter and
+    raises RuntimeError with probability crash_prob per episode, like a lost server connection.
+    '''
+    from ..tools.benchmark_dataset_codecs import make_synthetic_columns
+
+    height, width = load_config("sim_config.json")["bev"]["size"]
+    rng = np.random.default_rng(seed)
+    shard_writer = ShardWriter(dataset_dir, shard_id)
+    while shard_writer.sidecar["num_episodes"] < num_episode:
+        time.sleep(episode_time_s)
+        if rng.random() < crash_prob:
+            raise RuntimeError(f"fake server {host}:{port} stopped responding")
+        ped_columns = {
+            1000 + ped_idx: make_synthetic_columns(steps_per_ped, height, width, rng=rng)
+            for ped_idx in range(peds_per_episode)
+        }
+        shard_writer.write_episode_columns(ped_columns)
+
+
+class CollectionOrchestrator:
+    '''
+    Run num_workers data collection workers in parallel, one per CARLA server.
+
+    The episode budget is split across the workers and every worker writes its own shard.
+    The orchestrator polls the shard sidecars for progress and aggregate samples/s; a worker
+    that exits with an error (e.g. its server crashed) is restarted together with its server
+    for its remaining episodes, up to max_restarts times.
+
+    Attributes:
+        dataset_dir: Sharded dataset directory.
+        num_workers: Number of workers / CARLA servers.
+        host: Host of the CARLA servers.
+        base_port, port_stride, base_tm_port: Port layout, see the module docstring.
+        first_shard_id: Shard id of worker 0.
+        server_command: Command template with {port} and {gpu} to launch a CARLA server,
+            or None when the servers are started externally.
+        gpus: GPU ids the servers are distributed over.
+        server_startup_s: Wait after launching a server before its worker connects.
+        max_restarts: Restarts allowed per worker.
+        poll_interval_s: Progress report interval.
+        fake: Use idle processes as servers and fake_collection_worker as workers.
+
+    Methods:
+        run(num_episode):
+            Collect num_episode episodes in total and return the collection report.
+    '''
+    config = load_config("sim_config.json")["dataset"]
+
+    def __init__(self,
+                 dataset_dir=None,
+                 num_workers=config["orchestrator"]["num_workers"],
+                 host="localhost",
+                 base_port=config["orchestrator"]["base_port"],
+                 port_stride=config["orchestrator"]["port_stride"],
+                 base_tm_port=config["orchestrator"]["base_tm_port"],
+                 first_shard_id=config["orchestrator"]["first_shard_id"],
+                 server_command=config["orchestrator"]["server_command"],
+                 gpus=config["orchestrator"]["gpus"],
+                 server_startup_s=config["orchestrator"]["server_startup_s"],
+                 max_restarts=config["orchestrator"]["max_restarts"],
+                 poll_interval_s=config["orchestrator"]["poll_interval_s"],
+                 fake=False,
+                 fake_crash_prob=0.0,
+        ):
+        if dataset_dir is None:
+            dataset_dir = os.path.join(self.config["save_path"], os.path.splitext(self.config["file_name"])[0])
+        self.dataset_dir = dataset_dir
+        self.num_workers = int(num_workers)
+        self.host = host
+        self.base_port = int(base_port)
+        self.port_stride = int(port_stride)
+        self.base_tm_port = int(base_tm_port)
+        self.first_shard_id = int(first_shard_id)
+        self.server_command = server_command
+        self.gpus = list(gpus) if gpus else [0]
+        self.server_startup_s = float(server_startup_s)
+        self.max_restarts = int(max_restarts)
+        self.poll_interval_s = float(poll_interval_s)
+        self.fake = fake
+        self.fake_crash_prob = float(fake_crash_prob)
+
+        self._ctx = mp.get_context("spawn")
+        self._servers = {}
+        self._workers = {}
+
+    def _ports(self, worker_idx):
+        return self.base_port + worker_idx * self.port_stride, self.base_tm_port + worker_idx * self.port_stride
+
+    def _sidecar_path(self, worker_idx):
+        shard_path = os.path.join(self.dataset_dir, shard_file_name(self.first_shard_id + worker_idx))
+        return os.path.splitext(shard_path)[0] + ".json"
+
+    def _start_server(self, worker_idx):
+        port, _ = self._ports(worker_idx)
+        if self.fake:
+            command = [sys.executable, "-c", "import time; time.sleep(1e9)"]
+        elif self.server_command:
+            gpu = self.gpus[worker_idx % len(self.gpus)]
+            command = shlex.split(self.server_command.format(port=port, gpu=gpu))
+        else:
+            return
+        self._servers[worker_idx] = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        print(f"[CollectionOrchestrator] server {worker_idx} started on port {port} (pid {self._servers[worker_idx].pid})")
+
+    def _stop_server(self, worker_idx):
+        server = self._servers.pop(worker_idx, None)
+        if server is None:
+            return
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    def _start_worker(self, worker_idx, num_episode):
+        # num_episode is the episode target of the whole shard; workers resume after its sidecar
+        port, tm_port = self._ports(worker_idx)
+        shard_id = self.first_shard_id + worker_idx
+        if self.fake:
+            target = fake_collection_worker
+            kwargs = {"dataset_dir": self.dataset_dir, "crash_prob": self.fake_crash_prob, "episode_time_s": 0.2}
+        else:
+            target = carla_collection_worker
+            kwargs = {}
+        process = self._ctx.Process(
+            target=target,
+            args=(shard_id, self.host, port, tm_port, num_episode),
+            kwargs=kwargs,
+            name=f"collector_{shard_id:03d}",
+        )
+        process.start()
+        self._workers[worker_idx] = process
+
+    def run(self, num_episode=config["num_episode"]):
+        os.makedirs(self.dataset_dir, exist_ok=True)
+        budgets = split_episodes(num_episode, self.num_workers)
+        # Shards may already hold episodes of an earlier run; targets are relative to those
+        initial = [_read_sidecar(self._sidecar_path(k)) for k in range(self.num_workers)]
+        targets = [initial[k]["num_episodes"] + budgets[k] for k in range(self.num_workers)]
+        initial_samples = sum(sidecar["num_samples"] for sidecar in initial)
+        restarts = [0] * self.num_workers
+        failed = set()
+
+        start_time = time.time()
+        try:
+            for k in range(self.num_workers):
+                if budgets[k] > 0:
+                    self._start_server(k)
+            if self._servers and not self.fake:
+                time.sleep(self.server_startup_s)
+            for k in range(self.num_workers):
+                if budgets[k] > 0:
+                    self._start_worker(k, targets[k])
+
+            while self._workers:
+                time.sleep(self.poll_interval_s)
+                for k, process in list(self._workers.items()):
+                    if process.is_alive():
+                        continue
+                    del self._workers[k]
+                    remaining = targets[k] - _read_sidecar(self._sidecar_path(k))["num_episodes"]
+                    if process.exitcode == 0 or remaining <= 0:
+                        self._stop_server(k)
+                        continue
+
+                    if restarts[k] >= self.max_restarts:
+                        print(f"[CollectionOrchestrator] worker {k} failed {restarts[k] + 1} times, giving up "
+                              f"with {remaining} episodes missing")
+                        failed.add(k)
+                        self._stop_server(k)
+                        continue
+
+                    restarts[k] += 1
+                    print(f"[CollectionOrchestrator] worker {k} exited with code {process.exitcode}, "
+                          f"restart {restarts[k]}/{self.max_restarts} for {remaining} episodes")
+                    self._stop_server(k)
+                    self._start_server(k)
+                    if k in self._servers and not self.fake:
+                        time.sleep(self.server_startup_s)
+                    self._start_worker(k, targets[k])
+
+                sidecars = [_read_sidecar(self._sidecar_path(k)) for k in range(self.num_workers)]
+                elapsed = time.time() - start_time
+                new_samples = sum(sidecar["num_samples"] for sidecar in sidecars) - initial_samples
+                episodes = sum(sidecars[k]["num_episodes"] - initial[k]["num_episodes"] for k in range(self.num_workers))
+                print(f"[CollectionOrchestrator] {elapsed:7.1f}s | {episodes}/{num_episode} episodes | "
+                      f"{new_samples} samples | {new_samples / max(elapsed, 1e-9):.1f} samples/s | "
+                      f"{len(self._workers)} workers running")
+        finally:
+            for process in self._workers.values():
+                process.terminate()
+                process.join()
+            self._workers = {}
+            for k in list(self._servers):
+                self._stop_server(k)
+
+        elapsed = time.time() - start_time
+        sidecars = [_read_sidecar(self._sidecar_path(k)) for k in range(self.num_workers)]
+        manifest = write_manifest(self.dataset_dir)
+        new_samples = sum(sidecar["num_samples"] for sidecar in sidecars) - initial_samples
+        report = {
+            "dataset_dir": self.dataset_dir,
+            "num_workers": self.num_workers,
+            "num_episode": int(num_episode),
+            "elapsed_s": elapsed,
+            "samples": int(new_samples),
+            "samples_per_s": new_samples / max(elapsed, 1e-9),
+            "workers": [
+                {
+                    "shard_id": self.first_shard_id + k,
+                    "port": self._ports(k)[0],
+                    "tm_port": self._ports(k)[1],
+                    "episodes": sidecars[k]["num_episodes"] - initial[k]["num_episodes"],
+                    "samples": sidecars[k]["num_samples"] - initial[k]["num_samples"],
+                    "restarts": restarts[k],
+                    "failed": k in failed,
+                }
+                for k in range(self.num_workers)
+            ],
+            "manifest_num_samples": manifest["num_samples"],
+        }
+        print(f"[CollectionOrchestrator] {sum(w['episodes'] for w in report['workers'])} episodes / "
+              f"{report['samples']} samples in {elapsed:.1f}s ({report['samples_per_s']:.1f} samples/s), "
+              f"{sum(restarts)} restarts")
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect the pedestrian dataset with several CARLA servers in parallel.")
+    parser.add_argument("--num-workers", type=int, default=None, help="Workers / servers (default: dataset.orchestrator).")
+    parser.add_argument("--num-episode", type=int, default=None, help="Total episodes (default: dataset.num_episode).")
+    parser.add_argument("--dataset-dir", default=None, help="Sharded dataset directory.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--server-command", default=None,
+                        help="Server launch template with {port} / {gpu}, e.g. './CarlaUE4.sh -RenderOffScreen "
+                             "-carla-rpc-port={port} -graphicsadapter={gpu}' (default: dataset.orchestrator).")
+    parser.add_argument("--fake", action="store_true", help="Fake servers and synthetic episodes (no CARLA needed).")
+    parser.add_argument("--fake-crash-prob", type=float, default=0.1, help="Per-episode crash probability with --fake.")
+    parser.add_argument("--output", default=None, help="Optional JSON report path.")
+    args = parser.parse_args()
+
+    orchestrator_kwargs = {"dataset_dir": args.dataset_dir, "host": args.host, "fake": args.fake,
+                           "fake_crash_prob": args.fake_crash_prob}
+    if args.num_workers is not None:
+        orchestrator_kwargs["num_workers"] = args.num_workers
+    if args.server_command is not None:
+        orchestrator_kwargs["server_command"] = args.server_command
+    if args.fake:
+        orchestrator_kwargs["poll_interval_s"] = 1.0
+
+    orchestrator = CollectionOrchestrator(**orchestrator_kwargs)
+    if args.num_episode is None:
+        report = orchestrator.run()
+    else:
+        report = orchestrator.run(num_episode=args.num_episode)
+
+    if args.output is not None:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        write_json_atomic(args.output, report)
+        print(f"Saved: {args.output}")
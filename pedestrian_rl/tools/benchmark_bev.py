@@ -0,0 +1,184 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import carla
+import numpy as np
+
+from ..data_collection.bev.bev_sample import BEVSample, BEVWrapper
+from ..utils.config_loader import load_config
+from ..utils.sim_utils import AggressiveVehicles, CrossroadPedestrians, cleanup_simulation
+from .benchmark_reset import summarize
+
+
+def time_bev_rendering(world, bev_wrapper, heroes, num_repeats):
+    '''
+    Time per-hero BEVSample.get_bev against one render_many call on the same tick, and
+    compare their outputs. Dynamic layers should match exactly; static layers differ only
+    where the raster and the brushed waypoint samples disagree near lane borders.
+    '''
+    sequential_times = []
+    batched_times = []
+    dynamic_equal = True
+    static_agreement = []
+
+    for _ in range(num_repeats):
+        world.tick()
+        snapshot = world.get_snapshot()
+
+        start_time = time.perf_counter()
+        sequential = np.stack([BEVSample(actor=hero, bev_wrapper=bev_wrapper).get_bev() for hero in heroes])
+        sequential_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        batched = bev_wrapper.render_many(heroes, snapshot=snapshot)
+        batched_times.append(time.perf_counter() - start_time)
+
+        dynamic_equal &= bool(np.array_equal(sequential[..., 3:], batched[..., 3:]))
+        static_agreement.append(float(np.mean(sequential[..., :3] == batched[..., :3])))
+
+    return sequential_times, batched_times, dynamic_equal, float(np.mean(static_agreement))
+
+
+def time_static_cache(world, heroes, num_ticks):
+    '''
+    Render the same walking heroes every tick with the static layer cache on and off.
+    Returns the cache statistics of both wrappers and the static-layer agreement between them.
+    '''
+    bev_config = copy.deepcopy(load_config("sim_config.json")["bev"])
+    bev_config.setdefault("static_cache", {})
+    bev_config["static_cache"]["enabled"] = True
+    cached_wrapper = BEVWrapper(cfg=bev_config, world=world)
+    uncached_config = copy.deepcopy(bev_config)
+    uncached_config["static_cache"]["enabled"] = False
+    uncached_wrapper = BEVWrapper(cfg=uncached_config, world=world)
+
+    static_agreement = []
+    for _ in range(num_ticks):
+        world.tick()
+        for hero in heroes:
+            cached = BEVSample(actor=hero, bev_wrapper=cached_wrapper).get_bev()
+            fresh = BEVSample(actor=hero, bev_wrapper=uncached_wrapper).get_bev()
+            static_agreement.append(float(np.mean(cached[..., :3] == fresh[..., :3])))
+
+    return {
+        "cached": cached_wrapper.get_static_cache_stats(),
+        "uncached": uncached_wrapper.get_static_cache_stats(),
+        "static_layer_agreement": float(np.mean(static_agreement)) if static_agreement else 0.0,
+    }
+
+
+def benchmark_bev(
+        host="localhost",
+        port=2000,
+        hero_counts=(1, 10, 45),
+        num_repeats=5,
+        static_cache_ticks=40,
+        output_path=None,
+    ):
+    '''
+    Benchmark single-hero BEV rendering against BEVWrapper.render_many for several hero
+    counts on a running CARLA server. The static raster is built (or loaded) before timing.
+    Optionally compare the static layer cache against fresh road renders for 10 walking heroes.
+    '''
+    config = load_config("sim_config.json")
+    sim_config = config["simulation"]
+
+    client = carla.Client(host, port)
+    client.set_timeout(20.0)
+    world = client.get_world()
+
+    settings = world.get_settings()
+    settings.synchronous_mode = True
+    settings.fixed_delta_seconds = sim_config["fixed_delta_seconds"]
+    world.apply_settings(settings)
+
+    intersection_position = carla.Location(
+        x=sim_config["intersection"]["x"],
+        y=sim_config["intersection"]["y"],
+        z=sim_config["intersection"]["z"],
+    )
+
+    results = {"num_repeats": num_repeats, "bev_size": config["bev"]["size"]}
+    try:
+        cleanup_simulation(world)
+        crossroad_pedestrians = CrossroadPedestrians(world, location=intersection_position)
+        crossroad_pedestrians.reset_pedestrians()
+        AggressiveVehicles(client, world, location=intersection_position).aggressive_vehicles_spawn()
+        crossroad_pedestrians.pedestrians_spawn()
+        for _ in range(sim_config["warmup_ticks"]):
+            world.tick()
+
+        bev_wrapper = BEVWrapper(cfg=None, world=world)
+        bev_wrapper.get_static_raster()
+
+        walkers = list(world.get_actors().filter("walker.*"))
+        for num_heroes in hero_counts:
+            heroes = walkers[:num_heroes]
+            if len(heroes) < num_heroes:
+                print(f"[benchmark_bev] only {len(heroes)} walkers alive, requested K={num_heroes}")
+
+            sequential_times, batched_times, dynamic_equal, static_agreement = time_bev_rendering(
+                world, bev_wrapper, heroes, num_repeats
+            )
+            sequential = summarize(sequential_times)
+            batched = summarize(batched_times)
+            results[f"K={num_heroes}"] = {
+                "num_heroes": len(heroes),
+                "sequential": sequential,
+                "render_many": batched,
+                "speedup": sequential["mean_ms"] / max(batched["mean_ms"], 1e-9),
+                "dynamic_layers_equal": dynamic_equal,
+                "static_layer_agreement": static_agreement,
+            }
+            print(
+                f"[benchmark_bev] K={len(heroes):>2}: "
+                f"sequential mean={sequential['mean_ms']:.1f} ms, "
+                f"render_many mean={batched['mean_ms']:.1f} ms "
+                f"(x{results[f'K={num_heroes}']['speedup']:.1f}) | "
+                f"dynamic equal={dynamic_equal}, static agreement={static_agreement:.4f}"
+            )
+
+        if static_cache_ticks > 0:
+            cache_results = time_static_cache(world, walkers[:10], static_cache_ticks)
+            results["static_cache"] = cache_results
+            print(
+                f"[benchmark_bev] static cache over {static_cache_ticks} ticks: "
+                f"hit rate={cache_results['cached']['hit_rate']:.3f}, "
+                f"per-BEV cached={cache_results['cached']['mean_bev_ms']:.1f} ms vs "
+                f"uncached={cache_results['uncached']['mean_bev_ms']:.1f} ms, "
+                f"static agreement={cache_results['static_layer_agreement']:.4f}"
+            )
+    finally:
+        cleanup_simulation(world)
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single-hero vs multi-hero BEV rendering.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2000)
+    parser.add_argument("--heroes", type=int, nargs="+", default=[1, 10, 45])
+    parser.add_argument("--num-repeats", type=int, default=5)
+    parser.add_argument("--static-cache-ticks", type=int, default=40,
+                        help="Ticks for the static layer cache comparison (0 to skip).")
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    args = parser.parse_args()
+
+    benchmark_bev(
+        host=args.host,
+        port=args.port,
+        hero_counts=args.heroes,
+        num_repeats=args.num_repeats,
+        static_cache_ticks=args.static_cache_ticks,
+        output_path=args.output,
+    )
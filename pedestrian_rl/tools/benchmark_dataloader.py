@@ -0,0 +1,350 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from ..utils.bc_utils import build_dataloader, move_batch_to_device
+from ..utils.config_loader import load_config
+from ..utils.data_utils import PedestrianStepDataset
+from .convert_dataset import convert_dataset
+
+
+BEV_FORMATS = ("float32", "uint8", "packed")
+STORED_LAYOUT = "stored"
+
+
+def parse_layout(layout):
+    '''"codec:chunk_samples:packed|dense" (e.g. gzip-4:1:packed) -> (codec, chunk_samples, pack_bev_data).'''
+    codec, chunk_samples, packing = layout.split(":")
+    if packing not in ("packed", "dense"):
+        raise ValueError(f"Layout {layout!r}: the packing must be 'packed' or 'dense'")
+    return codec, int(chunk_samples), packing == "packed"
+
+
+def _rss_mb(pid):
+    '''Resident set size of a process in MB (Linux /proc), 0 if it is gone.'''
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def _child_pids(pid):
+    pids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as file:
+                pids.extend(int(child) for child in file.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+def worker_rss_mb(exclude=()):
+    '''RSS (MB) of the child processes of this one (the DataLoader workers) that are not in exclude.'''
+    return [_rss_mb(pid) for pid in _child_pids(os.getpid()) if pid not in exclude]
+
+
+def _batch_nbytes(batch):
+    return sum(value.element_size() * value.nelement() for value in batch.values() if torch.is_tensor(value))
+
+
+def time_loader(loader, device, num_batches, warmup_batches=5, num_epochs=2, rss_every=10):
+    '''
+    Consume up to num_batches batches per epoch like a training loop that only moves the
+    batch to the device. The first warmup_batches of the first epoch are not timed. Returns
+    the samples/s, batch wait latency percentiles, host-to-device time, time to the first
+    batch of every epoch and the peak main / worker RSS.
+    '''
+    wait_s, h2d_s, batch_bytes = [], [], []
+    first_batch_s = []
+    num_samples = 0
+    measured_s = 0.0
+    peak_worker_rss = []
+    peak_main_rss = 0.0
+    # Children that exist before the loader does (e.g. a multiprocessing resource tracker) are not workers
+    other_children = set(_child_pids(os.getpid()))
+
+    for epoch in range(num_epochs):
+        epoch_start = time.perf_counter()
+        iterator = iter(loader)
+        for batch_idx in range(num_batches + (warmup_batches if epoch == 0 else 0)):
+            start_time = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                break
+            got_batch = time.perf_counter()
+            moved = move_batch_to_device(batch, device)
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            moved_time = time.perf_counter()
+            del moved
+
+            if batch_idx == 0:
+                first_batch_s.append(got_batch - epoch_start)
+            if batch_idx % rss_every == 0:
+                workers = worker_rss_mb(exclude=other_children)
+                if sum(workers) > sum(peak_worker_rss):
+                    peak_worker_rss = workers
+                peak_main_rss = max(peak_main_rss, _rss_mb(os.getpid()))
+            if epoch == 0 and batch_idx < warmup_batches:
+                continue
+
+            wait_s.append(got_batch - start_time)
+            h2d_s.append(moved_time - got_batch)
+            batch_bytes.append(_batch_nbytes(batch))
+            num_samples += len(batch["timestep"])
+            measured_s += moved_time - start_time
+        del iterator
+
+    wait_ms = np.asarray(wait_s) * 1e3
+    h2d_ms = np.asarray(h2d_s) * 1e3
+    return {
+        "num_batches": len(wait_s),
+        "num_samples": num_samples,
+        "samples_per_s": num_samples / max(measured_s, 1e-9),
+        "batch_p50_ms": float(np.percentile(wait_ms, 50)) if len(wait_ms) else None,
+        "batch_p99_ms": float(np.percentile(wait_ms, 99)) if len(wait_ms) else None,
+        "h2d_mean_ms": float(np.mean(h2d_ms)) if len(h2d_ms) else None,
+        "h2d_gb_per_s": float(np.sum(batch_bytes) / 1e9 / max(np.sum(h2d_s), 1e-9)) if h2d_s else None,
+        "batch_mb": float(np.mean(batch_bytes) / 1e6) if batch_bytes else None,
+        "first_batch_s": first_batch_s,
+        "main_rss_mb": peak_main_rss,
+        "worker_rss_mb_total": float(sum(peak_worker_rss)),
+        "worker_rss_mb_max": float(max(peak_worker_rss, default=0.0)),
+    }
+
+
+def run_key(run):
+    return (
+        f"{run['layout']}|{run['bev_format']}|bs{run['batch_size']}|w{run['num_workers']}"
+        f"|pf{run['prefetch_factor']}|persist{int(run['persistent_workers'])}|block{run.get('block_size', 0)}"
+    )
+
+
+def compare_with_baseline(results, baseline, tolerance=0.10):
+    '''
+    Match runs by configuration with a stored result file. A run regresses when its
+    samples/s drops, or its p99 batch latency grows, by more than tolerance.
+    '''
+    baseline_runs = {run_key(run): run for run in baseline["runs"]}
+    comparison = []
+    for run in results["runs"]:
+        key = run_key(run)
+        if key not in baseline_runs:
+            continue
+        base = baseline_runs[key]
+        throughput_change = run["samples_per_s"] / max(base["samples_per_s"], 1e-9) - 1.0
+        p99_change = None
+        if run["batch_p99_ms"] is not None and base["batch_p99_ms"]:
+            p99_change = run["batch_p99_ms"] / base["batch_p99_ms"] - 1.0
+        comparison.append({
+            "key": key,
+            "samples_per_s": run["samples_per_s"],
+            "baseline_samples_per_s": base["samples_per_s"],
+            "throughput_change": throughput_change,
+            "batch_p99_ms": run["batch_p99_ms"],
+            "baseline_batch_p99_ms": base["batch_p99_ms"],
+            "p99_change": p99_change,
+            "regression": throughput_change < -tolerance or (p99_change is not None and p99_change > tolerance),
+        })
+    return comparison
+
+
+def benchmark_dataloader(
+        dataset_path=None,
+        batch_sizes=(128,),
+        num_workers_list=(0, 4, 8),
+        prefetch_factors=(2,),
+        persistent_options=(False, True),
+        layouts=(STORED_LAYOUT,),
+        bev_formats=BEV_FORMATS,
+        block_sizes=(0,),
+        window_blocks=8,
+        num_batches=50,
+        warmup_batches=5,
+        num_epochs=2,
+        device=None,
+        work_dir=None,
+        output_path=None,
+        baseline_path=None,
+        tolerance=0.10,
+    ):
+    '''
+    Sweep PedestrianStepDataset + build_dataloader settings over one dataset and report
+    samples/s, p50 / p99 batch wait latency, host-to-device time and worker RSS per
+    configuration. Layouts other than "stored" ("codec:chunk_samples:packed|dense") are
+    written with convert_dataset into work_dir first; bev_formats picks dense float32,
+    dense uint8 or bit-packed samples. block_sizes > 0 shuffle with BlockShuffleSampler
+    (window_blocks blocks per shuffle window), 0 with the uniform DataLoader shuffle. With baseline_path the result is compared with a
+    stored result JSON of the same sweep.
+    '''
+    training_config = load_config("training_config.json")
+    if dataset_path is None:
+        dataset_path = training_config["bc"]["dataset_path"]
+    params_cfg = training_config["bc"]["params"]
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+
+    cleanup = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix="loader_bench_") if work_dir is None else work_dir
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = {
+        "dataset": os.path.abspath(dataset_path),
+        "environment": {
+            "torch": torch.__version__,
+            "device": torch.cuda.get_device_name(device) if device.type == "cuda" else "cpu",
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "num_batches": num_batches,
+        "warmup_batches": warmup_batches,
+        "num_epochs": num_epochs,
+        "runs": [],
+    }
+    try:
+        for layout in layouts:
+            layout_path = dataset_path
+            if layout != STORED_LAYOUT:
+                if not dataset_path.endswith(".h5"):
+                    raise ValueError("Layout sweeps convert a single .h5 dataset; use --layouts stored for shards")
+                codec, chunk_samples, pack_bev_data = parse_layout(layout)
+                layout_path = os.path.join(work_dir, layout.replace(":", "_") + ".h5")
+                convert_dataset(
+                    dataset_path, layout_path, codec=codec, chunk_samples=chunk_samples,
+                    pack_bev_data=pack_bev_data, verify_samples=0,
+                )
+
+            for bev_format in bev_formats:
+                dataset = PedestrianStepDataset(
+                    h5_path=layout_path,
+                    goal_scale=params_cfg["goal_scale"],
+                    clip_bound=params_cfg["clip_bound"],
+                    speed_eps=params_cfg["direction_valid_speed_eps"],
+                    future_steps=params_cfg["future_steps"],
+                    packed_bev=bev_format == "packed",
+                    bev_dtype="uint8" if bev_format == "uint8" else "float32",
+                )
+                loader_options = itertools.product(
+                    block_sizes, batch_sizes, num_workers_list, prefetch_factors, persistent_options,
+                )
+                for block_size, batch_size, num_workers, prefetch_factor, persistent_workers in loader_options:
+                    # prefetch_factor / persistent_workers only apply to worker processes
+                    if num_workers == 0 and (prefetch_factor != prefetch_factors[0] or persistent_workers != persistent_options[0]):
+                        continue
+                    run = {
+                        "layout": layout,
+                        "bev_format": bev_format,
+                        "batch_size": batch_size,
+                        "num_workers": num_workers,
+                        "prefetch_factor": prefetch_factor if num_workers > 0 else None,
+                        "persistent_workers": bool(persistent_workers) if num_workers > 0 else False,
+                        "block_size": block_size,
+                        "window_blocks": window_blocks if block_size > 0 else None,
+                    }
+                    loader = build_dataloader(
+                        dataset=dataset,
+                        batch_size=batch_size,
+                        shuffle=True,
+                        num_workers=num_workers,
+                        persistent_workers=persistent_workers,
+                        prefetch_factor=prefetch_factor,
+                        block_size=block_size,
+                        window_blocks=window_blocks,
+                    )
+                    run.update(time_loader(loader, device, num_batches, warmup_batches, num_epochs))
+                    del loader
+                    results["runs"].append(run)
+                    print(
+                        f"[benchmark_dataloader] {run_key(run):<52} {run['samples_per_s']:9.0f} samples/s  "
+                        f"p50={run['batch_p50_ms']:7.1f} ms  p99={run['batch_p99_ms']:7.1f} ms  "
+                        f"h2d={run['h2d_mean_ms']:6.1f} ms ({run['batch_mb']:.1f} MB)  "
+                        f"workers={run['worker_rss_mb_total']:7.0f} MB RSS"
+                    )
+                dataset.close()
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if baseline_path is not None:
+        with open(baseline_path, "r") as file:
+            baseline = json.load(file)
+        results["baseline"] = os.path.abspath(baseline_path)
+        results["baseline_comparison"] = compare_with_baseline(results, baseline, tolerance)
+        for entry in results["baseline_comparison"]:
+            flag = "REGRESSION" if entry["regression"] else "ok"
+            p99 = f"{100.0 * entry['p99_change']:+6.1f}%" if entry["p99_change"] is not None else "   n/a"
+            print(
+                f"[benchmark_dataloader] vs baseline {entry['key']:<52} "
+                f"samples/s {100.0 * entry['throughput_change']:+6.1f}%  p99 {p99}  {flag}"
+            )
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PedestrianStepDataset + DataLoader throughput.")
+    parser.add_argument("dataset", nargs="?", default=None, help="Dataset (.h5, shard directory or manifest; default: bc.dataset_path).")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[128])
+    parser.add_argument("--num-workers", type=int, nargs="+", default=[0, 4, 8])
+    parser.add_argument("--prefetch-factors", type=int, nargs="+", default=[2])
+    parser.add_argument("--persistent", type=int, nargs="+", default=[0, 1], choices=[0, 1],
+                        help="persistent_workers values to sweep (0 / 1).")
+    parser.add_argument("--layouts", nargs="+", default=[STORED_LAYOUT],
+                        help="'stored' and / or codec:chunk_samples:packed|dense, e.g. gzip-4:1:packed none:0:dense.")
+    parser.add_argument("--bev-formats", nargs="+", default=list(BEV_FORMATS), choices=BEV_FORMATS)
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[0],
+                        help="BlockShuffleSampler block sizes to sweep (0: uniform shuffle).")
+    parser.add_argument("--window-blocks", type=int, default=8, help="Blocks per BlockShuffleSampler shuffle window.")
+    parser.add_argument("--num-batches", type=int, default=50, help="Timed batches per epoch.")
+    parser.add_argument("--warmup-batches", type=int, default=5)
+    parser.add_argument("--num-epochs", type=int, default=2)
+    parser.add_argument("--device", default=None, help="Target device (default: cuda if available).")
+    parser.add_argument("--work-dir", default=None, help="Directory for converted layouts (default: a temp dir).")
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    parser.add_argument("--baseline", default=None, help="Result JSON of an earlier run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change counted as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression.")
+    args = parser.parse_args()
+
+    results = benchmark_dataloader(
+        dataset_path=args.dataset,
+        batch_sizes=args.batch_sizes,
+        num_workers_list=args.num_workers,
+        prefetch_factors=args.prefetch_factors,
+        persistent_options=[bool(value) for value in args.persistent],
+        layouts=args.layouts,
+        bev_formats=args.bev_formats,
+        block_sizes=args.block_sizes,
+        window_blocks=args.window_blocks,
+        num_batches=args.num_batches,
+        warmup_batches=args.warmup_batches,
+        num_epochs=args.num_epochs,
+        device=args.device,
+        work_dir=args.work_dir,
+        output_path=args.output,
+        baseline_path=args.baseline,
+        tolerance=args.tolerance,
+    )
+    if args.fail_on_regression and any(entry["regression"] for entry in results.get("baseline_comparison", [])):
+        raise SystemExit(1)
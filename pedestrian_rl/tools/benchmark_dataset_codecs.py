@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import h5py
+import numpy as np
+
+from ..utils.bev_packing import HERO_CHANNEL, HERO_VALUE
+from ..utils.config_loader import load_config
+from ..utils.data_utils import PedestrianStepDataset, episode_group_name, write_ped_arrays
+from ..utils.dataset_codecs import available_codecs
+
+
+def make_synthetic_bevs(num_steps, height, width, num_channels=5, rng=None):
+    '''
+    BEV sequence of one walking hero with the structure of real BEVs: a rotating road
+    cross (lane / sidewalk / shoulder bands), moving vehicle boxes, other walkers and the
+    hero disc. Values are 0 / 255, and HERO_VALUE for the hero, as in BEVSample.get_bev().
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    bevs = np.zeros((num_steps, height, width, num_channels), dtype=np.uint8)
+    center = np.array([width / 2.0, height / 2.0])
+
+    angle = rng.uniform(0, np.pi)
+    offset = rng.uniform(-20, 20, 2)
+    vehicles = rng.uniform(0, [width, height], (int(rng.integers(2, 8)), 2))
+    vehicle_vel = rng.normal(0, 2.0, vehicles.shape)
+    walkers = rng.uniform(0, [width, height], (int(rng.integers(3, 15)), 2))
+    walker_vel = rng.normal(0, 0.5, walkers.shape)
+
+    for t in range(num_steps):
+        angle += rng.normal(0, 0.01)
+        offset += rng.normal(0, 0.3, 2)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+
+        # Static bands: (channel, half width of the band in pixels)
+        for channel, half_band in ((1, 36), (2, 28), (0, 22)):
+            canvas = np.ascontiguousarray(bevs[t, :, :, channel])
+            for axis in (0, 1):
+                band = np.array([[-half_band, -400], [half_band, -400], [half_band, 400], [-half_band, 400]], dtype=np.float64)
+                if axis == 1:
+                    band = band[:, ::-1]
+                polygon = (band @ rotation.T + center + offset).astype(np.int32)
+                cv2.fillPoly(canvas, [polygon], color=255)
+            bevs[t, :, :, channel] = canvas
+        bevs[t, :, :, 1][bevs[t, :, :, 2] > 0] = 0
+        bevs[t, :, :, 2][bevs[t, :, :, 0] > 0] = 0
+
+        vehicles += vehicle_vel
+        vehicle_canvas = np.ascontiguousarray(bevs[t, :, :, 3])
+        for x, y in vehicles:
+            box = np.array([[x - 16, y - 8], [x + 16, y - 8], [x + 16, y + 8], [x - 16, y + 8]], dtype=np.int32)
+            cv2.fillPoly(vehicle_canvas, [box], color=255)
+        bevs[t, :, :, 3] = vehicle_canvas
+
+        walkers += walker_vel
+        walker_canvas = np.ascontiguousarray(bevs[t, :, :, HERO_CHANNEL])
+        for x, y in walkers:
+            cv2.circle(walker_canvas, (int(x), int(y)), radius=3, color=255, thickness=-1)
+        cv2.circle(walker_canvas, (width // 2, height // 2), radius=4, color=HERO_VALUE, thickness=-1)
+        bevs[t, :, :, HERO_CHANNEL] = walker_canvas
+
+    return bevs
+
+
+def make_synthetic_columns(num_steps, height, width, num_channels=5, rng=None, fixed_delta_seconds=0.05):
+    '''All convert_to_dataset columns of one synthetic pedestrian track.'''
+    rng = np.random.default_rng() if rng is None else rng
+    heading = rng.uniform(-np.pi, np.pi)
+    speed = rng.uniform(0.8, 2.0)
+    direction = np.array([np.cos(heading), np.sin(heading), 0.0], dtype=np.float32)
+
+    start = np.array([rng.uniform(-50, 50), rng.uniform(-50, 50), 0.2], dtype=np.float32)
+    steps = np.arange(num_steps, dtype=np.float32)[:, None]
+    locations = start + steps * fixed_delta_seconds * speed * direction
+    velocity = np.tile(direction * speed, (num_steps, 1)).astype(np.float32)
+
+    return {
+        "frame_id": np.arange(num_steps, dtype=np.int32),
+        "timestamp": np.arange(num_steps, dtype=np.float64) * fixed_delta_seconds,
+        "bev_data": make_synthetic_bevs(num_steps, height, width, num_channels, rng=rng),
+        "current_location": locations,
+        "velocity": velocity,
+        "speed": np.full(num_steps, speed, dtype=np.float32),
+        "yaw_heading": np.full(num_steps, heading, dtype=np.float32),
+        "goal_location": np.tile(start + 40.0 * direction, (num_steps, 1)).astype(np.float32),
+        "target_speed": np.full(num_steps, speed, dtype=np.float32),
+        "target_direction": np.tile(direction, (num_steps, 1)),
+    }
+
+
+def write_synthetic_dataset(output_path, tracks, codec, chunk_samples, pack_bev_data):
+    '''Write pre-generated tracks {(episode, ped_id): columns} and return the write time (s).'''
+    start_time = time.perf_counter()
+    with h5py.File(output_path, "w") as file:
+        for (episode_idx, ped_id), columns in tracks.items():
+            episode_grp = file.require_group(episode_group_name(episode_idx))
+            write_ped_arrays(
+                episode_grp, ped_id, columns,
+                pack_bev_data=pack_bev_data, codec=codec, chunk_samples=chunk_samples,
+            )
+    return time.perf_counter() - start_time
+
+
+def time_random_reads(dataset_path, num_reads, packed_bev, seed=0):
+    '''Random-access PedestrianStepDataset.__getitem__ throughput (samples / s).'''
+    dataset = PedestrianStepDataset(h5_path=dataset_path, packed_bev=packed_bev)
+    indices = np.random.default_rng(seed).integers(0, len(dataset), num_reads)
+    try:
+        dataset[int(indices[0])]            # open the file outside the timed loop
+        start_time = time.perf_counter()
+        for idx in indices:
+            dataset[int(idx)]
+        elapsed = time.perf_counter() - start_time
+    finally:
+        dataset.close()
+    return num_reads / max(elapsed, 1e-9)
+
+
+def benchmark_dataset_codecs(
+        codecs=None,
+        chunk_samples_list=(1, 8, 0),
+        pack_options=(False, True),
+        num_episodes=4,
+        peds_per_episode=5,
+        steps_per_ped=100,
+        num_reads=500,
+        work_dir=None,
+        output_path=None,
+        seed=0,
+    ):
+    '''
+    Write the same synthetic dataset with every codec x chunking x packing combination and
+    report write time, file size and random-read throughput of PedestrianStepDataset.
+    chunk_samples 0 means h5py auto-chunking (the original convert_to_dataset layout).
+    '''
+    codecs = available_codecs() if codecs is None else list(codecs)
+    height, width = load_config("sim_config.json")["bev"]["size"]
+
+    rng = np.random.default_rng(seed)
+    tracks = {
+        (episode_idx, 1000 + ped_idx): make_synthetic_columns(steps_per_ped, height, width, rng=rng)
+        for episode_idx in range(num_episodes)
+        for ped_idx in range(peds_per_episode)
+    }
+    num_samples = num_episodes * peds_per_episode * steps_per_ped
+    raw_mb = sum(columns["bev_data"].nbytes for columns in tracks.values()) / 1e6
+    print(f"[benchmark_dataset_codecs] {num_samples} synthetic samples, {raw_mb:.1f} MB raw BEV")
+
+    cleanup = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix="codec_bench_") if work_dir is None else work_dir
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = {
+        "num_samples": num_samples,
+        "bev_size": [height, width],
+        "raw_bev_mb": raw_mb,
+        "num_reads": num_reads,
+        "runs": [],
+    }
+    try:
+        for codec in codecs:
+            for chunk_samples in chunk_samples_list:
+                for pack_bev_data in pack_options:
+                    name = f"{codec}_chunk{chunk_samples}_{'packed' if pack_bev_data else 'dense'}"
+                    dataset_path = os.path.join(work_dir, f"{name}.h5")
+
+                    write_s = write_synthetic_dataset(dataset_path, tracks, codec, chunk_samples, pack_bev_data)
+                    size_mb = os.path.getsize(dataset_path) / 1e6
+                    reads_per_s = time_random_reads(dataset_path, num_reads, packed_bev=pack_bev_data, seed=seed)
+                    os.remove(dataset_path)
+
+                    run = {
+                        "codec": codec,
+                        "chunk_samples": chunk_samples,
+                        "packed_bev": pack_bev_data,
+                        "write_s": write_s,
+                        "write_samples_per_s": num_samples / max(write_s, 1e-9),
+                        "file_mb": size_mb,
+                        "compression_ratio": raw_mb / max(size_mb, 1e-9),
+                        "random_read_samples_per_s": reads_per_s,
+                    }
+                    results["runs"].append(run)
+                    print(
+                        f"[benchmark_dataset_codecs] {name:<34} write={write_s:6.2f} s "
+                        f"size={size_mb:8.2f} MB (x{run['compression_ratio']:5.1f}) "
+                        f"read={reads_per_s:8.0f} samples/s"
+                    )
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HDF5 codecs / chunking for the BEV dataset.")
+    parser.add_argument("--codecs", nargs="+", default=None,
+                        help=f"Codec names (default: all available, {available_codecs()}).")
+    parser.add_argument("--chunk-samples", type=int, nargs="+", default=[1, 8, 0],
+                        help="Samples per chunk; 0 = h5py auto-chunking.")
+    parser.add_argument("--pack", choices=["dense", "packed", "both"], default="both")
+    parser.add_argument("--num-episodes", type=int, default=4)
+    parser.add_argument("--peds-per-episode", type=int, default=5)
+    parser.add_argument("--steps-per-ped", type=int, default=100)
+    parser.add_argument("--num-reads", type=int, default=500)
+    parser.add_argument("--work-dir", default=None, help="Directory for the temporary files.")
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    args = parser.parse_args()
+
+    pack_options = {"dense": (False,), "packed": (True,), "both": (False, True)}[args.pack]
+    benchmark_dataset_codecs(
+        codecs=args.codecs,
+        chunk_samples_list=args.chunk_samples,
+        pack_options=pack_options,
+        num_episodes=args.num_episodes,
+        peds_per_episode=args.peds_per_episode,
+        steps_per_ped=args.steps_per_ped,
+        num_reads=args.num_reads,
+        work_dir=args.work_dir,
+        output_path=args.output,
+    )
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+
+from ..data_collection.episode_buffer import EpisodeBuffer
+from ..data_collection.state_action_pair import PedestrianStateAction
+from ..utils.config_loader import load_config
+from ..utils.data_utils import episode_ped_columns, write_ped_arrays
+
+
+def make_samples(num_peds, steps_per_ped, bev_shape=None, seed=0, fixed_delta_seconds=0.05):
+    '''
+    Yield PedestrianStateAction samples in sampler order (one pedestrian per tick, round
+    robin). Every sample gets its own BEV array, as a fresh render does; bev_shape None
+    mimics trajectory-only recording.
+    '''
+    rng = np.random.default_rng(seed)
+    bev_template = None if bev_shape is None else rng.integers(0, 2, bev_shape, dtype=np.uint8) * 255
+    for frame_id in range(num_peds * steps_per_ped):
+        ped = SimpleNamespace(id=1000 + frame_id % num_peds)
+        ped_info = PedestrianStateAction(target_ped=ped, frame_id=frame_id, timestamp=frame_id * fixed_delta_seconds)
+        ped_info.set_states(
+            bev_data=None if bev_template is None else bev_template.copy(),
+            current_location=rng.uniform(-50, 50, 3).astype(np.float32),
+            velocity=rng.normal(0, 1, 3).astype(np.float32),
+            speed=float(rng.uniform(0, 2)),
+            yaw_heading=float(rng.uniform(-np.pi, np.pi)),
+            goal_location=rng.uniform(-50, 50, 3).astype(np.float32),
+        )
+        ped_info.set_actions(
+            target_speed=float(rng.uniform(0, 2)),
+            target_direction=rng.normal(0, 1, 3).astype(np.float32),
+        )
+        yield ped_info
+
+
+def collect(buffer, samples):
+    '''Fill buffer (list or EpisodeBuffer); returns (buffer, traced bytes held, seconds).'''
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    for ped_info in samples:
+        buffer.append(ped_info)
+    elapsed = time.perf_counter() - start_time
+    held_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    return buffer, held_bytes, elapsed
+
+
+def time_conversion(episode_data, codec, num_repeats=3):
+    '''Best-of-n seconds of episode_ped_columns alone and with the HDF5 write (in-memory file).'''
+    columns_times, write_times = [], []
+    for _ in range(num_repeats):
+        start_time = time.perf_counter()
+        ped_columns = episode_ped_columns(episode_data)
+        columns_times.append(time.perf_counter() - start_time)
+
+        with h5py.File(f"episode_buffer_bench_{os.getpid()}.h5", "w", driver="core", backing_store=False) as file:
+            episode_grp = file.create_group("episode")
+            start_time = time.perf_counter()
+            for ped_id, columns in episode_ped_columns(episode_data).items():
+                write_ped_arrays(episode_grp, ped_id, columns, pack_bev_data=False, codec=codec)
+            write_times.append(time.perf_counter() - start_time + columns_times[-1])
+    return min(columns_times), min(write_times), ped_columns
+
+
+def benchmark_episode_buffer(num_peds=10, steps_per_ped=300, bev_shape=None, codec="none", output_path=None):
+    '''
+    Compare the list of PedestrianStateAction episode buffer with EpisodeBuffer: memory held
+    per sample, collection time, and time to build the columns / write one episode.
+    '''
+    if bev_shape is None:
+        height, width = load_config("sim_config.json")["bev"]["size"]
+        bev_shape = (height, width, 5)
+    num_samples = num_peds * steps_per_ped
+
+    results = {"num_samples": num_samples, "num_peds": num_peds, "bev_shape": list(bev_shape), "codec": codec, "runs": []}
+    for with_bev in (True, False):
+        shape = tuple(bev_shape) if with_bev else None
+        reference = None
+        for name, buffer in (("list", []), ("episode_buffer", EpisodeBuffer())):
+            buffer, held_bytes, collect_s = collect(buffer, make_samples(num_peds, steps_per_ped, shape))
+            columns_s, write_s, ped_columns = time_conversion(buffer, codec)
+            if reference is None:
+                reference = ped_columns
+            else:
+                for ped_id, columns in reference.items():
+                    for key, values in columns.items():
+                        if not np.array_equal(values, ped_columns[ped_id][key]):
+                            raise RuntimeError(f"EpisodeBuffer column {key} of ped {ped_id} differs from the list path")
+
+            run = {
+                "buffer": name,
+                "bev": with_bev,
+                "bytes_per_sample": held_bytes / num_samples,
+                "collect_us_per_sample": collect_s / num_samples * 1e6,
+                "columns_ms": columns_s * 1e3,
+                "columns_and_write_ms": write_s * 1e3,
+            }
+            results["runs"].append(run)
+            print(
+                f"[benchmark_episode_buffer] {name:<15} bev={str(with_bev):<5} "
+                f"{run['bytes_per_sample']:10.0f} B/sample  append={run['collect_us_per_sample']:6.1f} us  "
+                f"columns={run['columns_ms']:8.2f} ms  columns+write={run['columns_and_write_ms']:8.2f} ms"
+            )
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the columnar EpisodeBuffer against a list of samples.")
+    parser.add_argument("--num-peds", type=int, default=10)
+    parser.add_argument("--steps-per-ped", type=int, default=300)
+    parser.add_argument("--bev-shape", type=int, nargs=3, default=None, metavar=("H", "W", "C"),
+                        help="BEV shape (default: bev.size x 5 channels).")
+    parser.add_argument("--codec", default="none", help="BEV codec of the timed HDF5 write.")
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    args = parser.parse_args()
+
+    benchmark_episode_buffer(
+        num_peds=args.num_peds,
+        steps_per_ped=args.steps_per_ped,
+        bev_shape=args.bev_shape,
+        codec=args.codec,
+        output_path=args.output,
+    )
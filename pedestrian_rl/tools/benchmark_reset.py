@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import time
+
+import carla
+import numpy as np
+
+from ..utils.config_loader import load_config
+from ..utils.sim_utils import AggressiveVehicles, CrossroadPedestrians, cleanup_simulation
+
+
+def time_resets(world, aggressive_vehicles, crossroad_pedestrians, num_resets):
+    '''Time cleanup + vehicle spawn + pedestrian spawn for num_resets episodes.'''
+    vehicle_times = []
+    reset_times = []
+
+    for _ in range(num_resets):
+        reset_start = time.perf_counter()
+        cleanup_simulation(world)
+        crossroad_pedestrians.reset_pedestrians()
+
+        vehicle_start = time.perf_counter()
+        aggressive_vehicles.aggressive_vehicles_spawn()
+        vehicle_times.append(time.perf_counter() - vehicle_start)
+
+        crossroad_pedestrians.pedestrians_spawn()
+        world.tick()
+        reset_times.append(time.perf_counter() - reset_start)
+
+    return vehicle_times, reset_times
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64) * 1000.0
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "min_ms": float(values.min()),
+    }
+
+
+def benchmark_reset(host="localhost", port=2000, num_resets=10, output_path=None):
+    '''
+    Compare episode reset latency of the uncached (waypoint regeneration + per-vehicle spawn)
+    and cached (candidate cache + batched spawn) vehicle paths on a running CARLA server.
+    The first cached reset pays the one-time candidate computation and is reported separately.
+    '''
+    config = load_config("sim_config.json")
+    sim_config = config["simulation"]
+
+    client = carla.Client(host, port)
+    client.set_timeout(20.0)
+    world = client.get_world()
+
+    settings = world.get_settings()
+    settings.synchronous_mode = True
+    settings.fixed_delta_seconds = sim_config["fixed_delta_seconds"]
+    world.apply_settings(settings)
+
+    intersection_position = carla.Location(
+        x=sim_config["intersection"]["x"],
+        y=sim_config["intersection"]["y"],
+        z=sim_config["intersection"]["z"],
+    )
+    crossroad_pedestrians = CrossroadPedestrians(world, location=intersection_position)
+
+    results = {"num_resets": num_resets}
+    try:
+        uncached = AggressiveVehicles(client, world, location=intersection_position, use_spawn_cache=False)
+        vehicle_times, reset_times = time_resets(world, uncached, crossroad_pedestrians, num_resets)
+        results["uncached"] = {"vehicle_spawn": summarize(vehicle_times), "reset": summarize(reset_times)}
+
+        AggressiveVehicles._candidate_cache.clear()
+        cached = AggressiveVehicles(client, world, location=intersection_position, use_spawn_cache=True)
+        vehicle_times, reset_times = time_resets(world, cached, crossroad_pedestrians, num_resets + 1)
+        results["cached_first_reset_ms"] = reset_times[0] * 1000.0
+        results["cached"] = {"vehicle_spawn": summarize(vehicle_times[1:]), "reset": summarize(reset_times[1:])}
+    finally:
+        cleanup_simulation(world)
+
+    for mode in ("uncached", "cached"):
+        print(
+            f"[benchmark_reset] {mode:>8}: "
+            f"vehicle_spawn mean={results[mode]['vehicle_spawn']['mean_ms']:.1f} ms, "
+            f"reset mean={results[mode]['reset']['mean_ms']:.1f} ms "
+            f"(p95={results[mode]['reset']['p95_ms']:.1f} ms)"
+        )
+    print(f"[benchmark_reset] cached first reset (builds cache): {results['cached_first_reset_ms']:.1f} ms")
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scenario reset latency.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2000)
+    parser.add_argument("--num-resets", type=int, default=10)
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    args = parser.parse_args()
+
+    benchmark_reset(host=args.host, port=args.port, num_resets=args.num_resets, output_path=args.output)
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+def load_epoch_curves(checkpoint_root, stage="val", metric="total"):
+    '''{seed: per-epoch metric} from the seed_*/training_history.json files of one bc_training run.'''
+    curves = {}
+    for name in sorted(os.listdir(checkpoint_root)):
+        history_path = os.path.join(checkpoint_root, name, "training_history.json")
+        if not name.startswith("seed_") or not os.path.isfile(history_path):
+            continue
+        with open(history_path, "r") as file:
+            history = json.load(file)
+        curves[history["seed"]] = np.asarray(history["epoch"][stage][metric], dtype=np.float64)
+    if not curves:
+        raise FileNotFoundError(f"No seed_*/training_history.json under {checkpoint_root}")
+    return curves
+
+
+def _seed_mean_std(curves):
+    num_epochs = min(len(curve) for curve in curves.values())
+    stacked = np.stack([curve[:num_epochs] for curve in curves.values()])
+    return stacked.mean(axis=0), stacked.std(axis=0)
+
+
+def compare_training_histories(reference_root, candidate_root, stage="val", metric="total", tolerance=0.05, output_path=None):
+    '''
+    Check that a training change (e.g. the sampler) leaves a learning curve unchanged.
+
+    The seed-mean curves of two bc_training checkpoint roots are compared epoch by epoch.
+    An epoch matches when the difference is within tolerance (relative) of the reference
+    or within two standard deviations of the reference seeds, whichever is larger.
+    '''
+    reference_mean, reference_std = _seed_mean_std(load_epoch_curves(reference_root, stage, metric))
+    candidate_mean, _ = _seed_mean_std(load_epoch_curves(candidate_root, stage, metric))
+    num_epochs = min(len(reference_mean), len(candidate_mean))
+    reference_mean, reference_std = reference_mean[:num_epochs], reference_std[:num_epochs]
+    candidate_mean = candidate_mean[:num_epochs]
+
+    diff = candidate_mean - reference_mean
+    allowed = np.maximum(tolerance * np.abs(reference_mean), 2.0 * reference_std)
+    within = np.abs(diff) <= allowed
+    result = {
+        "reference": os.path.abspath(reference_root),
+        "candidate": os.path.abspath(candidate_root),
+        "stage": stage,
+        "metric": metric,
+        "tolerance": tolerance,
+        "num_epochs": int(num_epochs),
+        "reference_mean": reference_mean.tolist(),
+        "reference_seed_std": reference_std.tolist(),
+        "candidate_mean": candidate_mean.tolist(),
+        "max_abs_diff": float(np.max(np.abs(diff))) if num_epochs else 0.0,
+        "final_diff": float(diff[-1]) if num_epochs else 0.0,
+        "best_diff": float(candidate_mean.min() - reference_mean.min()) if num_epochs else 0.0,
+        "epochs_outside": [int(epoch + 1) for epoch in np.flatnonzero(~within)],
+        "unchanged": bool(np.all(within)),
+    }
+
+    print(
+        f"[compare_training_histories] {stage} {metric} over {num_epochs} epochs: "
+        f"max |diff|={result['max_abs_diff']:.6f}, final diff={result['final_diff']:+.6f}, "
+        f"best diff={result['best_diff']:+.6f} -> {'unchanged' if result['unchanged'] else 'CHANGED'}"
+    )
+    if result["epochs_outside"]:
+        print(f"[compare_training_histories] Epochs outside the tolerance: {result['epochs_outside']}")
+
+    if output_path is not None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            json.dump(result, file, indent=4)
+        print(f"Saved: {output_path}")
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the epoch curves of two bc_training runs.")
+    parser.add_argument("reference", help="Checkpoint root of the reference run (bc.checkpoint_dir).")
+    parser.add_argument("candidate", help="Checkpoint root of the run to check.")
+    parser.add_argument("--stage", default="val", choices=["train", "val"])
+    parser.add_argument("--metric", default="total", help="history epoch key (total, speed, direction, joint_accuracy, ...).")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--output", default=None, help="Optional JSON result path.")
+    args = parser.parse_args()
+
+    result = compare_training_histories(
+        args.reference, args.candidate, stage=args.stage, metric=args.metric,
+        tolerance=args.tolerance, output_path=args.output,
+    )
+    if not result["unchanged"]:
+        raise SystemExit(1)
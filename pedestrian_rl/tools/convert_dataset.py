@@ -0,0 +1,262 @@
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from ..data_collection.bev.bev_seg_sample import SemanticBEVSample
+from ..utils.bev_packing import HERO_CHANNEL, HERO_VALUE, pack_bev, stored_hero_channel
+from ..utils.data_utils import (
+    episode_group_name,
+    iter_episode_names,
+    parse_episode_id,
+    read_dense_bev,
+    write_dataset_index,
+)
+from ..utils.dataset_codecs import bev_dataset_kwargs
+
+
+def assign_episode_names(episode_names):
+    '''
+    Map source episode group names to zero-padded names that keep their numeric ids.
+    Names without an id ("episode") or with a duplicate id get fresh ids after the largest one.
+    '''
+    mapping = {}
+    used_ids = set()
+    unassigned = []
+    for name in sorted(episode_names):
+        episode_id = parse_episode_id(name)
+        if episode_id is None or episode_id in used_ids:
+            unassigned.append(name)
+            continue
+        used_ids.add(episode_id)
+        mapping[name] = episode_group_name(episode_id)
+
+    next_id = max(used_ids) + 1 if used_ids else 0
+    for name in unassigned:
+        print(f"[convert_dataset] {name} has no unique episode id, renamed to {episode_group_name(next_id)}")
+        mapping[name] = episode_group_name(next_id)
+        next_id += 1
+    return mapping
+
+
+def convert_ped_group(src_ped, dst_episode, ped_name, pack_bev_data, codec, chunk_samples, block_samples):
+    '''
+    Copy one pedestrian group. Non-BEV datasets are small and copied whole; the BEV is
+    streamed in blocks of block_samples rows and re-encoded (dense or packed) with the
+    requested codec and chunking. The hero channel comes from the source BEV attrs
+    (files without it were written by the default SemanticBEVSample collector).
+    '''
+    dst_ped = dst_episode.create_group(ped_name)
+    dst_ped.attrs.update(src_ped.attrs)
+
+    def copy_small(src_grp, dst_grp):
+        for name, item in src_grp.items():
+            if isinstance(item, h5py.Group):
+                copy_small(item, dst_grp.create_group(name))
+            elif name not in ("bev_data", "bev_packed"):
+                dst_grp.create_dataset(name, data=item[()])
+                dst_grp[name].attrs.update(item.attrs)
+
+    copy_small(src_ped, dst_ped)
+
+    src_state = src_ped["state"]
+    num_steps = src_ped["frame_id"].shape[0]
+    if "bev_packed" in src_state:
+        src_bev = src_state["bev_packed"]
+        dense_shape = tuple(int(v) for v in src_bev.attrs["bev_shape"])
+        hero_channel = stored_hero_channel(src_bev.attrs, default=HERO_CHANNEL)  # as read_dense_bev
+    else:
+        src_bev = src_state["bev_data"]
+        dense_shape = tuple(int(v) for v in src_bev.shape[1:])
+        hero_channel = stored_hero_channel(src_bev.attrs, default=SemanticBEVSample.HERO_CHANNEL)
+    height, width, num_channels = dense_shape
+
+    if pack_bev_data:
+        sample_shape = (num_channels + 1, height, (width + 7) // 8)
+        dst_bev = dst_ped["state"].create_dataset(
+            "bev_packed", shape=(num_steps,) + sample_shape, dtype=np.uint8,
+            **bev_dataset_kwargs(sample_shape, num_steps, codec=codec, chunk_samples=chunk_samples),
+        )
+        if "bev_packed" in src_state:
+            dst_bev.attrs.update(src_bev.attrs)
+        else:
+            dst_bev.attrs["bev_shape"] = np.asarray(dense_shape, dtype=np.int32)
+    else:
+        dst_bev = dst_ped["state"].create_dataset(
+            "bev_data", shape=(num_steps,) + dense_shape, dtype=np.uint8,
+            **bev_dataset_kwargs(dense_shape, num_steps, codec=codec, chunk_samples=chunk_samples),
+        )
+    dst_bev.attrs["hero_channel"] = hero_channel
+    dst_bev.attrs["hero_value"] = HERO_VALUE
+
+    for start in range(0, num_steps, block_samples):
+        rows = slice(start, min(start + block_samples, num_steps))
+        if pack_bev_data and "bev_packed" in src_state:
+            dst_bev[rows] = src_state["bev_packed"][rows]
+        elif pack_bev_data:
+            dst_bev[rows] = pack_bev(read_dense_bev(src_state, rows), hero_channel=hero_channel)
+        else:
+            dst_bev[rows] = read_dense_bev(src_state, rows)
+
+    return num_steps
+
+
+def _convert_worker(input_path, part_path, episode_mapping, options):
+    '''Convert a subset of episodes into one part file (HDF5 files allow a single writer).'''
+    num_samples = 0
+    with h5py.File(input_path, "r") as src, h5py.File(part_path, "w") as dst:
+        for src_name, dst_name in episode_mapping:
+            src_episode = src[src_name]
+            dst_episode = dst.create_group(dst_name)
+            dst_episode.attrs.update(src_episode.attrs)
+            for ped_name, src_ped in src_episode.items():
+                num_samples += convert_ped_group(src_ped, dst_episode, ped_name, **options)
+    return num_samples
+
+
+def verify_conversion(input_path, output_path, episode_mapping, num_samples=200, seed=0):
+    '''
+    Compare num_samples random (episode, pedestrian, step) samples of the source and the
+    converted file field by field; BEVs are compared after decoding both to dense uint8.
+    Returns the number of mismatching samples.
+    '''
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    with h5py.File(input_path, "r") as src, h5py.File(output_path, "r") as dst:
+        ped_paths = [
+            (src_name, ped_name, src[src_name][ped_name]["frame_id"].shape[0])
+            for src_name in episode_mapping
+            for ped_name in src[src_name].keys()
+        ]
+        ped_paths = [path for path in ped_paths if path[2] > 0]
+        if len(ped_paths) == 0:
+            return 0
+
+        for _ in range(num_samples):
+            src_name, ped_name, num_steps = ped_paths[rng.integers(len(ped_paths))]
+            t = int(rng.integers(num_steps))
+            src_ped = src[src_name][ped_name]
+            dst_ped = dst[episode_mapping[src_name]][ped_name]
+
+            equal = np.array_equal(read_dense_bev(src_ped["state"], t), read_dense_bev(dst_ped["state"], t))
+            for field in ("frame_id", "timestamp"):
+                equal &= np.array_equal(src_ped[field][t], dst_ped[field][t])
+            for group in ("state", "action"):
+                for field, item in src_ped[group].items():
+                    if field in ("bev_data", "bev_packed"):
+                        continue
+                    equal &= np.array_equal(item[t], dst_ped[group][field][t])
+            if not equal:
+                mismatches += 1
+                print(f"[convert_dataset] mismatch at {src_name}/{ped_name}[{t}]")
+    return mismatches
+
+
+def convert_dataset(
+        input_path,
+        output_path,
+        codec=None,
+        chunk_samples=None,
+        pack_bev_data=False,
+        num_workers=4,
+        block_samples=256,
+        verify_samples=200,
+    ):
+    '''
+    Re-layout an existing pedestrian dataset without loading it into memory:
+    zero-padded episode names, the chosen BEV codec / chunking / packing, and the
+    compact /index used by PedestrianStepDataset. Episodes are converted by worker
+    processes into part files, which are then copied into the output file.
+    '''
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ValueError("convert_dataset writes a new file; output_path must differ from input_path")
+    start_time = time.time()
+    with h5py.File(input_path, "r") as src:
+        episode_names = iter_episode_names(src)
+    mapping = assign_episode_names(episode_names)
+
+    options = {
+        "pack_bev_data": bool(pack_bev_data),
+        "codec": codec,
+        "chunk_samples": chunk_samples,
+        "block_samples": int(block_samples),
+    }
+    num_workers = max(1, min(int(num_workers), len(episode_names)))
+    jobs = [sorted(mapping.items())[k::num_workers] for k in range(num_workers)]
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    part_dir = tempfile.mkdtemp(prefix="convert_dataset_", dir=os.path.dirname(output_path) or ".")
+    try:
+        part_paths = [os.path.join(part_dir, f"part_{k:03d}.h5") for k in range(num_workers)]
+        if num_workers == 1:
+            sample_counts = [_convert_worker(input_path, part_paths[0], jobs[0], options)]
+        else:
+            with mp.get_context("spawn").Pool(num_workers) as pool:
+                sample_counts = pool.starmap(
+                    _convert_worker,
+                    [(input_path, part_path, job, options) for part_path, job in zip(part_paths, jobs)],
+                )
+
+        # Group copies keep the encoded chunks, no second compression pass
+        with h5py.File(output_path, "w") as dst:
+            for part_path in part_paths:
+                with h5py.File(part_path, "r") as part:
+                    for episode_name in part.keys():
+                        part.copy(part[episode_name], dst, name=episode_name)
+            write_dataset_index(dst)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    num_samples = int(sum(sample_counts))
+    input_mb = os.path.getsize(input_path) / 1e6
+    output_mb = os.path.getsize(output_path) / 1e6
+    print(
+        f"[convert_dataset] {len(episode_names)} episodes / {num_samples} samples converted with "
+        f"{num_workers} workers in {time.time() - start_time:.1f}s: "
+        f"{input_mb:.1f} MB -> {output_mb:.1f} MB"
+    )
+
+    mismatches = 0
+    if verify_samples > 0:
+        mismatches = verify_conversion(input_path, output_path, mapping, num_samples=verify_samples)
+        if mismatches > 0:
+            raise RuntimeError(f"Converted dataset differs from the source in {mismatches}/{verify_samples} samples")
+        print(f"[convert_dataset] verified {verify_samples} random samples: identical")
+
+    return {
+        "num_episodes": len(episode_names),
+        "num_samples": num_samples,
+        "input_mb": input_mb,
+        "output_mb": output_mb,
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a pedestrian HDF5 dataset into the optimized layout.")
+    parser.add_argument("input", help="Source .h5 dataset.")
+    parser.add_argument("output", help="Converted .h5 dataset (new file).")
+    parser.add_argument("--codec", default=None, help="BEV codec, e.g. none, lzf, gzip-4 (default: dataset.compression).")
+    parser.add_argument("--chunk-samples", type=int, default=None, help="Samples per BEV chunk; 0 = h5py auto.")
+    parser.add_argument("--pack", dest="pack_bev", action="store_true", default=False, help="Store bit-packed BEVs (default: dense uint8).")
+    parser.add_argument("--no-pack", dest="pack_bev", action="store_false", help="Store dense uint8 BEVs (the default).")
+    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--block-samples", type=int, default=256, help="BEV rows streamed per read.")
+    parser.add_argument("--verify-samples", type=int, default=200, help="Random samples compared after conversion (0 to skip).")
+    args = parser.parse_args()
+
+    convert_dataset(
+        input_path=args.input,
+        output_path=args.output,
+        codec=args.codec,
+        chunk_samples=args.chunk_samples,
+        pack_bev_data=args.pack_bev,
+        num_workers=args.num_workers,
+        block_samples=args.block_samples,
+        verify_samples=args.verify_samples,
+    )
@@ -0,0 +1,386 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+
+import h5py
+import numpy as np
+
+from ..data_collection.bev.bev_raster import crop_static_layers, draw_dynamic_layers, pixel_local_grid
+from ..utils.bev_packing import packed_bev_shape
+from ..utils.config_loader import load_config
+from ..utils.data_utils import episode_group_name, write_dataset_index, write_ped_arrays
+from ..utils.dataset_shards import ShardWriter, resolve_dataset_paths, write_manifest
+from ..utils.geometry import obb_corners
+
+
+# Lane types of the synthetic raster, ordered by drawing priority (np.maximum keeps the road on top)
+SIDEWALK, SHOULDER, LANE = 1, 2, 3
+LANE_CODES = (LANE, SIDEWALK, SHOULDER)         # BEVWrapper.LAYER_ORDER static channels
+COLUMN_BYTES = 72                               # non-BEV bytes of one sample in the convert_to_dataset layout
+WALKER_Z = 1.0
+
+
+def synthetic_town_raster(rng, half_extent=100.0, resolution=0.25):
+    '''
+    Lane-type raster of a synthetic grid town centered on an intersection at the origin:
+    roads along x and y every block meters, each with driving lanes, shoulders and
+    sidewalks of random widths. Returns (grid, origin_xy, resolution, layout dict).
+    '''
+    layout = {
+        "block": float(rng.uniform(70.0, 110.0)),
+        "lane_half": float(rng.choice([3.5, 5.25, 7.0])),
+        "shoulder": float(rng.uniform(0.3, 1.0)),
+        "sidewalk": float(rng.uniform(2.5, 5.0)),
+    }
+    num_cells = int(round(2.0 * half_extent / resolution))
+    centers = -half_extent + (np.arange(num_cells) + 0.5) * resolution
+    road_dist = np.abs((centers + layout["block"] / 2.0) % layout["block"] - layout["block"] / 2.0)
+
+    edges = np.cumsum([layout["lane_half"], layout["shoulder"], layout["sidewalk"]])
+    codes = np.select(
+        [road_dist < edges[0], road_dist < edges[1], road_dist < edges[2]], [LANE, SHOULDER, SIDEWALK], 0,
+    ).astype(np.int32)
+    # Rows run along y (roads along x), columns along x (roads along y)
+    grid = np.maximum(codes[:, None], codes[None, :])
+    return grid, (-half_extent, -half_extent), resolution, layout
+
+
+def _sidewalk_point(rng, layout, num):
+    '''num random sidewalk points around the central intersection.'''
+    offset = layout["lane_half"] + layout["shoulder"] + layout["sidewalk"] / 2.0
+    along = rng.uniform(offset, 40.0, num) * rng.choice([-1.0, 1.0], num)
+    across = offset * rng.choice([-1.0, 1.0], num)
+    along_x = rng.random(num) < 0.5
+    return np.stack([np.where(along_x, along, across), np.where(along_x, across, along)], axis=-1)
+
+
+def simulate_walkers(rng, layout, num_walkers, num_ticks, fixed_delta_seconds):
+    '''
+    Kinematic walker tracks: each walker heads for a sidewalk goal (crossing roads on the
+    way) with a preferred speed, random wander and occasional stops, and halts at its goal.
+    The commanded speed / direction of tick t moves the walker to tick t + 1, with a short
+    speed response and a rate-limited body yaw. Returns a dict of (T, N, ...) arrays.
+    '''
+    dt = fixed_delta_seconds
+    xy = _sidewalk_point(rng, layout, num_walkers)
+    goal_xy = _sidewalk_point(rng, layout, num_walkers)
+    preferred_speed = rng.uniform(0.9, 1.7, num_walkers)
+    wander = np.zeros(num_walkers)
+    stop_ticks = np.zeros(num_walkers, dtype=np.int64)
+    direction = goal_xy - xy
+    direction /= np.maximum(np.linalg.norm(direction, axis=-1, keepdims=True), 1e-6)
+    yaw = np.arctan2(direction[:, 1], direction[:, 0]) + rng.normal(0.0, 0.2, num_walkers)
+    velocity = np.zeros((num_walkers, 2))
+
+    tracks = {
+        "xy": np.zeros((num_ticks, num_walkers, 2)),
+        "velocity": np.zeros((num_ticks, num_walkers, 2)),
+        "yaw": np.zeros((num_ticks, num_walkers)),
+        "target_speed": np.zeros((num_ticks, num_walkers)),
+        "target_direction": np.zeros((num_ticks, num_walkers, 2)),
+    }
+    previous_xy = None
+    for t in range(num_ticks):
+        to_goal = goal_xy - xy
+        goal_dist = np.linalg.norm(to_goal, axis=-1)
+        wander = 0.95 * wander + rng.normal(0.0, 0.05, num_walkers)
+        heading = np.arctan2(to_goal[:, 1], to_goal[:, 0]) + wander
+        moving = goal_dist > 1.0
+        direction[moving] = np.stack([np.cos(heading), np.sin(heading)], axis=-1)[moving]
+
+        stop_ticks = np.maximum(stop_ticks - 1, 0)
+        start_stop = (stop_ticks == 0) & (rng.random(num_walkers) < 0.004)
+        stop_ticks[start_stop] = rng.integers(int(1.0 / dt), int(4.0 / dt), int(start_stop.sum()))
+        target_speed = np.where(moving & (stop_ticks == 0), preferred_speed * rng.uniform(0.95, 1.05, num_walkers), 0.0)
+        target_speed = np.where(goal_dist < 3.0, np.minimum(target_speed, 0.5 * goal_dist + 0.3), target_speed)
+
+        tracks["xy"][t] = xy
+        tracks["velocity"][t] = 0.0 if previous_xy is None else (xy - previous_xy) / dt
+        tracks["yaw"][t] = yaw
+        tracks["target_speed"][t] = target_speed
+        tracks["target_direction"][t] = direction
+
+        velocity += 0.4 * (direction * target_speed[:, None] - velocity)
+        previous_xy = xy.copy()
+        xy = xy + velocity * dt
+        speed = np.linalg.norm(velocity, axis=-1)
+        turn = (np.arctan2(velocity[:, 1], velocity[:, 0]) - yaw + np.pi) % (2.0 * np.pi) - np.pi
+        yaw = np.where(speed > 0.1, yaw + np.clip(turn, -np.pi * dt, np.pi * dt), yaw)
+        yaw = (yaw + np.pi) % (2.0 * np.pi) - np.pi
+
+    tracks["goal_xy"] = goal_xy
+    return tracks
+
+
+def simulate_vehicles(rng, layout, num_vehicles, num_ticks, fixed_delta_seconds, half_extent=100.0):
+    '''Vehicles driving along the lanes of the three central roads of each axis; returns ((T, V, 2) xy, (V,) yaw, (V, 2) extents).'''
+    along_x = rng.random(num_vehicles) < 0.5
+    road = rng.integers(-1, 2, num_vehicles) * layout["block"]
+    lane_offset = rng.choice([-0.75, -0.25, 0.25, 0.75], num_vehicles) * layout["lane_half"]
+    heading_sign = np.where(lane_offset < 0.0, 1.0, -1.0)           # right-hand traffic
+    speed = rng.uniform(3.0, 10.0, num_vehicles)
+    start = rng.uniform(-half_extent, half_extent, num_vehicles)
+
+    ticks = np.arange(num_ticks)[:, None] * fixed_delta_seconds
+    along = (start + heading_sign * speed * ticks + half_extent) % (2.0 * half_extent) - half_extent
+    across = np.broadcast_to(road + lane_offset, along.shape)
+    xy = np.stack([np.where(along_x, along, across), np.where(along_x, across, along)], axis=-1)
+    yaw = np.where(along_x, np.where(heading_sign > 0, 0.0, np.pi), np.where(heading_sign > 0, np.pi / 2, -np.pi / 2))
+    extents = np.stack([rng.uniform(2.0, 2.6, num_vehicles), rng.uniform(0.9, 1.1, num_vehicles)], axis=-1)
+    return xy, yaw, extents
+
+
+def make_synthetic_episode(
+        rng,
+        num_peds=10,
+        steps_per_ped=300,
+        num_walkers=20,
+        num_vehicles=12,
+        bev_config=None,
+        fixed_delta_seconds=0.05,
+    ):
+    '''
+    One synthetic episode as {ped_id: columns} in the write_ped_arrays layout. num_peds
+    sampled heroes and num_walkers background walkers move through a synthetic town with
+    num_vehicles vehicles; every tick renders the BEVs of all heroes with the bev_raster
+    kernels of BEVWrapper.render_many (channels lane, sidewalk, shoulder, vehicle, pedestrian).
+    '''
+    bev_config = {**load_config("sim_config.json")["bev"], **(bev_config or {})}
+    width, height = bev_config["size"]
+    pixel_per_meter = width // bev_config["range"]
+    local_grid = pixel_local_grid(width, height, pixel_per_meter)
+    grid, origin_xy, resolution, layout = synthetic_town_raster(rng)
+
+    walkers = simulate_walkers(rng, layout, num_peds + num_walkers, steps_per_ped, fixed_delta_seconds)
+    vehicle_xy, vehicle_yaw, vehicle_extents = simulate_vehicles(rng, layout, num_vehicles, steps_per_ped, fixed_delta_seconds)
+    walker_ids = np.concatenate([1000 + np.arange(num_peds), 5000 + np.arange(num_walkers)]).astype(np.int64)
+    hero_ids = walker_ids[:num_peds]
+
+    bev_data = np.zeros((num_peds, steps_per_ped, height, width, len(LANE_CODES) + 2), dtype=np.uint8)
+    for t in range(steps_per_ped):
+        hero_xy, hero_yaw = walkers["xy"][t, :num_peds], walkers["yaw"][t, :num_peds]
+        bev = bev_data[:, t]
+        bev[..., 0:3], _ = crop_static_layers(
+            grid, origin_xy, resolution, LANE_CODES, local_grid, hero_xy, hero_yaw, width, height,
+        )
+        draw_dynamic_layers(
+            bev,
+            hero_ids,
+            hero_xy,
+            hero_yaw,
+            walker_ids,
+            walkers["xy"][t],
+            obb_corners(vehicle_xy[t], vehicle_yaw, vehicle_extents),
+            pixel_per_meter,
+            bev_config["hero_ped_size"],
+            bev_config["other_ped_size"],
+        )
+
+    first_frame = int(rng.integers(1000, 1_000_000))
+    frame_id = np.arange(first_frame, first_frame + steps_per_ped, dtype=np.int32)
+
+    def with_z(xy, z):
+        return np.concatenate([xy, np.full(xy.shape[:-1] + (1,), z)], axis=-1).astype(np.float32)
+
+    ped_columns = {}
+    for k, ped_id in enumerate(hero_ids):
+        velocity = walkers["velocity"][:, k]
+        ped_columns[int(ped_id)] = {
+            "frame_id": frame_id,
+            "timestamp": frame_id.astype(np.float64) * fixed_delta_seconds,
+            "bev_data": bev_data[k],
+            "current_location": with_z(walkers["xy"][:, k], WALKER_Z),
+            "velocity": with_z(velocity, 0.0),
+            "speed": np.linalg.norm(velocity, axis=-1).astype(np.float32),
+            "yaw_heading": walkers["yaw"][:, k].astype(np.float32),
+            "goal_location": np.tile(with_z(walkers["goal_xy"][k], 0.0), (steps_per_ped, 1)),
+            "target_speed": walkers["target_speed"][:, k].astype(np.float32),
+            "target_direction": with_z(walkers["target_direction"][:, k], 0.0),
+        }
+    return ped_columns
+
+
+def bytes_per_sample(bev_shape, pack_bev_data):
+    '''Uncompressed stored bytes of one sample.'''
+    height, width, channels = bev_shape
+    bev_bytes = int(np.prod(packed_bev_shape(height, width, channels))) if pack_bev_data else height * width * channels
+    return bev_bytes + COLUMN_BYTES
+
+
+def _episode_rng(seed, episode_id):
+    return np.random.default_rng([int(seed), int(episode_id)])
+
+
+def _generate_episode(episode_id, options):
+    return episode_id, make_synthetic_episode(_episode_rng(options["seed"], episode_id), **options["episode"])
+
+
+def _star_generate_episode(args):
+    return _generate_episode(*args)
+
+
+def _shard_worker(dataset_dir, shard_id, num_episodes, options):
+    '''Write num_episodes synthetic episodes into one shard (continues an existing shard).'''
+    shard_writer = ShardWriter(dataset_dir, shard_id)
+    while shard_writer.sidecar["num_episodes"] < num_episodes:
+        episode_id = shard_writer.next_episode_id()
+        _, ped_columns = _generate_episode(episode_id, options)
+        shard_writer.write_episode_columns(ped_columns, **options["write"])
+    with h5py.File(shard_writer.path, "a") as file:
+        write_dataset_index(file)
+    return shard_writer.sidecar["num_samples"]
+
+
+def generate_synthetic_dataset(
+        output_path,
+        num_episodes=10,
+        num_peds=10,
+        steps_per_ped=300,
+        num_walkers=20,
+        num_vehicles=12,
+        bev_config=None,
+        num_workers=1,
+        pack_bev_data=None,
+        codec=None,
+        chunk_samples=None,
+        target_gb=None,
+        seed=0,
+    ):
+    '''
+    Write a synthetic dataset in the convert_to_dataset schema (plus compact index) without
+    CARLA, for loader and trainer benchmarks. An output_path ending in .h5 is one file whose
+    episodes are generated by num_workers processes and written by this one; any other
+    path is a sharded dataset directory (dataset_shards.py) with one shard per worker,
+    which scales to hundreds of GB and continues an interrupted run. target_gb overrides
+    num_episodes with the episode count whose uncompressed size reaches it. Episode e is
+    generated from the seed (seed, e), so a dataset is reproducible.
+    '''
+    bev_config = {**load_config("sim_config.json")["bev"], **(bev_config or {})}
+    if pack_bev_data is None:
+        pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
+    width, height = bev_config["size"]
+    bev_shape = (height, width, len(LANE_CODES) + 2)
+    episode_bytes = num_peds * steps_per_ped * bytes_per_sample(bev_shape, pack_bev_data)
+    if target_gb is not None:
+        num_episodes = max(1, math.ceil(target_gb * 1e9 / episode_bytes))
+
+    options = {
+        "seed": seed,
+        "episode": {
+            "num_peds": num_peds,
+            "steps_per_ped": steps_per_ped,
+            "num_walkers": num_walkers,
+            "num_vehicles": num_vehicles,
+            "bev_config": bev_config,
+            "fixed_delta_seconds": load_config("sim_config.json")["simulation"]["fixed_delta_seconds"],
+        },
+        "write": {"pack_bev_data": bool(pack_bev_data), "codec": codec, "chunk_samples": chunk_samples},
+    }
+    sharded = not output_path.endswith(".h5")
+    num_workers = max(1, min(int(num_workers), num_episodes))
+    print(
+        f"[generate_synthetic_dataset] {num_episodes} episodes x {num_peds} peds x {steps_per_ped} steps, "
+        f"BEV {bev_shape}, ~{num_episodes * episode_bytes / 1e9:.2f} GB uncompressed -> {output_path}"
+    )
+
+    start_time = time.time()
+    if sharded:
+        jobs = [
+            (output_path, shard_id, len(episode_ids), options)
+            for shard_id, episode_ids in enumerate(np.array_split(np.arange(num_episodes), num_workers))
+        ]
+        if num_workers == 1:
+            shard_samples = [_shard_worker(*jobs[0])]
+        else:
+            with mp.get_context("spawn").Pool(num_workers) as pool:
+                shard_samples = pool.starmap(_shard_worker, jobs)
+        write_manifest(output_path)
+        num_samples = int(sum(shard_samples))
+        paths = resolve_dataset_paths(output_path)
+    else:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        num_samples = 0
+        pool = mp.get_context("spawn").Pool(num_workers) if num_workers > 1 else None
+        try:
+            args = [(episode_id, options) for episode_id in range(num_episodes)]
+            episodes = pool.imap(_star_generate_episode, args) if pool is not None else map(_star_generate_episode, args)
+            with h5py.File(output_path, "w") as file:
+                file.attrs["synthetic_seed"] = int(seed)
+                for episode_id, ped_columns in episodes:
+                    episode_grp = file.create_group(episode_group_name(episode_id))
+                    for ped_id, columns in ped_columns.items():
+                        write_ped_arrays(episode_grp, ped_id, columns, **options["write"])
+                        num_samples += len(columns["frame_id"])
+                write_dataset_index(file)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        paths = [output_path]
+    elapsed = time.time() - start_time
+
+    file_bytes = sum(os.path.getsize(path) for path in paths)
+    report = {
+        "output": output_path,
+        "sharded": sharded,
+        "num_workers": num_workers,
+        "num_episodes": num_episodes,
+        "num_samples": num_samples,
+        "bev_shape": list(bev_shape),
+        "packed_bev": bool(pack_bev_data),
+        "codec": codec,
+        "seed": seed,
+        "file_gb": file_bytes / 1e9,
+        "elapsed_s": elapsed,
+        "samples_per_s": num_samples / max(elapsed, 1e-9),
+        "write_mb_per_s": file_bytes / 1e6 / max(elapsed, 1e-9),
+    }
+    print(
+        f"[generate_synthetic_dataset] {num_samples} samples, {report['file_gb']:.2f} GB on disk in {elapsed:.1f}s "
+        f"({report['samples_per_s']:.0f} samples/s, {report['write_mb_per_s']:.0f} MB/s): {output_path}"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset in the convert_to_dataset schema (no CARLA).")
+    parser.add_argument("output", help="Output .h5 file, or a sharded dataset directory (one shard per worker).")
+    parser.add_argument("--num-episodes", type=int, default=10)
+    parser.add_argument("--target-gb", type=float, default=None, help="Episode count from the uncompressed size instead.")
+    parser.add_argument("--num-peds", type=int, default=10, help="Sampled pedestrians per episode.")
+    parser.add_argument("--steps-per-ped", type=int, default=300)
+    parser.add_argument("--num-walkers", type=int, default=20, help="Background walkers per episode.")
+    parser.add_argument("--num-vehicles", type=int, default=12)
+    parser.add_argument("--size", type=int, nargs=2, default=None, metavar=("W", "H"), help="BEV size (default: bev.size).")
+    parser.add_argument("--range", type=int, default=None, help="BEV range in meters (default: bev.range).")
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument("--codec", default=None, help="BEV codec (default: dataset.compression).")
+    parser.add_argument("--chunk-samples", type=int, default=None)
+    parser.add_argument("--pack", dest="pack_bev", action="store_true", default=None)
+    parser.add_argument("--no-pack", dest="pack_bev", action="store_false")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default=None, help="Optional JSON path for the generation report.")
+    args = parser.parse_args()
+
+    overrides = {"size": args.size, "range": args.range}
+    report = generate_synthetic_dataset(
+        output_path=args.output,
+        num_episodes=args.num_episodes,
+        num_peds=args.num_peds,
+        steps_per_ped=args.steps_per_ped,
+        num_walkers=args.num_walkers,
+        num_vehicles=args.num_vehicles,
+        bev_config={key: value for key, value in overrides.items() if value is not None},
+        num_workers=args.num_workers,
+        pack_bev_data=args.pack_bev,
+        codec=args.codec,
+        chunk_samples=args.chunk_samples,
+        target_gb=args.target_gb,
+        seed=args.seed,
+    )
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=4)
@@ -0,0 +1,157 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import h5py
+
+from ..utils.config_loader import load_config
+from ..utils.data_utils import iter_episode_names, write_dataset_index
+from ..utils.dataset_shards import (
+    MANIFEST_NAME,
+    resolve_dataset_paths,
+    shard_file_name,
+    write_json_atomic,
+    write_manifest,
+)
+from .convert_dataset import convert_ped_group, verify_conversion
+
+
+def plan_merge(shard_paths, shard_weights, num_output_shards):
+    '''Assign input shards to output shards, heaviest first onto the lightest output.'''
+    groups = [[] for _ in range(num_output_shards)]
+    loads = [0] * num_output_shards
+    for path, weight in sorted(zip(shard_paths, shard_weights), key=lambda item: -item[1]):
+        target = loads.index(min(loads))
+        groups[target].append(path)
+        loads[target] += weight
+    return groups
+
+
+def _merge_worker(input_paths, output_path, options):
+    '''Copy every episode of input_paths into one output shard and write its index and sidecar data.'''
+    episodes = {}
+    config_hashes = set()
+    with h5py.File(output_path, "w") as dst:
+        for input_path in input_paths:
+            sidecar_path = os.path.splitext(input_path)[0] + ".json"
+            if os.path.exists(sidecar_path):
+                with open(sidecar_path, "r") as file:
+                    config_hashes.add(json.load(file)["config_hash"])
+
+            with h5py.File(input_path, "r") as src:
+                for episode_name in iter_episode_names(src):
+                    if episode_name in dst:
+                        raise ValueError(f"{episode_name} of {input_path} already merged from another shard")
+                    dst_episode = dst.create_group(episode_name)
+                    dst_episode.attrs.update(src[episode_name].attrs)
+                    episodes[episode_name] = sum(
+                        convert_ped_group(src_ped, dst_episode, ped_name, **options)
+                        for ped_name, src_ped in src[episode_name].items()
+                    )
+        write_dataset_index(dst)
+    return episodes, sorted(config_hashes)
+
+
+def merge_shards(
+        input_dataset,
+        output_dir,
+        num_output_shards=1,
+        codec=None,
+        chunk_samples=None,
+        pack_bev_data=None,
+        block_samples=256,
+        verify_samples=100,
+    ):
+    '''
+    Compact the shards of a sharded dataset (directory or manifest.json) into
+    num_output_shards shards in output_dir. Every output shard is written by its own
+    worker process; episodes keep their global names, and BEVs can be re-encoded with a
+    new codec / chunking / packing on the way. A new manifest is written for output_dir.
+    '''
+    input_paths = resolve_dataset_paths(input_dataset)
+    if os.path.abspath(os.path.dirname(input_paths[0])) == os.path.abspath(output_dir):
+        raise ValueError("merge_shards writes a new dataset; output_dir must differ from the input directory")
+    if pack_bev_data is None:
+        pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
+
+    start_time = time.time()
+    # File size balances the workers well enough and needs no HDF5 reads
+    shard_sizes = [os.path.getsize(path) for path in input_paths]
+    num_output_shards = max(1, min(int(num_output_shards), len(input_paths)))
+    groups = plan_merge(input_paths, shard_sizes, num_output_shards)
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = [os.path.join(output_dir, shard_file_name(k)) for k in range(num_output_shards)]
+    options = {
+        "pack_bev_data": bool(pack_bev_data),
+        "codec": codec,
+        "chunk_samples": chunk_samples,
+        "block_samples": int(block_samples),
+    }
+
+    jobs = [(group, output_path, options) for group, output_path in zip(groups, output_paths)]
+    if num_output_shards == 1:
+        results = [_merge_worker(*jobs[0])]
+    else:
+        with mp.get_context("spawn").Pool(num_output_shards) as pool:
+            results = pool.starmap(_merge_worker, jobs)
+
+    sidecars = []
+    for shard_id, (output_path, (episodes, config_hashes)) in enumerate(zip(output_paths, results)):
+        sidecar = {
+            "shard_id": shard_id,
+            "path": os.path.basename(output_path),
+            "config_hash": config_hashes[0] if len(config_hashes) == 1 else ",".join(config_hashes),
+            "num_episodes": len(episodes),
+            "num_samples": int(sum(episodes.values())),
+            "episodes": episodes,
+        }
+        write_json_atomic(os.path.splitext(output_path)[0] + ".json", sidecar)
+        sidecars.append(sidecar)
+    manifest = write_manifest(output_dir, sidecars=sidecars)
+
+    print(
+        f"[merge_shards] {len(input_paths)} shards -> {num_output_shards} shards, "
+        f"{manifest['num_episodes']} episodes / {manifest['num_samples']} samples "
+        f"in {time.time() - start_time:.1f}s: {os.path.join(output_dir, MANIFEST_NAME)}"
+    )
+
+    if verify_samples > 0:
+        mismatches = 0
+        for group, output_path in zip(groups, output_paths):
+            for input_path in group:
+                with h5py.File(input_path, "r") as src:
+                    identity = {name: name for name in iter_episode_names(src)}
+                mismatches += verify_conversion(input_path, output_path, identity, num_samples=verify_samples)
+        if mismatches > 0:
+            raise RuntimeError(f"Merged dataset differs from the input shards in {mismatches} samples")
+        print(f"[merge_shards] verified {verify_samples} random samples per input shard: identical")
+
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the shards of a sharded pedestrian dataset in parallel.")
+    parser.add_argument("input", help="Sharded dataset directory or its manifest.json.")
+    parser.add_argument("output_dir", help="Directory of the merged dataset.")
+    parser.add_argument("--num-output-shards", type=int, default=1, help="Output shards (one worker process each).")
+    parser.add_argument("--codec", default=None, help="BEV codec (default: dataset.compression).")
+    parser.add_argument("--chunk-samples", type=int, default=None)
+    parser.add_argument("--pack", dest="pack_bev", action="store_true", default=None)
+    parser.add_argument("--no-pack", dest="pack_bev", action="store_false")
+    parser.add_argument("--block-samples", type=int, default=256)
+    parser.add_argument("--verify-samples", type=int, default=100, help="Random samples checked per input shard (0 to skip).")
+    args = parser.parse_args()
+
+    merge_shards(
+        input_dataset=args.input,
+        output_dir=args.output_dir,
+        num_output_shards=args.num_output_shards,
+        codec=args.codec,
+        chunk_samples=args.chunk_samples,
+        pack_bev_data=args.pack_bev,
+        block_samples=args.block_samples,
+        verify_samples=args.verify_samples,
+    )
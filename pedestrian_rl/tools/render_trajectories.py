@@ -0,0 +1,255 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+
+import h5py
+import numpy as np
+
+from ..data_collection.bev.bev_raster import crop_static_layers, draw_dynamic_layers, pixel_local_grid
+from ..data_collection.bev.bev_sample import BEVWrapper
+from ..utils.bev_packing import NO_HERO_CHANNEL
+from ..utils.config_loader import load_config
+from ..utils.data_utils import iter_episode_names, write_dataset_index, write_ped_arrays
+from ..utils.geometry import obb_corners
+from ..utils.spatial_index import ActorSpatialIndex
+from ..utils.trajectory_log import load_static_raster, read_trajectory_episode
+
+
+def render_episode(episode, raster, lane_codes, bev_config, layers=BEVWrapper.LAYER_ORDER):
+    '''
+    Render the BEV of every logged sample of one episode (read_trajectory_episode) with the
+    BEVWrapper.render_many kernels. All heroes sampled at the same tick share one render.
+    Returns ({ped_id: columns with bev_data (N, H, W, len(layers))}, number of heroes whose
+    footprint left the raster; their static layers stay empty).
+    '''
+    width, height = bev_config["size"]
+    pixel_per_meter = width // bev_config["range"]
+    local_grid = pixel_local_grid(width, height, pixel_per_meter)
+    grid, origin_xy, resolution = raster
+    channels = [BEVWrapper.LAYER_ORDER.index(name) for name in layers]
+
+    frame_ids = episode["frame_id"]
+    offsets = episode["actor_offsets"]
+    actors = episode["actors"]
+    ped_columns = episode["peds"]
+
+    # (ped_id, sample row) of every hero, grouped by tick
+    heroes_by_tick = defaultdict(list)
+    for ped_id, columns in ped_columns.items():
+        ticks = np.searchsorted(frame_ids, columns["frame_id"])
+        if np.any(frame_ids[np.minimum(ticks, len(frame_ids) - 1)] != columns["frame_id"]):
+            raise ValueError(f"Samples of ped {ped_id} refer to ticks missing from the log")
+        columns["bev_data"] = np.zeros((len(ticks), height, width, len(layers)), dtype=np.uint8)
+        for row, tick in enumerate(ticks):
+            heroes_by_tick[int(tick)].append((ped_id, row))
+
+    num_outside = 0
+    for tick, heroes in heroes_by_tick.items():
+        rows = slice(offsets[tick], offsets[tick + 1])
+        ids, types = actors["id"][rows], actors["type"][rows]
+        xyz, yaw, extent = actors["xyz"][rows], actors["yaw"][rows], actors["extent"][rows]
+        row_of_id = {int(actor_id): k for k, actor_id in enumerate(ids)}
+
+        hero_ids = np.asarray([ped_id for ped_id, _ in heroes], dtype=np.int64)
+        hero_xy = np.zeros((len(heroes), 2), dtype=np.float64)
+        hero_yaw = np.zeros(len(heroes), dtype=np.float64)
+        for k, (ped_id, row) in enumerate(heroes):
+            if ped_id in row_of_id:
+                hero_xy[k] = xyz[row_of_id[ped_id], :2]
+                hero_yaw[k] = yaw[row_of_id[ped_id]]
+            else:
+                # Hero missing from the snapshot: BEVWrapper falls back to its live transform
+                hero_xy[k] = ped_columns[ped_id]["current_location"][row, :2]
+                hero_yaw[k] = ped_columns[ped_id]["yaw_heading"][row]
+
+        bev = np.zeros((len(heroes), height, width, len(BEVWrapper.LAYER_ORDER)), dtype=np.uint8)
+        bev[..., 0:3], inside = crop_static_layers(
+            grid, origin_xy, resolution, lane_codes, local_grid, hero_xy, hero_yaw, width, height,
+        )
+        num_outside += int(np.sum(~inside))
+
+        walkers = types == ActorSpatialIndex.TYPE_CODES["walker"]
+        vehicles = types == ActorSpatialIndex.TYPE_CODES["vehicle"]
+        draw_dynamic_layers(
+            bev,
+            hero_ids,
+            hero_xy,
+            hero_yaw,
+            ids[walkers],
+            xyz[walkers, :2],
+            obb_corners(xyz[vehicles, :2], yaw[vehicles], extent[vehicles]),
+            pixel_per_meter,
+            bev_config["hero_ped_size"],
+            bev_config["other_ped_size"],
+        )
+        for k, (ped_id, row) in enumerate(heroes):
+            ped_columns[ped_id]["bev_data"][row] = bev[k][..., channels]
+
+    return ped_columns, num_outside
+
+
+def _render_worker(log_path, episode_names, part_path, options):
+    '''Render episode_names of the log into the part file part_path.'''
+    raster = load_static_raster(options["raster_path"])
+    episodes = {}
+    num_outside = 0
+    with h5py.File(log_path, "r") as src, h5py.File(part_path, "w") as dst:
+        for episode_name in episode_names:
+            episode = read_trajectory_episode(src[episode_name])
+            ped_columns, outside = render_episode(
+                episode, raster, options["lane_codes"], options["bev_config"], options["layers"],
+            )
+            episode_grp = dst.create_group(episode_name)
+            for ped_id, columns in ped_columns.items():
+                write_ped_arrays(
+                    episode_grp,
+                    ped_id,
+                    columns,
+                    pack_bev_data=options["pack_bev_data"],
+                    codec=options["codec"],
+                    chunk_samples=options["chunk_samples"],
+                    hero_channel=options["hero_channel"],
+                )
+            episodes[episode_name] = int(sum(len(columns["frame_id"]) for columns in ped_columns.values()))
+            num_outside += outside
+    return episodes, num_outside
+
+
+def render_trajectories(
+        log_path,
+        output_path,
+        bev_config=None,
+        raster_path=None,
+        layers=None,
+        num_workers=1,
+        pack_bev_data=None,
+        codec=None,
+        chunk_samples=None,
+    ):
+    '''
+    Render a BEV dataset (convert_to_dataset layout plus compact index) from a trajectory
+    log. bev_config entries override the bev section of sim_config.json (size, range,
+    hero_ped_size, other_ped_size); layers selects and orders channels of
+    BEVWrapper.LAYER_ORDER. The hero channel recorded with the BEVs is the position of
+    "pedestrian" in layers (NO_HERO_CHANNEL without it), so any layer set can be packed.
+    Episodes are split over num_workers spawn processes that write part files, which are
+    then copied into output_path.
+    '''
+    bev_config = {**load_config("sim_config.json")["bev"], **(bev_config or {})}
+    layers = tuple(layers) if layers else BEVWrapper.LAYER_ORDER
+    unknown = set(layers) - set(BEVWrapper.LAYER_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown BEV layers {sorted(unknown)}; choose from {BEVWrapper.LAYER_ORDER}")
+    if pack_bev_data is None:
+        pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
+    hero_channel = layers.index("pedestrian") if "pedestrian" in layers else NO_HERO_CHANNEL
+
+    with h5py.File(log_path, "r") as file:
+        episode_names = sorted(iter_episode_names(file))
+        log_attrs = dict(file.attrs)
+    if raster_path is None:
+        raster_path = str(log_attrs["static_raster"])
+    options = {
+        "raster_path": raster_path,
+        "lane_codes": tuple(int(code) for code in log_attrs["static_lane_codes"]),
+        "bev_config": bev_config,
+        "layers": layers,
+        "hero_channel": hero_channel,
+        "pack_bev_data": bool(pack_bev_data),
+        "codec": codec,
+        "chunk_samples": chunk_samples,
+    }
+
+    start_time = time.time()
+    num_workers = max(1, min(int(num_workers), len(episode_names)))
+    part_paths = [f"{output_path}.part{k}" for k in range(num_workers)]
+    jobs = [
+        (log_path, [str(name) for name in names], part_path, options)
+        for names, part_path in zip(np.array_split(np.asarray(episode_names, dtype=object), num_workers), part_paths)
+    ]
+    if num_workers == 1:
+        results = [_render_worker(*jobs[0])]
+    else:
+        with mp.get_context("spawn").Pool(num_workers) as pool:
+            results = pool.starmap(_render_worker, jobs)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with h5py.File(output_path, "w") as dst:
+        dst.attrs["source_log"] = os.path.basename(log_path)
+        dst.attrs["bev_size"] = np.asarray(bev_config["size"], dtype=np.int32)
+        dst.attrs["bev_range"] = bev_config["range"]
+        dst.attrs["bev_layers"] = ",".join(layers)
+        for part_path in part_paths:
+            with h5py.File(part_path, "r") as src:
+                for episode_name in src.keys():
+                    src.copy(src[episode_name], dst, name=episode_name)
+            os.remove(part_path)
+        write_dataset_index(dst)
+    elapsed = time.time() - start_time
+
+    num_samples = sum(sum(episodes.values()) for episodes, _ in results)
+    num_outside = sum(outside for _, outside in results)
+    report = {
+        "log": log_path,
+        "output": output_path,
+        "num_workers": num_workers,
+        "num_episodes": len(episode_names),
+        "num_samples": int(num_samples),
+        "elapsed_s": elapsed,
+        "samples_per_s": num_samples / max(elapsed, 1e-9),
+        "num_outside_raster": int(num_outside),
+        "bev_size": list(bev_config["size"]),
+        "bev_range": bev_config["range"],
+        "layers": list(layers),
+    }
+    print(
+        f"[render_trajectories] {report['num_episodes']} episodes / {num_samples} samples rendered by "
+        f"{num_workers} workers in {elapsed:.1f}s ({report['samples_per_s']:.0f} samples/s): {output_path}"
+    )
+    if num_outside > 0:
+        print(f"[render_trajectories] Warning: {num_outside} BEVs left the static raster {raster_path}; "
+              f"their road layers are incomplete")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a BEV dataset from a trajectory-only recording.")
+    parser.add_argument("log", help="Trajectory log written with dataset.recording.mode = trajectory.")
+    parser.add_argument("output", help="Output BEV dataset (.h5).")
+    parser.add_argument("--size", type=int, nargs=2, default=None, metavar=("W", "H"), help="BEV size (default: bev.size).")
+    parser.add_argument("--range", type=int, default=None, help="BEV range in meters (default: bev.range).")
+    parser.add_argument("--hero-ped-size", type=int, default=None)
+    parser.add_argument("--other-ped-size", type=int, default=None)
+    parser.add_argument("--layers", nargs="+", default=None, help=f"Channels out of {' '.join(BEVWrapper.LAYER_ORDER)}.")
+    parser.add_argument("--raster", default=None, help="Town lane-type raster .npz (default: the one recorded in the log).")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--codec", default=None, help="BEV codec (default: dataset.compression).")
+    parser.add_argument("--chunk-samples", type=int, default=None)
+    parser.add_argument("--pack", dest="pack_bev", action="store_true", default=None)
+    parser.add_argument("--no-pack", dest="pack_bev", action="store_false")
+    parser.add_argument("--report", default=None, help="Optional JSON path for the render report.")
+    args = parser.parse_args()
+
+    overrides = {
+        "size": args.size,
+        "range": args.range,
+        "hero_ped_size": args.hero_ped_size,
+        "other_ped_size": args.other_ped_size,
+    }
+    report = render_trajectories(
+        log_path=args.log,
+        output_path=args.output,
+        bev_config={key: value for key, value in overrides.items() if value is not None},
+        raster_path=args.raster,
+        layers=args.layers,
+        num_workers=args.num_workers,
+        pack_bev_data=args.pack_bev,
+        codec=args.codec,
+        chunk_samples=args.chunk_samples,
+    )
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=4)
@@ -1,7 +1,9 @@
 import os
+import time
 import torch
 from ..utils.data_utils import PedestrianStepDataset
 from ..utils.config_loader import load_config
+from ..utils.live_dataset import wait_for_live_dataset
 from ..utils.bc_utils import (
     set_seed,
     get_seed_dirs,
@@ -9,6 +11,9 @@ from ..utils.bc_utils import (
     save_checkpoint,
     build_dataloader,
     split_dataset_by_episode,
+    split_live_dataset_by_episode,
+    live_split_info,
+    LiveEpisodeSubset,
     save_test_summary_csv,
     build_model,
     run_one_epoch,
@@ -56,6 +61,9 @@ def train_one_seed(config,
     reproducible_mode = runtime_cfg.get("reproducible_mode", True)
     persistent_workers = runtime_cfg.get("persistent_workers", False)
     prefetch_factor = runtime_cfg.get("prefetch_factor", 2)
+    # > 0: block-shuffled training order for HDF5 chunk locality (see BlockShuffleSampler)
+    shuffle_block_size = runtime_cfg.get("shuffle_block_size", 0)
+    shuffle_window_blocks = runtime_cfg.get("shuffle_window_blocks", 8)
 
     # set random seed
     set_seed(train_seed, reproducible_mode=reproducible_mode)
@@ -68,6 +76,8 @@ def train_one_seed(config,
         num_workers=num_workers,
         persistent_workers=persistent_workers,
         prefetch_factor=prefetch_factor,
+        block_size=shuffle_block_size,
+        window_blocks=shuffle_window_blocks,
     )
     val_loader = build_dataloader(
         dataset=val_dataset,
@@ -105,11 +115,28 @@ def train_one_seed(config,
 
     best_val_loss = float("inf")
 
+    # Shared decoded BEV cache of the underlying PedestrianStepDataset (bc.params.bev_cache_gb)
+    bev_cache = getattr(getattr(train_dataset, "dataset", train_dataset), "bev_cache", None)
+    if bev_cache is not None:
+        # The cache outlives the seeds; count each epoch from the counters at its start
+        cache_stats = bev_cache.stats()
+        cache_counts = (cache_stats["hits"], cache_stats["misses"])
+        history["bev_cache"] = []
 
     # --- training loop ---
     print(f"\n===== Training seed {train_seed} =====")
 
     for epoch in range(num_epochs):
+        if isinstance(train_dataset, LiveEpisodeSubset):
+            # Live dataset: train on the episodes the collector committed since the last epoch
+            new_samples = [subset.refresh() for subset in (train_dataset, val_dataset, test_dataset)]
+            split_info = live_split_info(train_dataset, val_dataset, test_dataset)
+            history["split_info"] = split_info
+            print(
+                f"[live] Epoch {epoch + 1}: +{new_samples[0]} train / +{new_samples[1]} val / +{new_samples[2]} test samples "
+                f"(train={len(train_dataset)}, val={len(val_dataset)}, test={len(test_dataset)})"
+            )
+
         train_metrics = run_one_epoch(
             model=model,
             loader=train_loader,
@@ -146,6 +173,23 @@ def train_one_seed(config,
             f"val_joint_acc={val_metrics['joint_accuracy']:.4f}"
         )
 
+        if bev_cache is not None:
+            cache_stats = bev_cache.stats()
+            epoch_hits = cache_stats["hits"] - cache_counts[0]
+            epoch_misses = cache_stats["misses"] - cache_counts[1]
+            cache_counts = (cache_stats["hits"], cache_stats["misses"])
+            cache_stats.update({
+                "epoch_hits": epoch_hits,
+                "epoch_misses": epoch_misses,
+                "epoch_hit_rate": epoch_hits / max(epoch_hits + epoch_misses, 1),
+            })
+            history["bev_cache"].append(cache_stats)
+            print(
+                f"[bev_cache] Epoch {epoch + 1}: hits={epoch_hits}, misses={epoch_misses} "
+                f"(hit rate {cache_stats['epoch_hit_rate']:.1%}), "
+                f"filled {cache_stats['filled']}/{cache_stats['capacity']} ({cache_stats['filled_gb']:.2f} GB)"
+            )
+
         if val_metrics["loss_total"] < best_val_loss:
             best_val_loss = val_metrics["loss_total"]
             save_checkpoint(
@@ -165,6 +209,10 @@ def train_one_seed(config,
     print(f"Loaded best model from: {best_model_path}")
 
     # --- test model and output results ---
+    if isinstance(test_dataset, LiveEpisodeSubset):
+        test_dataset.refresh()
+        history["split_info"] = live_split_info(train_dataset, val_dataset, test_dataset)
+
     test_metrics = run_one_epoch(
         model=model,
         loader=test_loader,
@@ -242,6 +290,16 @@ def train_bc_multi_seed():
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
+    # Live mode trains on a dataset the collector is still writing (dataset.live in sim_config.json)
+    live_cfg = config["bc"].get("live", {})
+    live = live_cfg.get("enabled", False)
+    if live:
+        wait_for_live_dataset(
+            dataset_path,
+            min_samples=live_cfg.get("min_samples", 1),
+            poll_seconds=live_cfg.get("poll_seconds", 30.0),
+        )
+
     # --- load dataset and output train/val/test ---
     dataset = PedestrianStepDataset(
         h5_path=dataset_path,
@@ -249,17 +307,29 @@ def train_bc_multi_seed():
         goal_scale=goal_scale,
         clip_bound=clip_bound,
         speed_eps=direction_valid_speed_eps,
-        future_steps=future_steps
+        future_steps=future_steps,
+        packed_bev=params_cfg.get("packed_bev", False),
+        live=live,
+        bev_dtype=params_cfg.get("bev_dtype", "float32"),
+        ped_cache_size=params_cfg.get("ped_cache_size", 16),
+        chunk_cache_mb=params_cfg.get("chunk_cache_mb", 0),
+        bev_cache_gb=params_cfg.get("bev_cache_gb", 0),
+        bev_cache_dir=params_cfg.get("bev_cache_dir"),
     )
     print(f"Total samples: {len(dataset)}")
 
-    train_dataset, val_dataset, test_dataset, split_info = split_dataset_by_episode(
+    split_fn = split_live_dataset_by_episode if live else split_dataset_by_episode
+    train_dataset, val_dataset, test_dataset, split_info = split_fn(
         dataset=dataset,
         train_ratio=train_ratio,
         val_ratio=val_ratio,
         test_ratio=test_ratio,
         seed=split_seed,
     )
+    while live and len(train_dataset) == 0:
+        time.sleep(live_cfg.get("poll_seconds", 30.0))
+        train_dataset.refresh()
+        split_info = live_split_info(train_dataset, val_dataset, test_dataset)
 
     print(
         f"Episode split -> "
@@ -302,7 +372,7 @@ def train_bc_multi_seed():
 
     summary = summarize_test_metrics(history_list, seed_list)
     summary["split_seed"] = split_seed
-    summary["split_info"] = split_info
+    summary["split_info"] = history_list[-1]["split_info"] if live else split_info
 
     save_json(summary, os.path.join(checkpoint_root, "multi_seed_summary.json"))
     save_test_summary_csv(summary, os.path.join(checkpoint_root, "multi_seed_summary.csv"))
@@ -8,9 +8,10 @@ from tqdm import tqdm
 import matplotlib.pyplot as plt
 import torch
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, Subset
+from torch.utils.data import DataLoader, Sampler, Subset
 from ..models.bc_model import BehaviorCloningPolicy
 from ..models.cnn_encoder import CNNEncoder
+from .bev_packing import unpack_obs_bev
 
 
 
@@ -45,8 +46,10 @@ def build_dataloader(
     num_workers,
     persistent_workers=False,
     prefetch_factor=2,
+    block_size=0,
+    window_blocks=1,
     ):
-    """Create one dataloader."""
+    """Create one dataloader (block_size > 0 shuffles with BlockShuffleSampler)."""
     dataloader_kwargs = {
         "dataset": dataset,
         "batch_size": batch_size,
@@ -54,6 +57,9 @@ def build_dataloader(
         "num_workers": num_workers,
         "pin_memory": torch.cuda.is_available(),
     }
+    if shuffle and block_size > 0:
+        dataloader_kwargs["shuffle"] = False
+        dataloader_kwargs["sampler"] = BlockShuffleSampler(dataset, block_size, window_blocks)
 
     if num_workers > 0:
         dataloader_kwargs["persistent_workers"] = persistent_workers
@@ -62,6 +68,86 @@ def build_dataloader(
     return DataLoader(**dataloader_kwargs)
 
 
+class BlockShuffleSampler(Sampler):
+    '''
+    Shuffled sampling with HDF5 chunk locality for PedestrianStepDataset (or a Subset of it).
+
+    Samples are grouped into blocks of up to block_size consecutive timesteps of one
+    pedestrian track, aligned to t // block_size so that with block_size a multiple of
+    dataset.compression.chunk_samples a block covers whole BEV chunks. Every epoch the
+    block order is shuffled, then the samples of each window of window_blocks consecutive
+    blocks are shuffled together. Blocks never cross tracks (or episodes), so a worker
+    reads a few tracks at a time and hits the chunk cache of their open datasets instead
+    of decompressing a new chunk for nearly every sample.
+
+    Randomness / locality tradeoff: a batch of B samples draws from about
+    max(1, B / (block_size * window_blocks)) windows, i.e. roughly B / block_size tracks
+    (at least window_blocks) instead of B independent tracks, and neighbouring timesteps
+    are strongly correlated. Every sample is still seen exactly once per epoch, so the
+    expected gradient is unchanged but its variance grows with block_size; keep
+    block_size * window_blocks at or above the batch size. block_size=1 with
+    window_blocks=1 is a plain shuffle.
+
+    The block list is extended when the dataset grows (LiveEpisodeSubset.refresh), and the
+    epoch order is drawn from seed (np.random by default, so set_seed makes it reproducible).
+
+    Methods:
+        set_epoch(epoch):
+            Select the permutation of one epoch (it also advances after every pass).
+    '''
+
+    def __init__(self, dataset, block_size=32, window_blocks=8, seed=None):
+        if block_size < 1 or window_blocks < 1:
+            raise ValueError("block_size and window_blocks must be >= 1")
+        self.dataset = dataset
+        self.block_size = int(block_size)
+        self.window_blocks = int(window_blocks)
+        self.seed = int(np.random.randint(2 ** 31)) if seed is None else int(seed)
+        self.epoch = 0
+        self.block_starts = []
+        self._num_blocked = 0
+        self._last_key = None
+
+    def _index_entries(self, start):
+        if isinstance(self.dataset, Subset):
+            index = self.dataset.dataset.index
+            return (index[idx] for idx in self.dataset.indices[start:])
+        return iter(self.dataset.index[start:])
+
+    def _update_blocks(self):
+        '''Block the samples added since the last pass (positions in the dataset / subset).'''
+        num_samples = len(self.dataset)
+        for position, (episode_name, ped_name, t) in enumerate(self._index_entries(self._num_blocked), self._num_blocked):
+            key = (episode_name, ped_name, t // self.block_size)
+            if key != self._last_key:
+                self.block_starts.append(position)
+                self._last_key = key
+        self._num_blocked = num_samples
+
+    def set_epoch(self, epoch):
+        self.epoch = int(epoch)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __iter__(self):
+        self._update_blocks()
+        rng = np.random.default_rng([self.seed, self.epoch])
+        self.epoch += 1
+
+        starts = np.asarray(self.block_starts, dtype=np.int64)
+        ends = np.append(starts[1:], self._num_blocked)
+        order = rng.permutation(len(starts))
+        positions = np.concatenate([np.arange(starts[k], ends[k]) for k in order]) if len(order) else np.zeros(0, np.int64)
+
+        window_ends = np.cumsum((ends - starts)[order])[self.window_blocks - 1::self.window_blocks]
+        window_start = 0
+        for window_end in list(window_ends) + [len(positions)]:
+            rng.shuffle(positions[window_start:window_end])
+            window_start = window_end
+        return iter(positions.tolist())
+
+
 
 # --- Make sure the episodes are not spliting ---
 def _compute_split_counts(total_count, train_ratio, val_ratio, test_ratio):
@@ -151,6 +237,96 @@ def split_dataset_by_episode(dataset, train_ratio, val_ratio, test_ratio, seed=4
     )
 
 
+def live_episode_split(episode_name, train_ratio, val_ratio, seed=42):
+    '''Split of one episode drawn from (seed, name) alone, so episodes that arrive later never move.'''
+    draw = random.Random(f"{seed}:{episode_name}").random()
+    if draw < train_ratio:
+        return "train"
+    if draw < train_ratio + val_ratio:
+        return "val"
+    return "test"
+
+
+class LiveEpisodeSubset(Subset):
+    '''
+    One split of a live PedestrianStepDataset that grows with the dataset.
+
+    Episodes are assigned with live_episode_split instead of a shuffled fixed-size split,
+    and the dataset index only grows at the end, so refresh() just scans the new index
+    entries. An index past the current end (sampled by the main process after its
+    refresh) triggers a refresh in the persistent worker holding this copy.
+
+    Attributes:
+        split: "train", "val" or "test".
+        episodes: Episode names in this split.
+
+    Methods:
+        refresh():
+            Pick up newly committed samples; returns how many joined this split.
+    '''
+
+    def __init__(self, dataset, split, train_ratio, val_ratio, seed=42):
+        super().__init__(dataset, [])
+        self.split = split
+        self.train_ratio = train_ratio
+        self.val_ratio = val_ratio
+        self.seed = seed
+        self.episodes = set()
+        self.num_scanned = 0
+        self._scan()
+
+    def _scan(self):
+        index = self.dataset.index
+        for idx in range(self.num_scanned, len(index)):
+            episode_name = index[idx][0]
+            if live_episode_split(episode_name, self.train_ratio, self.val_ratio, self.seed) == self.split:
+                self.indices.append(idx)
+                self.episodes.add(episode_name)
+        self.num_scanned = len(index)
+
+    def refresh(self):
+        num_samples = len(self.indices)
+        self.dataset.refresh()
+        self._scan()
+        return len(self.indices) - num_samples
+
+    def __getitem__(self, idx):
+        if idx >= len(self.indices):
+            self.refresh()
+        return super().__getitem__(idx)
+
+    def __getitems__(self, indices):
+        if max(indices, default=-1) >= len(self.indices):
+            self.refresh()
+        return super().__getitems__(indices)
+
+
+def live_split_info(train_dataset, val_dataset, test_dataset):
+    '''split_info (split_dataset_by_episode format) of the current LiveEpisodeSubset contents.'''
+    splits = {"train": train_dataset, "val": val_dataset, "test": test_dataset}
+    return {
+        "episode": {
+            **{name: sorted(subset.episodes) for name, subset in splits.items()},
+            **{f"num_{name}": len(subset.episodes) for name, subset in splits.items()},
+        },
+        "sample": {f"num_{name}": len(subset) for name, subset in splits.items()},
+    }
+
+
+def split_live_dataset_by_episode(dataset, train_ratio, val_ratio, test_ratio, seed=42):
+    '''split_dataset_by_episode for a live dataset: growing LiveEpisodeSubset splits.'''
+    if train_ratio <= 0 or val_ratio < 0 or test_ratio < 0:
+        raise ValueError("Split ratios must be non-negative and train_ratio must be > 0.")
+
+    if not np.isclose(train_ratio + val_ratio + test_ratio, 1.0):
+        raise ValueError("train_ratio + val_ratio + test_ratio must sum to 1.0")
+
+    train_dataset, val_dataset, test_dataset = (
+        LiveEpisodeSubset(dataset, split, train_ratio, val_ratio, seed) for split in ("train", "val", "test")
+    )
+    return train_dataset, val_dataset, test_dataset, live_split_info(train_dataset, val_dataset, test_dataset)
+
+
 # --- Build up models, calculate losses, output metrics ---
 def set_seed(seed: int = 42, reproducible_mode: bool = True):
     """Set random seeds and runtime mode."""
@@ -168,11 +344,13 @@ def set_seed(seed: int = 42, reproducible_mode: bool = True):
 
 
 def move_batch_to_device(batch, device):
-    """Move all tensor values in one batch to the target device."""
+    """Move all tensor values in one batch to the target device (packed BEVs are expanded there)."""
     moved_batch = {}
     for key, value in batch.items():
+        if key == "bev_hero_channel":
+            continue  # read on the host, so unpacking does not wait for the device
         moved_batch[key] = value.to(device) if torch.is_tensor(value) else value
-    return moved_batch
+    return unpack_obs_bev(moved_batch, hero_channel=batch.get("bev_hero_channel"))
 
 def build_model(config, device):
     """Build BC model."""
@@ -0,0 +1,217 @@
+'''
+Decoded BEV cache shared by the DataLoader workers of one training run.
+
+PedestrianStepDataset decodes every BEV (decompress, unpack / pack) in each worker and
+every epoch. With a SharedBEVCache the first decode of a sample is written into a
+memory-mapped uint8 file (in /dev/shm by default, i.e. RAM), which every worker and every
+later epoch / seed reads instead.
+
+File layout (one file, slots indexed by the dataset index):
+    flags       (capacity,) uint8, 1 once a slot holds a decoded sample
+    owners      (MAX_PROCESSES,) int64 pid that holds each counter row
+    counters    (MAX_PROCESSES, 2) int64 hits / misses, one row per live process
+    data        (capacity, *sample_shape) uint8, the BEV exactly as the dataset returns it
+                (packed bitplanes, or dense (H, W, C) uint8 before the bev_dtype cast)
+
+Size cap: capacity = min(max_gb, free space in cache_dir) / sample bytes. Samples with
+an index >= capacity are not cached (partial caching), so with a dataset larger than RAM
+the first capacity samples are served from RAM and the rest are decoded as before;
+nothing is evicted, which keeps the workers free of shared locks. The file is sparse, so
+RAM is only used for slots that were filled.
+
+A slot is written before its flag; two workers decoding the same sample at the same time
+write identical bytes. Each process claims a counter row by pid the first time it counts
+(under a file lock, once per process), so the workers of the train and val DataLoaders
+never share a row; the row of an exited process is reused and keeps adding to its counts.
+
+The file carries the creating pid in its name. It is deleted by close(), at exit and on
+SIGTERM; files left by a killed (SIGKILL) run are removed by the next SharedBEVCache
+created in the same directory.
+'''
+import atexit
+import fcntl
+import glob
+import os
+import signal
+import tempfile
+
+import numpy as np
+
+
+MAX_PROCESSES = 256
+DATA_ALIGNMENT = 4096
+
+
+def default_cache_dir():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_caches(cache_dir):
+    '''Delete cache files whose creating process no longer runs (e.g. a killed trainer).'''
+    for path in glob.glob(os.path.join(cache_dir, "bev_cache_*_*.u8")):
+        owner = os.path.basename(path).split("_")[2]
+        if owner.isdigit() and not _pid_alive(int(owner)):
+            try:
+                os.remove(path)
+                print(f"[SharedBEVCache] Removed stale cache {path}")
+            except OSError:
+                pass
+
+
+class SharedBEVCache:
+    '''
+    Memory-mapped decoded BEV cache (module docstring layout).
+
+    Created by the main process before the DataLoader workers start; the workers inherit
+    (fork) or reopen (spawn) the same file. Only the creating process deletes it (close(),
+    at exit or on SIGTERM).
+
+    Attributes:
+        path: Cache file.
+        sample_shape: Shape of one cached BEV.
+        capacity: Number of cacheable samples (dataset indices 0 .. capacity - 1).
+
+    Methods:
+        get(idx):
+            Cached BEV of dataset index idx (a copy), or None; counts a hit or miss.
+        put(idx, bev):
+            Store a decoded BEV (ignored past capacity).
+        stats():
+            Hits, misses, hit rate and filled slots over all processes.
+        close():
+            Unmap the file (and delete it in the creating process).
+    '''
+
+    def __init__(self, sample_shape, num_samples, max_gb, cache_dir=None):
+        self.sample_shape = tuple(int(dim) for dim in sample_shape)
+        self.sample_bytes = int(np.prod(self.sample_shape))
+        cache_dir = default_cache_dir() if cache_dir is None else cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        remove_stale_caches(cache_dir)
+
+        fs_stats = os.statvfs(cache_dir)
+        free_bytes = 0.9 * fs_stats.f_bavail * fs_stats.f_frsize
+        budget_bytes = min(float(max_gb) * 1024 ** 3, free_bytes)
+        self.capacity = int(max(0, min(num_samples, budget_bytes // (self.sample_bytes + 1))))
+        if budget_bytes < float(max_gb) * 1024 ** 3:
+            print(f"[SharedBEVCache] Only {free_bytes / 1024 ** 3:.1f} GB free in {cache_dir}; the cache is capped there")
+
+        self._owners_offset = int(np.ceil(self.capacity / 8.0)) * 8
+        self._counters_offset = self._owners_offset + MAX_PROCESSES * 8
+        self._data_offset = int(np.ceil((self._counters_offset + MAX_PROCESSES * 2 * 8) / DATA_ALIGNMENT)) * DATA_ALIGNMENT
+        self.file_bytes = self._data_offset + self.capacity * self.sample_bytes
+
+        self.owner_pid = os.getpid()
+        handle, self.path = tempfile.mkstemp(prefix=f"bev_cache_{self.owner_pid}_", suffix=".u8", dir=cache_dir)
+        os.close(handle)
+        with open(self.path, "r+b") as file:
+            file.truncate(self.file_bytes)  # sparse: pages are only allocated when filled
+        self._maps = None
+        self._row = None
+        self._row_pid = None
+
+        atexit.register(self.close)
+        self._previous_sigterm = None
+        try:
+            self._previous_sigterm = signal.signal(signal.SIGTERM, self._on_sigterm)
+        except ValueError:
+            pass  # not the main thread: close() / atexit only
+
+        print(
+            f"[SharedBEVCache] {self.capacity}/{num_samples} samples of {self.sample_shape} uint8 "
+            f"(up to {self.capacity * self.sample_bytes / 1024 ** 3:.2f} GB) in {self.path}"
+        )
+
+    def _arrays(self):
+        if self._maps is None:
+            self._maps = (
+                np.memmap(self.path, dtype=np.uint8, mode="r+", offset=0, shape=(max(self.capacity, 1),)),
+                np.memmap(self.path, dtype=np.int64, mode="r+", offset=self._owners_offset, shape=(MAX_PROCESSES,)),
+                np.memmap(self.path, dtype=np.int64, mode="r+", offset=self._counters_offset, shape=(MAX_PROCESSES, 2)),
+                np.memmap(
+                    self.path, dtype=np.uint8, mode="r+", offset=self._data_offset,
+                    shape=(max(self.capacity, 1),) + self.sample_shape,
+                ) if self.capacity > 0 else None,
+            )
+        return self._maps
+
+    def _process_row(self):
+        '''Counter row of this process: its own, else a free one or one of an exited process.'''
+        pid = os.getpid()
+        if self._row_pid == pid:
+            return self._row
+        _, owners, _, _ = self._arrays()
+        with open(self.path, "r+b") as file:
+            fcntl.lockf(file, fcntl.LOCK_EX, 1)
+            try:
+                rows = np.flatnonzero(owners == pid)
+                if len(rows) == 0:
+                    rows = [row for row in range(MAX_PROCESSES) if owners[row] == 0 or not _pid_alive(int(owners[row]))]
+                if len(rows) == 0:
+                    raise RuntimeError(f"[SharedBEVCache] More than {MAX_PROCESSES} processes use {self.path}")
+                row = int(rows[0])
+                owners[row] = pid
+            finally:
+                fcntl.lockf(file, fcntl.LOCK_UN, 1)
+        self._row, self._row_pid = row, pid
+        return row
+
+    def get(self, idx):
+        flags, _, counters, data = self._arrays()
+        row = self._process_row()
+        if idx < self.capacity and flags[idx]:
+            counters[row, 0] += 1
+            return np.array(data[idx])
+        counters[row, 1] += 1
+        return None
+
+    def put(self, idx, bev):
+        if idx >= self.capacity:
+            return
+        flags, _, _, data = self._arrays()
+        data[idx] = bev
+        flags[idx] = 1
+
+    def stats(self):
+        flags, _, counters, _ = self._arrays()
+        hits, misses = (int(value) for value in counters.sum(axis=0))
+        filled = int(np.count_nonzero(flags[:self.capacity]))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / max(hits + misses, 1),
+            "filled": filled,
+            "capacity": self.capacity,
+            "filled_gb": filled * self.sample_bytes / 1024 ** 3,
+        }
+
+    def close(self):
+        self._maps = None
+        if os.getpid() == self.owner_pid and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _on_sigterm(self, signum, frame):
+        self.close()
+        previous = self._previous_sigterm
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL if previous is None else previous)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def __getstate__(self):
+        # Spawned workers reopen the file instead of receiving a copy of the mapping
+        state = self.__dict__.copy()
+        state["_maps"] = None
+        state["_previous_sigterm"] = None
+        return state
@@ -0,0 +1,178 @@
+'''
+Bit-packed BEV representation.
+
+Every BEV channel is binary (0 / 255), except the pedestrian channel where the hero is
+drawn with HERO_VALUE (100). A (H, W, C) uint8 BEV is therefore stored losslessly as C + 1
+bitplanes packed along the width:
+
+    planes[c]  = bev[..., c] == 255          for c in range(C)
+    planes[C]  = bev[..., hero_channel] == HERO_VALUE   (hero mask)
+
+Packed layout: (..., C + 1, H, ceil(W / 8)) uint8, 8C / (C + 1) times smaller than the
+dense uint8 BEV (6.7x for the C = 5 layouts).
+
+The hero channel depends on the BEV class: the pedestrian layer is channel 4 of the
+orthographic BEVWrapper / BEVSample stack and channel 3 of SemanticBEVWrapper /
+SemanticBEVSample (both expose it as HERO_CHANNEL). Writers pass it to pack_bev and
+record it in the BEV dataset's attrs["hero_channel"]; readers take it from there, per
+sample, since the shards of one dataset may come from different BEV classes.
+pack_bev / unpack_bev work on NumPy arrays (HDF5 storage, replay buffer), and
+unpack_bev_torch expands a packed batch on the training device right before CNNEncoder.
+'''
+import numpy as np
+import torch
+
+
+HERO_CHANNEL = 4     # BEVWrapper.HERO_CHANNEL, the default when nothing else is known
+NO_HERO_CHANNEL = -1  # layer sets without "pedestrian": no pixel holds HERO_VALUE, the hero plane stays empty
+HERO_VALUE = 100
+ON_VALUE = 255
+
+
+def stored_hero_channel(attrs, default=HERO_CHANNEL):
+    '''Hero channel recorded in the attrs of a stored BEV dataset (default if absent).'''
+    return int(attrs.get("hero_channel", default))
+
+
+def packed_bev_shape(height, width, num_channels):
+    '''Shape of one packed BEV: (C + 1, H, ceil(W / 8)).'''
+    return (num_channels + 1, height, (width + 7) // 8)
+
+
+def pack_bev(bev, hero_channel=HERO_CHANNEL, hero_value=HERO_VALUE, check=True):
+    '''
+    Pack (..., H, W, C) BEVs into (..., C + 1, H, ceil(W / 8)) uint8 bitplanes.
+
+    Args:
+        bev: Dense BEV(s) with values 0 / 255, plus hero_value in hero_channel. Any dtype.
+        check: Raise ValueError if a pixel holds another value (packing would be lossy).
+    '''
+    bev = np.asarray(bev)
+    on = bev == ON_VALUE
+    hero = bev[..., hero_channel] == hero_value
+
+    if check:
+        valid = on | (bev == 0)
+        valid[..., hero_channel] |= hero
+        if not valid.all():
+            raise ValueError(
+                f"BEV holds values other than 0 / {ON_VALUE} (and {hero_value} in channel "
+                f"{hero_channel}); bit-packing would be lossy"
+            )
+
+    # (..., H, W, C) -> (..., C, H, W), append hero mask as the last plane
+    planes = np.concatenate([np.moveaxis(on, -1, -3), hero[..., None, :, :]], axis=-3)
+    return np.packbits(planes, axis=-1)
+
+
+def unpack_bev(packed, width, hero_channel=HERO_CHANNEL, hero_value=HERO_VALUE):
+    '''Inverse of pack_bev: (..., C + 1, H, ceil(W / 8)) -> (..., H, W, C) uint8.'''
+    packed = np.asarray(packed, dtype=np.uint8)
+    planes = np.unpackbits(packed, axis=-1, count=width).astype(bool)
+
+    bev = planes[..., :-1, :, :].astype(np.uint8) * np.uint8(ON_VALUE)
+    hero_plane = bev[..., hero_channel, :, :]
+    hero_plane[planes[..., -1, :, :]] = hero_value
+    return np.ascontiguousarray(np.moveaxis(bev, -3, -1))
+
+
+def unpack_bev_torch(packed, width=None, hero_channel=HERO_CHANNEL, hero_value=HERO_VALUE, normalize=True):
+    '''
+    Expand packed BEVs on their current device.
+
+    Args:
+        packed: (B, C + 1, H, ceil(W / 8)) or (C + 1, H, ceil(W / 8)) uint8 tensor.
+        width: BEV width; defaults to 8 * packed width.
+        hero_channel: int, or (B,) per-sample hero channels (a batch mixing BEV layouts).
+        normalize: Return float32 values in [0, 1], which is exactly what CNNEncoder
+            computes from the dense uint8 BEV. Otherwise return uint8 values 0 / 100 / 255.
+
+    Returns:
+        (B, C, H, W) tensor, channels-first as consumed by CNNEncoder.
+    '''
+    if packed.dim() == 3:
+        packed = packed.unsqueeze(0)
+    if width is None:
+        width = packed.shape[-1] * 8
+
+    # np.packbits is big-endian: the first pixel is the most significant bit
+    shifts = torch.arange(7, -1, -1, dtype=torch.uint8, device=packed.device)
+    planes = (packed.to(torch.uint8).unsqueeze(-1) >> shifts) & 1           # (B, C + 1, H, W8, 8)
+    planes = planes.flatten(-2)[..., :width]                                # (B, C + 1, H, W)
+
+    bev = planes[:, :-1] * ON_VALUE
+    channels = torch.arange(bev.shape[1], device=packed.device)
+    hero_channel = torch.as_tensor(hero_channel, device=packed.device).reshape(-1, 1)   # (1 or B, 1)
+    is_hero_channel = (channels[None, :] == hero_channel)[:, :, None, None]            # (1 or B, C, 1, 1)
+    bev = torch.where(
+        is_hero_channel & planes[:, -1:].bool(),
+        torch.full_like(bev, hero_value),
+        bev,
+    )
+
+    if normalize:
+        return bev.float() / 255.0
+    return bev
+
+
+def unpack_obs_bev(obs, width=None, hero_channel=None):
+    '''
+    Replace obs["bev_packed"] by the expanded obs["bev_data"] on the packed tensor's
+    device. Observations without a packed BEV are returned unchanged. The hero channel
+    defaults to obs["bev_hero_channel"], the per-sample channels PedestrianStepDataset
+    takes from the attrs of each sample's shard.
+    '''
+    if "bev_packed" not in obs:
+        return obs
+    obs = dict(obs)
+    stored = obs.pop("bev_hero_channel", None)
+    if hero_channel is None:
+        hero_channel = HERO_CHANNEL if stored is None else stored
+    packed = obs.pop("bev_packed")
+    if isinstance(hero_channel, np.ndarray):
+        hero_channel = torch.from_numpy(hero_channel)
+    if torch.is_tensor(hero_channel):
+        hero_channel = hero_channel.to(packed.device)
+    obs["bev_data"] = unpack_bev_torch(packed, width=width, hero_channel=hero_channel)
+    return obs
+
+
+def bev_packing_test(num_samples=16, height=160, width=160, num_channels=5, seed=0):
+    '''Round-trip random BEVs through the NumPy and torch packers (both hero channel layouts).'''
+    rng = np.random.default_rng(seed)
+    for hero_channel in (HERO_CHANNEL, 3):
+        bev = (rng.random((num_samples, height, width, num_channels)) < 0.3).astype(np.uint8) * ON_VALUE
+        bev[..., hero_channel][rng.random((num_samples, height, width)) < 0.05] = HERO_VALUE
+
+        packed = pack_bev(bev, hero_channel=hero_channel)
+        assert packed.shape == (num_samples,) + packed_bev_shape(height, width, num_channels)
+        assert np.array_equal(unpack_bev(packed, width, hero_channel=hero_channel), bev)
+        assert np.array_equal(unpack_bev(pack_bev(bev[0], hero_channel=hero_channel), width, hero_channel=hero_channel), bev[0])
+
+        dense = torch.from_numpy(bev).float().permute(0, 3, 1, 2) / 255.0
+        assert torch.equal(unpack_bev_torch(torch.from_numpy(packed), width, hero_channel=hero_channel), dense)
+
+    # A batch mixing both layouts, unpacked with per-sample hero channels
+    channels = np.arange(num_samples) % 2 + 3
+    bev = (rng.random((num_samples, height, width, num_channels)) < 0.3).astype(np.uint8) * ON_VALUE
+    for k, hero_channel in enumerate(channels):
+        bev[k, ..., hero_channel][rng.random((height, width)) < 0.05] = HERO_VALUE
+    packed = np.stack([pack_bev(bev[k], hero_channel=channels[k]) for k in range(num_samples)])
+    dense = torch.from_numpy(bev).float().permute(0, 3, 1, 2) / 255.0
+    obs = unpack_obs_bev({"bev_packed": torch.from_numpy(packed), "bev_hero_channel": torch.from_numpy(channels)}, width)
+    assert torch.equal(obs["bev_data"], dense)
+
+    try:
+        pack_bev(np.full((4, 4, num_channels), 7, dtype=np.uint8))
+        raise AssertionError("pack_bev accepted a non-binary BEV")
+    except ValueError:
+        pass
+
+    print(
+        f"[bev_packing] round trip OK: {bev.nbytes / 1e6:.2f} MB dense -> "
+        f"{packed.nbytes / 1e6:.2f} MB packed (x{bev.nbytes / packed.nbytes:.1f})"
+    )
+
+
+if __name__ == "__main__":
+    bev_packing_test()
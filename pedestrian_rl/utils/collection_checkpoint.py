@@ -0,0 +1,165 @@
+'''
+Progress checkpoint of a data collection run.
+
+One JSON file next to the collection output (progress_<output stem>.json) records the
+completed episodes, the python / numpy RNG state after the last completed episode and the
+config hash of the run. A restarted collector resumes from the next missing episode with
+the RNG state it would have had, instead of starting again at episode 0. Without a
+checkpoint file (a dataset written before checkpointing), the episode groups already in
+the output are adopted as completed, so they are not collected again under new names.
+With one, groups it does not list were interrupted before record_episode and are
+collected again.
+'''
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from .dataset_shards import config_hash, write_json_atomic
+
+
+def get_rng_state():
+    '''JSON-serializable state of the python and numpy global RNGs.'''
+    version, python_state, gauss = random.getstate()
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        "python": [version, list(python_state), gauss],
+        "numpy": [name, keys.tolist(), int(pos), int(has_gauss), float(cached_gaussian)],
+    }
+
+
+def set_rng_state(rng_state):
+    version, python_state, gauss = rng_state["python"]
+    random.setstate((version, tuple(python_state), gauss))
+    name, keys, pos, has_gauss, cached_gaussian = rng_state["numpy"]
+    np.random.set_state((name, np.asarray(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+
+
+class CollectionCheckpoint:
+    '''
+    Progress checkpoint of one collection output (a single HDF5 file or one shard).
+
+    Attributes:
+        output_path: HDF5 file the collector writes.
+        path: Checkpoint JSON path.
+        config_hash: Hash of the current sim_config.json.
+        state: Checkpoint content: completed_episodes {name: {episode_idx, num_samples}},
+            rng, config_hash, num_retries.
+        rng_restored: Whether resume() restored the RNG state of a previous run.
+        existed: Whether the checkpoint file existed when the run started.
+
+    Methods:
+        resume(existing_episode_names=None):
+            Restore the RNG state and return the local index of the next missing episode.
+
+        adopt_episodes(episodes):
+            Mark the episode groups of an output without a checkpoint file completed.
+
+        unlisted_episodes(episode_names):
+            Episode groups of the output that the checkpoint does not list as completed.
+
+        record_episode(episode_idx, episode_name, num_samples):
+            Mark an episode completed and save the checkpoint with the current RNG state.
+
+        record_retry(reason):
+            Count a reconnect after a failed session.
+    '''
+
+    def __init__(self, output_path, config=None):
+        self.output_path = output_path
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+        self.path = os.path.join(os.path.dirname(output_path), f"progress_{stem}.json")
+        self.config_hash = config_hash(config)
+        self.rng_restored = False
+        self.existed = os.path.exists(self.path)
+
+        if self.existed:
+            with open(self.path, "r") as file:
+                self.state = json.load(file)
+        else:
+            self.state = {
+                "output": os.path.basename(output_path),
+                "config_hash": self.config_hash,
+                "completed_episodes": {},
+                "num_retries": 0,
+                "rng": None,
+            }
+
+    def resume(self, existing_episode_names=None):
+        '''
+        existing_episode_names: episode groups actually present in the output; checkpointed
+        episodes missing from it (e.g. the file was replaced) are collected again.
+        '''
+        if self.state["config_hash"] != self.config_hash and self.state["completed_episodes"]:
+            print(
+                f"[CollectionCheckpoint] Warning: {self.path} was written with config "
+                f"{self.state['config_hash']}, now {self.config_hash}; resuming anyway"
+            )
+        self.state["config_hash"] = self.config_hash
+
+        if existing_episode_names is not None:
+            existing = set(existing_episode_names)
+            self.state["completed_episodes"] = {
+                name: episode for name, episode in self.state["completed_episodes"].items() if name in existing
+            }
+
+        if self.state["rng"] is not None and self.state["completed_episodes"]:
+            set_rng_state(self.state["rng"])
+            self.rng_restored = True
+            print(
+                f"[CollectionCheckpoint] resuming {self.state['output']} after "
+                f"{len(self.state['completed_episodes'])} completed episodes"
+            )
+        return self.next_episode_idx()
+
+    def adopt_episodes(self, episodes):
+        '''
+        episodes: {name: (episode_idx, num_samples)} of the episode groups in the output.
+        Only used when no checkpoint file existed: a group the checkpoint does not list is
+        otherwise an interrupted episode, not a finished one. The RNG state is kept.
+        '''
+        if self.existed:
+            return 0
+        adopted = {
+            name: {"episode_idx": int(episode_idx), "num_samples": int(num_samples)}
+            for name, (episode_idx, num_samples) in episodes.items()
+            if name not in self.state["completed_episodes"]
+        }
+        if adopted:
+            self.state["completed_episodes"].update(adopted)
+            self._save()
+            print(f"[CollectionCheckpoint] adopted {len(adopted)} episodes already in {self.state['output']}")
+        return len(adopted)
+
+    def unlisted_episodes(self, episode_names):
+        return [name for name in episode_names if name not in self.state["completed_episodes"]]
+
+    def next_episode_idx(self):
+        completed = {episode["episode_idx"] for episode in self.state["completed_episodes"].values()}
+        episode_idx = 0
+        while episode_idx in completed:
+            episode_idx += 1
+        return episode_idx
+
+    def num_completed(self):
+        return len(self.state["completed_episodes"])
+
+    def record_episode(self, episode_idx, episode_name, num_samples):
+        self.state["completed_episodes"][episode_name] = {
+            "episode_idx": int(episode_idx),
+            "num_samples": int(num_samples),
+        }
+        self.state["rng"] = get_rng_state()
+        self._save()
+
+    def record_retry(self, reason):
+        self.state["num_retries"] += 1
+        self.state["last_error"] = str(reason)
+        self._save()
+
+    def _save(self):
+        self.state["updated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_json_atomic(self.path, self.state)
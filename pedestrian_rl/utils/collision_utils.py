@@ -0,0 +1,151 @@
+import math
+
+import carla
+import numpy as np
+
+from .config_loader import load_config
+
+
+def circles_hit_obbs(points, radii, centers, yaws, extents):
+    '''
+    Vectorized circle vs oriented-bounding-box overlap test.
+
+    Args:
+        points: (A, 2) circle centers in world frame.
+        radii: (A,) circle radii.
+        centers: (V, 2) box centers in world frame.
+        yaws: (V,) box yaw angles in radians.
+        extents: (V, 2) box half sizes along the box x (forward) and y (right) axes.
+
+    Returns:
+        (A, V) boolean matrix, True where circle a overlaps box v.
+    '''
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    extents = np.asarray(extents, dtype=np.float64).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=np.float64).reshape(-1)
+    cos_yaw = np.cos(yaws)
+    sin_yaw = np.sin(yaws)
+
+    # Agent positions in every box frame: (A, V)
+    dx = points[:, None, 0] - centers[None, :, 0]
+    dy = points[:, None, 1] - centers[None, :, 1]
+    local_x = dx * cos_yaw[None, :] + dy * sin_yaw[None, :]
+    local_y = -dx * sin_yaw[None, :] + dy * cos_yaw[None, :]
+
+    # Distance from the circle center to the closest point of the box
+    out_x = np.maximum(np.abs(local_x) - extents[None, :, 0], 0.0)
+    out_y = np.maximum(np.abs(local_y) - extents[None, :, 1], 0.0)
+    return (out_x ** 2 + out_y ** 2) <= (radii[:, None] ** 2)
+
+
+class GeometricCollisionDetector:
+    '''
+    Sensor-free pedestrian-vehicle collision detection from world snapshots.
+
+    Instead of spawning one sensor.other.collision actor per tracked pedestrian, this class
+    caches vehicle bounding boxes once per episode and, on every tick, tests pedestrian
+    circles against vehicle oriented bounding boxes taken from world.get_snapshot(). The
+    test is vectorized over all agents and vehicles, so the result is available
+    deterministically on the tick the overlap happens.
+
+    Attributes:
+        world: CARLA world object.
+        ped_radius: Radius of the pedestrian circle in meters.
+        margin: Extra distance added to the vehicle boxes in meters.
+        vehicle_ids: (V,) array of tracked vehicle IDs.
+        vehicle_offsets: (V, 2) bounding-box center offsets in the vehicle frame.
+        vehicle_extents: (V, 2) bounding-box half sizes (plus margin).
+
+    Methods:
+        update_vehicles():
+            Refresh the cached vehicle IDs and bounding boxes (call after spawning vehicles).
+
+        check(agent_ids, snapshot=None):
+            Return {agent_id: colliding_vehicle_id or None} for the current tick.
+    '''
+    config = load_config("sim_config.json")["simulation"].get("collision", {})
+
+    def __init__(
+            self,
+            world: carla.World,
+            ped_radius: float = config.get("ped_radius", 0.3),
+            margin: float = config.get("margin", 0.0),
+        ):
+        self.world = world
+        self.ped_radius = float(ped_radius)
+        self.margin = float(margin)
+
+        self.vehicle_ids = np.zeros(0, dtype=np.int64)
+        self.vehicle_offsets = np.zeros((0, 2), dtype=np.float64)
+        self.vehicle_extents = np.zeros((0, 2), dtype=np.float64)
+
+    def update_vehicles(self):
+        vehicles = list(self.world.get_actors().filter("vehicle.*"))
+        self.vehicle_ids = np.asarray([veh.id for veh in vehicles], dtype=np.int64)
+        self.vehicle_offsets = np.asarray(
+            [[veh.bounding_box.location.x, veh.bounding_box.location.y] for veh in vehicles],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        self.vehicle_extents = np.asarray(
+            [[veh.bounding_box.extent.x, veh.bounding_box.extent.y] for veh in vehicles],
+            dtype=np.float64,
+        ).reshape(-1, 2) + self.margin
+
+    def _vehicle_boxes(self, snapshot):
+        keep = []
+        centers = []
+        yaws = []
+        for idx, vehicle_id in enumerate(self.vehicle_ids):
+            actor_snapshot = snapshot.find(int(vehicle_id))
+            if actor_snapshot is None:
+                continue
+            transform = actor_snapshot.get_transform()
+            yaw = math.radians(transform.rotation.yaw)
+            offset_x, offset_y = self.vehicle_offsets[idx]
+            centers.append([
+                transform.location.x + offset_x * math.cos(yaw) - offset_y * math.sin(yaw),
+                transform.location.y + offset_x * math.sin(yaw) + offset_y * math.cos(yaw),
+            ])
+            yaws.append(yaw)
+            keep.append(idx)
+
+        keep = np.asarray(keep, dtype=np.int64)
+        return (
+            self.vehicle_ids[keep],
+            np.asarray(centers, dtype=np.float64).reshape(-1, 2),
+            np.asarray(yaws, dtype=np.float64),
+            self.vehicle_extents[keep],
+        )
+
+    def check(self, agent_ids, snapshot=None) -> dict:
+        if snapshot is None:
+            snapshot = self.world.get_snapshot()
+
+        result = {agent_id: None for agent_id in agent_ids}
+        if len(self.vehicle_ids) == 0 or len(agent_ids) == 0:
+            return result
+
+        present_ids = []
+        points = []
+        for agent_id in agent_ids:
+            actor_snapshot = snapshot.find(agent_id)
+            if actor_snapshot is None:
+                continue
+            location = actor_snapshot.get_transform().location
+            present_ids.append(agent_id)
+            points.append([location.x, location.y])
+
+        vehicle_ids, centers, yaws, extents = self._vehicle_boxes(snapshot)
+        if len(present_ids) == 0 or len(vehicle_ids) == 0:
+            return result
+
+        radii = np.full(len(points), self.ped_radius, dtype=np.float64)
+        hits = circles_hit_obbs(points, radii, centers, yaws, extents)
+
+        for row, agent_id in enumerate(present_ids):
+            hit_columns = np.flatnonzero(hits[row])
+            if len(hit_columns) > 0:
+                result[agent_id] = int(vehicle_ids[hit_columns[0]])
+
+        return result
@@ -6,10 +6,19 @@ import h5py
 import numpy as np
 import torch
 from torch.utils.data import Dataset, DataLoader
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from .sim_utils import CrossroadPedestrians
 from ..data_collection.bev.bev_sample import BEVSample, BEVWrapper
+from ..data_collection.bev.bev_seg_sample import SemanticBEVSample
 from ..data_collection.state_action_pair import PedestrianStateAction
+from ..data_collection.episode_buffer import EpisodeBuffer
+from .geometry import world_to_local_2d, local_to_world_2d
+from .config_loader import load_config
+from .bev_packing import HERO_CHANNEL, HERO_VALUE, pack_bev, stored_hero_channel, unpack_bev
+from .dataset_codecs import bev_dataset_kwargs
+from .dataset_shards import resolve_dataset_paths
+from .live_dataset import LIVE_GROUP, LivePedGroup, open_live_file
+from .bev_cache import SharedBEVCache
 
 
 
@@ -20,37 +29,17 @@ def rotate_world_to_local_2d(vector_xy: np.ndarray, yaw_rad: float) -> np.ndarra
     '''
     Convert a world-frame 2D vector [x, y] to the pedestrian local frame.
     Output convention: [right, forward].
+    Thin wrapper over geometry.world_to_local_2d, which also accepts batches.
     '''
-    vx = float(vector_xy[0])
-    vy = float(vector_xy[1])
-
-    forward_x = math.cos(yaw_rad)
-    forward_y = math.sin(yaw_rad)
-    right_x = -math.sin(yaw_rad)
-    right_y = math.cos(yaw_rad)
-
-    local_forward = vx * forward_x + vy * forward_y
-    local_right = vx * right_x + vy * right_y
-
-    return np.array([local_right, local_forward], dtype=np.float32)
+    return world_to_local_2d(vector_xy, float(yaw_rad)).astype(np.float32)
 
 
 def rotate_local_to_world_2d(local_vector_rf: np.ndarray, yaw_rad: float) -> np.ndarray:
     '''
     Convert a pedestrian local-frame vector [right, forward] back to world frame [x, y].
+    Thin wrapper over geometry.local_to_world_2d, which also accepts batches.
     '''
-    local_right = float(local_vector_rf[0])
-    local_forward = float(local_vector_rf[1])
-
-    forward_x = math.cos(yaw_rad)
-    forward_y = math.sin(yaw_rad)
-    right_x = -math.sin(yaw_rad)
-    right_y = math.cos(yaw_rad)
-
-    world_x = local_right * right_x + local_forward * forward_x
-    world_y = local_right * right_y + local_forward * forward_y
-
-    return np.array([world_x, world_y], dtype=np.float32)
+    return local_to_world_2d(local_vector_rf, float(yaw_rad)).astype(np.float32)
 
 
 def normalize_direction_2d(direction_xy: np.ndarray, eps: float = 1e-6) -> np.ndarray:
@@ -73,18 +62,21 @@ class DataSampler:
     Attributes:
         world: CARLA world object.
         bev_wrapper: BEV wrapper used to generate bird's-eye-view observations.
+        bev_render_pool: Optional BEVRenderPool that renders BEVs in worker processes.
+        record_bev: Render a BEV per sample; False for trajectory-only recording, where
+            BEVs are rendered offline from the logged actor state (trajectory_log.py).
         crossroad_pedestrians: CrossroadPedestrians object that stores spawned pedestrians and their goal locations.
         config: Configuration dictionary loaded from the config file.
         fixed_delta_time: Fixed simulation time step.
         sample_ped_num: Number of pedestrians to sample in each episode.
         prev_ped_location: Dictionary storing the previous location of each sampled pedestrian.
         prev_ped_frame: Dictionary storing the previous frame ID of each sampled pedestrian.
-        episode_buffer: List storing sampled PedestrianStateAction objects for the current episode.
+        episode_buffer: Columnar EpisodeBuffer storing the sampled data of the current episode.
         target_ped_ids: List of sampled pedestrian IDs that remain fixed during the episode.
 
     Methods:
         append_sample(ped_info):
-            Append one sampled PedestrianStateAction object to the episode buffer.
+            Copy one sampled PedestrianStateAction object into the episode buffer.
 
         get_episode_buffer():
             Return the sampled data buffer for the current episode.
@@ -93,15 +85,20 @@ class DataSampler:
             Reset previous pedestrian tracking info, episode buffer, and target pedestrian IDs
             when a new episode starts.
 
-        select_target_ped_ids():
-            Randomly select a fixed set of pedestrian IDs for the current episode.
+        select_target_ped_ids(candidate_ids=None):
+            Randomly select a fixed set of pedestrian IDs for the current episode, optionally
+            only among candidate_ids (the pedestrians of one IntersectionRegion).
 
         get_sample_pedestrians():
             Get the live pedestrian actor objects that correspond to the stored target IDs.
 
-        sample_single_pedestrian(ped, frame_id, timestamp):
+        render_bevs(peds, snapshot=None):
+            Render several pedestrians' BEVs in one call through the optional BEV render pool.
+
+        sample_single_pedestrian(ped, frame_id, timestamp, bev_data=None):
             Sample one pedestrian's state and action at the current frame, and return the
-            PedestrianStateAction object together with its BEV sample.
+            PedestrianStateAction object together with its BEV sample. A BEV prerendered
+            by render_bevs can be passed as bev_data.
     '''
 
     def __init__(self, world: carla.World, 
@@ -109,6 +106,8 @@ class DataSampler:
                  crossroad_pedestrians: CrossroadPedestrians, 
                  config,
                  bev_sample_class=BEVSample,
+                 bev_render_pool=None,
+                 record_bev=True,
         ):
 
         self.world = world
@@ -116,13 +115,15 @@ class DataSampler:
         self.crossroad_pedestrians = crossroad_pedestrians
         self.config = config
         self.bev_sample_class = bev_sample_class
+        self.bev_render_pool = bev_render_pool
+        self.record_bev = record_bev
 
         self.fixed_delta_time = config["simulation"]["fixed_delta_seconds"]
         self.sample_ped_num = config["dataset"]["num_ped_per_episode"]
 
         self.prev_ped_location = {}
         self.prev_ped_frame = {}
-        self.episode_buffer = []
+        self.episode_buffer = EpisodeBuffer()
         self.target_ped_ids = []
 
     def append_sample(self, ped_info):
@@ -134,11 +135,14 @@ class DataSampler:
     def reset_episode_tracking(self):
         self.prev_ped_location = {}
         self.prev_ped_frame = {}
-        self.episode_buffer = []
+        self.episode_buffer = EpisodeBuffer()
         self.target_ped_ids = []
 
-    def select_target_ped_ids(self):
+    def select_target_ped_ids(self, candidate_ids=None):
         all_peds = list(self.world.get_actors().filter("walker.*"))
+        if candidate_ids is not None:
+            candidate_ids = set(candidate_ids)
+            all_peds = [ped for ped in all_peds if ped.id in candidate_ids]
         k = min(self.sample_ped_num, len(all_peds))
 
         if k == 0:
@@ -153,18 +157,40 @@ class DataSampler:
         ped_dict = {ped.id: ped for ped in all_peds}
         return [ped_dict[pid] for pid in self.target_ped_ids if pid in ped_dict]
     
-    def sample_single_pedestrian(self, frame_id, timestamp, ped: carla.Walker):
+    def render_bevs(self, peds, snapshot=None):
+        '''
+        Render the BEVs of several pedestrians from one snapshot with the render pool.
+        Returns {ped_id: (H, W, 5) BEV}, or an empty dict when no pool is configured.
+        '''
+        if self.bev_render_pool is None or not self.record_bev or len(peds) == 0:
+            return {}
+        bev_stack = self.bev_render_pool.render_many(peds, snapshot=snapshot)
+        return {ped.id: bev_stack[k] for k, ped in enumerate(peds)}
+
+    def sample_single_pedestrian(self, frame_id, timestamp, ped: carla.Walker, bev_data=None):
+        '''
+        frame_id / timestamp describe the tick of a prerendered bev_data. A BEV rendered here
+        may tick the world (camera-based wrappers), so the frame is then read after rendering,
+        together with the state.
+        '''
         bev_sample = self.bev_sample_class(actor=ped, bev_wrapper=self.bev_wrapper)
         controller = ped.get_control()
+
+        # ----- state -----
+        if bev_data is None and self.record_bev:
+            bev_data = self.render_bevs([ped]).get(ped.id)
+            if bev_data is None:
+                bev_data = bev_sample.get_bev()
+                snapshot = self.world.get_snapshot()
+                timestamp = snapshot.timestamp
+                frame_id = snapshot.timestamp.frame
+
         ped_info = PedestrianStateAction(
             target_ped=ped,
             frame_id=frame_id,
             timestamp=timestamp
         )
 
-        # ----- state -----
-        bev_data = bev_sample.get_bev()
-
         # current_carla_loc = ped.get_location()
         current_carla_loc = ped.get_transform().location
         current_location = np.array(
@@ -229,19 +255,237 @@ class DataSampler:
 
     
 
-def convert_to_dataset(episode_data: list, output_path, episode_idx=None):
+EPISODE_NAME_DIGITS = 9            # room for shard_id * EPISODES_PER_SHARD ids (dataset_shards.py)
+INDEX_GROUP = "index"
+
+
+def episode_group_name(episode_idx):
+    """HDF5 group name of one episode; zero-padded so names sort numerically."""
+    return f"episode_{int(episode_idx):0{EPISODE_NAME_DIGITS}d}"
+
+
+def parse_episode_id(group_name):
+    """Episode id of an "episode_<digits>" group name (any padding), or None."""
+    prefix, _, suffix = group_name.rpartition("_")
+    if prefix != "episode" or not suffix.isdigit():
+        return None
+    return int(suffix)
+
+
+def iter_episode_names(file):
+    """Episode group names of an open dataset file (skips the compact index group)."""
+    return [name for name in file.keys() if name.startswith("episode")]
+
+
+def read_dense_bev(state_grp, rows):
+    """Read state/bev_data or state/bev_packed rows of one pedestrian as dense uint8 (..., H, W, C)."""
+    if "bev_packed" in state_grp:
+        packed = state_grp["bev_packed"]
+        return unpack_bev(
+            packed[rows], int(packed.attrs["bev_shape"][1]), hero_channel=stored_hero_channel(packed.attrs),
+        )
+    return np.asarray(state_grp["bev_data"][rows], dtype=np.uint8)
+
+
+def write_dataset_index(file):
+    """
+    Write the compact sample index: /index/ped_paths ("episode_xxx/ped_yyy") and
+    /index/num_steps. PedestrianStepDataset reads it instead of walking every group.
+    """
+    ped_paths, num_steps = [], []
+    for episode_name in sorted(iter_episode_names(file)):
+        for ped_name in file[episode_name].keys():
+            ped_paths.append(f"{episode_name}/{ped_name}")
+            num_steps.append(file[episode_name][ped_name]["frame_id"].shape[0])
+
+    if INDEX_GROUP in file:
+        del file[INDEX_GROUP]
+    index_grp = file.create_group(INDEX_GROUP)
+    index_grp.create_dataset("ped_paths", data=np.asarray(ped_paths, dtype=object), dtype=h5py.string_dtype())
+    index_grp.create_dataset("num_steps", data=np.asarray(num_steps, dtype=np.int32))
+    index_grp.attrs["num_samples"] = int(np.sum(num_steps)) if num_steps else 0
+    return index_grp
+
+
+def write_ped_arrays(
+        episode_grp, ped_id, columns: dict, pack_bev_data=False, codec=None, chunk_samples=None, hero_channel=HERO_CHANNEL,
+    ):
+    """
+    Write one pedestrian's columns into episode_grp/ped_<id> with the convert_to_dataset
+    layout. The BEV dataset uses the codec and chunking of dataset.compression in
+    sim_config.json unless codec / chunk_samples are given (see dataset_codecs.py).
+    hero_channel is the HERO_CHANNEL of the BEV class that rendered bev_data; it is
+    recorded in the BEV dataset attrs (packed or dense).
+
+    Args:
+        columns (dict[str, np.ndarray]):
+            frame_id, timestamp, bev_data (N, H, W, C) uint8, current_location, velocity,
+            speed, yaw_heading, goal_location, target_speed, target_direction. Without
+            bev_data no BEV dataset is written (trajectory log layout, trajectory_log.py).
+    """
+
+    # Create groups
+    ped_grp = episode_grp.create_group(f"ped_{ped_id}")
+    state_grp = ped_grp.create_group("state")
+    action_grp = ped_grp.create_group("action")
+
+    # ped_grp.create_dataset("ped_id", data=np.asarray([ped_id], dtype=np.int32))
+    ped_grp.create_dataset("frame_id", data=np.asarray(columns["frame_id"], dtype=np.int32))
+    ped_grp.create_dataset("timestamp", data=np.asarray(columns["timestamp"], dtype=np.float64))
+
+    if "bev_data" in columns:
+        bev_data = np.asarray(columns["bev_data"], dtype=np.uint8)
+        if pack_bev_data:
+            packed = pack_bev(bev_data, hero_channel=hero_channel)
+            bev_dset = state_grp.create_dataset(
+                "bev_packed",
+                data=packed,
+                **bev_dataset_kwargs(packed.shape[1:], len(packed), codec=codec, chunk_samples=chunk_samples),
+            )
+            bev_dset.attrs["bev_shape"] = np.asarray(bev_data.shape[1:], dtype=np.int32)
+        else:
+            bev_dset = state_grp.create_dataset(
+                "bev_data",
+                data=bev_data,
+                **bev_dataset_kwargs(bev_data.shape[1:], len(bev_data), codec=codec, chunk_samples=chunk_samples),
+            )
+        bev_dset.attrs["hero_channel"] = int(hero_channel)
+        bev_dset.attrs["hero_value"] = HERO_VALUE
+    state_grp.create_dataset("current_location", data=np.asarray(columns["current_location"], dtype=np.float32))
+    state_grp.create_dataset("velocity", data=np.asarray(columns["velocity"], dtype=np.float32))
+    state_grp.create_dataset("speed", data=np.asarray(columns["speed"], dtype=np.float32))
+    # state_grp.create_dataset("motion_heading", data=motion_headings)
+    state_grp.create_dataset("yaw_heading", data=np.asarray(columns["yaw_heading"], dtype=np.float32))
+    state_grp.create_dataset("goal_location", data=np.asarray(columns["goal_location"], dtype=np.float32))
+
+    action_grp.create_dataset("target_speed", data=np.asarray(columns["target_speed"], dtype=np.float32))
+    action_grp.create_dataset("target_direction", data=np.asarray(columns["target_direction"], dtype=np.float32))
+
+    return ped_grp
+
+
+def episode_ped_columns(episode_data: list):
+    """
+    Group one episode of PedestrianStateAction samples by pedestrian and stack them into
+    the write_ped_arrays columns, sorted by frame_id. Returns {ped_id: columns}; bev_data
+    is left out when the samples carry no BEV (trajectory-only recording). An EpisodeBuffer
+    already stores columns and returns them without copying.
+    """
+    if isinstance(episode_data, EpisodeBuffer):
+        return episode_data.ped_columns()
+
+    # Organize the sampled data to {ped_id: [PedestrainStateAction_1, PedestrainStateAction_2, ...]}
+    ped_groups = defaultdict(list)
+    for sample in episode_data:
+        ped_groups[sample.ped_id].append(sample)
+
+    ped_columns = {}
+    for ped_id, samples in ped_groups.items():
+        # sort each pedestrian's samples by frame_id
+        samples = sorted(samples, key=lambda s: s.state_action_pair["frame_id"])
+
+        # --- Info Buffer Initialization ---
+        # Time
+        frame_ids = []
+        timestamps = []
+        
+        # States
+        bev_data_list = []
+        current_locations = []
+        velocities = []
+        speeds = []
+        # motion_headings = []
+        yaw_headings = []
+        goal_locations = []
+
+        # Actions
+        target_speeds = []
+        target_directions = []
+
+        # --- Store Data ---
+        for sample in samples:
+            # Time
+            frame_ids.append(sample.state_action_pair["frame_id"])
+
+            ts = sample.state_action_pair["timestamp"]
+            if hasattr(ts, "elapsed_seconds"):
+                timestamps.append(float(ts.elapsed_seconds))
+            else:
+                timestamps.append(float(ts))
+
+            # States
+            if sample.state["bev_data"] is not None:
+                bev_data_list.append(np.asarray(sample.state["bev_data"], dtype=np.uint8))
+            current_locations.append(np.asarray(sample.state["current_location"], dtype=np.float32))
+            velocities.append(np.asarray(sample.state["velocity"], dtype=np.float32))
+            speeds.append(np.float32(sample.state["speed"]))
+            # motion_headings.append(np.float32(sample.state["motion_heading"]))
+
+            yaw_heading = sample.state.get("yaw_heading")
+            yaw_headings.append(np.float32(yaw_heading))
+
+            goal_loc = sample.state["goal_location"]
+            if hasattr(goal_loc, "x"):   # carla.Location
+                goal_loc = np.array([goal_loc.x, goal_loc.y, goal_loc.z], dtype=np.float32)
+            else:
+                goal_loc = np.asarray(goal_loc, dtype=np.float32)
+            goal_locations.append(goal_loc)
+
+            # Actions
+            target_speeds.append(np.float32(sample.action["target_speed"]))
+            target_directions.append(np.asarray(sample.action["target_direction"], dtype=np.float32))
+
+        # Convert data to numpy array/matrix
+        frame_ids = np.asarray(frame_ids, dtype=np.int32)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        current_locations = np.stack(current_locations, axis=0)
+        velocities = np.stack(velocities, axis=0)
+        speeds = np.asarray(speeds, dtype=np.float32)
+        # motion_headings = np.asarray(motion_headings, dtype=np.float32)
+        yaw_headings = np.asarray(yaw_headings, dtype=np.float32)
+        goal_locations = np.stack(goal_locations, axis=0)
+
+        target_speeds = np.asarray(target_speeds, dtype=np.float32)
+        target_directions = np.stack(target_directions, axis=0)
+
+        columns = {
+            "frame_id": frame_ids,
+            "timestamp": timestamps,
+            "current_location": current_locations,
+            "velocity": velocities,
+            "speed": speeds,
+            "yaw_heading": yaw_headings,
+            "goal_location": goal_locations,
+            "target_speed": target_speeds,
+            "target_direction": target_directions,
+        }
+        if len(bev_data_list) == len(samples):
+            columns["bev_data"] = np.stack(bev_data_list, axis=0)
+        ped_columns[ped_id] = columns
+
+    return ped_columns
+
+
+def convert_to_dataset(episode_data: list, output_path, episode_idx=None, pack_bev_data=None, hero_channel=HERO_CHANNEL):
     """
     Save one episode of pedestrian samples to an HDF5 file.
 
     Args:
-        episode_data (list[PedestrianStateAction]):
-            List of sampled pedestrian state-action objects from one episode.
+        episode_data (EpisodeBuffer | list[PedestrianStateAction]):
+            Sampled pedestrian state-action data of one episode.
         output_path (str):
             Path to output .h5 file.
         episode_idx (int | None):
             Optional episode index. If provided, data will be saved under
-            group name f"episode_{episode_idx:05d}".
+            group name episode_group_name(episode_idx), e.g. "episode_000000042".
             If None, data is saved under "episode".
+        pack_bev_data (bool | None):
+            Store BEVs as bitplanes (state/bev_packed) instead of dense uint8
+            (state/bev_data). Defaults to dataset.pack_bev in sim_config.json.
+        hero_channel (int):
+            HERO_CHANNEL of the BEV class that rendered the samples (BEVSample: 4,
+            SemanticBEVSample: 3), stored in the BEV dataset attrs.
 
     HDF5 structure:
         /episode_xxxxx/
@@ -249,6 +493,8 @@ def convert_to_dataset(episode_data: list, output_path, episode_idx=None):
                 frame_id                    (N,)
                 timestamp                   (N,)
                 state/bev_data              (N, H, W, C)
+                  or state/bev_packed       (N, C + 1, H, ceil(W / 8)), attrs bev_shape = (H, W, C)
+                                            (both carry attrs hero_channel / hero_value)
                 state/current_location      (N, 3)
                 state/velocity              (N, 3)
                 state/speed                 (N,)
@@ -262,110 +508,26 @@ def convert_to_dataset(episode_data: list, output_path, episode_idx=None):
         print("[convert_to_dataset] No data to save.")
         return
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    group_name = f"episode_{episode_idx:03d}" if episode_idx is not None else "episode"
+    if pack_bev_data is None:
+        pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
 
-    # Organize the sampled data to {ped_id: [PedestrainStateAction_1, PedestrainStateAction_2, ...]}
-    ped_groups = defaultdict(list)
-    for sample in episode_data:
-        ped_groups[sample.ped_id].append(sample)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    group_name = episode_group_name(episode_idx) if episode_idx is not None else "episode"
 
     with h5py.File(output_path, "a") as file:
         # overwrite same episode if exists
         if group_name in file:
             del file[group_name]
 
-        episode_grp = file.create_group(group_name)
-
-        for ped_id, samples in ped_groups.items():
-            # sort each pedestrian's samples by frame_id
-            samples = sorted(samples, key=lambda s: s.state_action_pair["frame_id"])
-
-            # --- Info Buffer Initialization ---
-            # Time
-            frame_ids = []
-            timestamps = []
-            
-            # States
-            bev_data_list = []
-            current_locations = []
-            velocities = []
-            speeds = []
-            # motion_headings = []
-            yaw_headings = []
-            goal_locations = []
-
-            # Actions
-            target_speeds = []
-            target_directions = []
-
-            # --- Store Data ---
-            for sample in samples:
-                # Time
-                frame_ids.append(sample.state_action_pair["frame_id"])
+        # The compact index no longer matches the file once an episode is added
+        if INDEX_GROUP in file:
+            del file[INDEX_GROUP]
 
-                ts = sample.state_action_pair["timestamp"]
-                if hasattr(ts, "elapsed_seconds"):
-                    timestamps.append(float(ts.elapsed_seconds))
-                else:
-                    timestamps.append(float(ts))
+        episode_grp = file.create_group(group_name)
 
-                # States
-                bev_data_list.append(np.asarray(sample.state["bev_data"], dtype=np.uint8))
-                current_locations.append(np.asarray(sample.state["current_location"], dtype=np.float32))
-                velocities.append(np.asarray(sample.state["velocity"], dtype=np.float32))
-                speeds.append(np.float32(sample.state["speed"]))
-                # motion_headings.append(np.float32(sample.state["motion_heading"]))
-
-                yaw_heading = sample.state.get("yaw_heading")
-                yaw_headings.append(np.float32(yaw_heading))
-
-                goal_loc = sample.state["goal_location"]
-                if hasattr(goal_loc, "x"):   # carla.Location
-                    goal_loc = np.array([goal_loc.x, goal_loc.y, goal_loc.z], dtype=np.float32)
-                else:
-                    goal_loc = np.asarray(goal_loc, dtype=np.float32)
-                goal_locations.append(goal_loc)
-
-                # Actions
-                target_speeds.append(np.float32(sample.action["target_speed"]))
-                target_directions.append(np.asarray(sample.action["target_direction"], dtype=np.float32))
-
-            # Convert data to numpy array/matrix
-            frame_ids = np.asarray(frame_ids, dtype=np.int32)
-            timestamps = np.asarray(timestamps, dtype=np.float64)
-
-            bev_data = np.stack(bev_data_list, axis=0)
-            current_locations = np.stack(current_locations, axis=0)
-            velocities = np.stack(velocities, axis=0)
-            speeds = np.asarray(speeds, dtype=np.float32)
-            # motion_headings = np.asarray(motion_headings, dtype=np.float32)
-            yaw_headings = np.asarray(yaw_headings, dtype=np.float32)
-            goal_locations = np.stack(goal_locations, axis=0)
-
-            target_speeds = np.asarray(target_speeds, dtype=np.float32)
-            target_directions = np.stack(target_directions, axis=0)
-
-            # --- Create HDF5 dataset ---
-            # Create groups
-            ped_grp = episode_grp.create_group(f"ped_{ped_id}")
-            state_grp = ped_grp.create_group("state")
-            action_grp = ped_grp.create_group("action")
-
-            # ped_grp.create_dataset("ped_id", data=np.asarray([ped_id], dtype=np.int32))
-            ped_grp.create_dataset("frame_id", data=frame_ids)
-            ped_grp.create_dataset("timestamp", data=timestamps)
-
-            state_grp.create_dataset("bev_data", data=bev_data, compression="gzip")
-            state_grp.create_dataset("current_location", data=current_locations)
-            state_grp.create_dataset("velocity", data=velocities)
-            state_grp.create_dataset("speed", data=speeds)
-            # state_grp.create_dataset("motion_heading", data=motion_headings)
-            state_grp.create_dataset("yaw_heading", data=yaw_headings)
-            state_grp.create_dataset("goal_location", data=goal_locations)
-
-            action_grp.create_dataset("target_speed", data=target_speeds)
-            action_grp.create_dataset("target_direction", data=target_directions)
+        # --- Create HDF5 dataset ---
+        for ped_id, columns in episode_ped_columns(episode_data).items():
+            write_ped_arrays(episode_grp, ped_id, columns, pack_bev_data=pack_bev_data, hero_channel=hero_channel)
 
     print(f"[convert_to_dataset] Saved {len(episode_data)} samples to {output_path}::{group_name}")
 
@@ -423,13 +585,41 @@ class PedestrianStepDataset(Dataset):
                     target_speed
                 frame_id
                 state/
-                    bev_data
+                    bev_data (or bev_packed, see convert_to_dataset)
                     current_location
                     goal_location
                     motion_heading
                     speed
                     velocity
                 timestamp
+
+    With packed_bev=True samples carry "bev_packed" (C + 1, H, ceil(W / 8)) uint8
+    bitplanes instead of the dense float32 "bev_data", so DataLoader batches move 8C / (C + 1)
+    times fewer BEV bytes than dense uint8 (6.7x for C = 5; 26.7x against float32); expand them on the device with bev_packing.unpack_obs_bev, which takes the
+    hero channel from the "bev_hero_channel" entry of packed samples. Files written
+    dense or packed are both readable in either mode. The hero channel comes from the BEV
+    dataset attrs; hero_channel is used for files that do not record it (written by the
+    default SemanticBEVSample collector before it was recorded). Dense BEVs can also be returned as
+    bev_dtype "uint8" (0 / 255 / hero value, 4x fewer bytes than float32), which
+    CNNEncoder converts and rescales on the device.
+
+    h5_path may also be a sharded dataset (its directory or manifest.json, see
+    dataset_shards.py). Episode names are globally unique, so index entries stay
+    (episode, ped, t) and each episode maps to the shard file that holds it.
+
+    Files in the live layout (live_dataset.py) are read through their track table. With
+    live=True they are opened in SWMR mode, so training can run while the collector still
+    writes them; refresh() appends the newly committed tracks to the index (existing
+    indices never move) and is also called on demand when an index past the end is read,
+    which keeps the copies held by persistent DataLoader workers up to date.
+
+    The datasets of the last ped_cache_size pedestrians read stay open, so consecutive
+    reads of one track (see bc_utils.BlockShuffleSampler) reuse the HDF5 chunk cache of
+    its BEV dataset instead of decompressing the chunk again. chunk_cache_mb sets the
+    per-dataset chunk cache size (h5py default 1 MB) for layouts with large chunks.
+
+    With bev_cache_gb > 0 decoded BEVs are kept in a SharedBEVCache (bev_cache.py) that
+    all DataLoader workers and epochs share, up to bev_cache_gb (partial caching beyond).
     '''
 
     def __init__(
@@ -440,43 +630,169 @@ class PedestrianStepDataset(Dataset):
         clip_bound=3.0,
         speed_eps=0.05,
         future_steps=1,
+        packed_bev=False,
+        live=False,
+        bev_dtype="float32",
+        ped_cache_size=16,
+        chunk_cache_mb=None,
+        bev_cache_gb=0,
+        bev_cache_dir=None,
+        hero_channel=SemanticBEVSample.HERO_CHANNEL,
     ):
         self.h5_path = h5_path
+        self.packed_bev = bool(packed_bev)
+        self.bev_dtype = np.dtype(bev_dtype)
+        self.hero_channel = int(hero_channel)
+        self.live = bool(live)
+        self.ped_cache_size = int(ped_cache_size)
+        self.chunk_cache_mb = chunk_cache_mb
         self.use_goal_relative = use_goal_relative
         self.goal_scale = float(goal_scale)
         self.clip_bound = float(clip_bound)
         self.index = []
         self.speed_eps = float(speed_eps)
         self.future_steps = int(max(1, future_steps))
-        self._h5_file = None
-
-        self._build_index()
-
-    def _build_index(self):
-        with h5py.File(self.h5_path, "r") as f:
-            for episode_name in f.keys():
-                episode_group = f[episode_name]
-                for ped_name in episode_group.keys():
-                    ped_group = episode_group[ped_name]
-                    n_steps = ped_group["state"]["bev_data"].shape[0]
-                    for t in range(n_steps):
-                        self.index.append((episode_name, ped_name, t))
-
-    def _get_h5(self):
-        if self._h5_file is None:
-            self._h5_file = h5py.File(self.h5_path, "r")
-        return self._h5_file
+        self.shard_paths = resolve_dataset_paths(h5_path)
+        self.episode_shard = {}
+        self.live_tracks = {}
+        self.live_shards = {}
+        self._h5_files = {}
+        self._live_columns = {}
+        self._ped_cache = OrderedDict()
+        self._shard_hero_channel = {}
+
+        for shard_idx, shard_path in enumerate(self.shard_paths):
+            self._build_index(shard_idx, shard_path)
+
+        self.bev_cache = None
+        if bev_cache_gb and bev_cache_gb > 0:
+            if not self.index:
+                raise ValueError("bev_cache_gb needs a non-empty dataset to size the cache")
+            episode_name, ped_name, _ = self.index[0]
+            try:
+                sample_shape = self._decode_bev(episode_name, self._get_ped_group(episode_name, ped_name)["state"], 0).shape
+            finally:
+                # Do not hand open HDF5 handles to forked DataLoader workers
+                self.close()
+            # A live dataset keeps growing, so its cache is sized by bev_cache_gb alone
+            num_samples = np.iinfo(np.int64).max if self.live else len(self.index)
+            self.bev_cache = SharedBEVCache(sample_shape, num_samples, bev_cache_gb, cache_dir=bev_cache_dir)
+
+    def _open(self, path):
+        cache_kwargs = {}
+        if self.chunk_cache_mb:
+            cache_kwargs = {"rdcc_nbytes": int(self.chunk_cache_mb * 1024 ** 2), "rdcc_nslots": 10007}
+        return open_live_file(path, **cache_kwargs) if self.live else h5py.File(path, "r", **cache_kwargs)
+
+    def _build_index(self, shard_idx, shard_path):
+        with self._open(shard_path) as f:
+            if LIVE_GROUP in f:
+                self.live_shards[shard_idx] = 0
+                self._add_live_tracks(shard_idx, f[LIVE_GROUP]["tracks"][()])
+                return
+            if INDEX_GROUP in f:
+                index_grp = f[INDEX_GROUP]
+                ped_entries = [
+                    (*ped_path.split("/"), int(n_steps))
+                    for ped_path, n_steps in zip(index_grp["ped_paths"].asstr()[()], index_grp["num_steps"][()])
+                ]
+            else:
+                ped_entries = [
+                    (episode_name, ped_name, f[episode_name][ped_name]["frame_id"].shape[0])
+                    for episode_name in iter_episode_names(f)
+                    for ped_name in f[episode_name].keys()
+                ]
+
+        for episode_name, ped_name, n_steps in ped_entries:
+            owner = self.episode_shard.setdefault(episode_name, shard_idx)
+            if owner != shard_idx:
+                raise ValueError(
+                    f"{episode_name} is stored in both {self.shard_paths[owner]} and {shard_path}"
+                )
+            for t in range(n_steps):
+                self.index.append((episode_name, ped_name, t))
+
+    def _add_live_tracks(self, shard_idx, tracks):
+        '''Index the (episode id, ped id, first row, num steps) track rows of a live shard.'''
+        for episode_id, ped_id, start, n_steps in tracks:
+            episode_name = episode_group_name(episode_id)
+            ped_name = f"ped_{int(ped_id)}"
+            owner = self.episode_shard.setdefault(episode_name, shard_idx)
+            if owner != shard_idx:
+                raise ValueError(
+                    f"{episode_name} is stored in both {self.shard_paths[owner]} and {self.shard_paths[shard_idx]}"
+                )
+            self.live_tracks[(episode_name, ped_name)] = (int(start), int(n_steps))
+            for t in range(int(n_steps)):
+                self.index.append((episode_name, ped_name, t))
+        self.live_shards[shard_idx] += len(tracks)
+
+    def refresh(self):
+        '''Index the tracks committed to live shards since the last call; returns the number of new samples.'''
+        if not self.live:
+            return 0
+        num_samples = len(self.index)
+        for shard_idx, num_tracks in self.live_shards.items():
+            if shard_idx in self._live_columns:
+                # Open handles only see the rows appended by the writer after a refresh
+                for dset in self._live_columns[shard_idx].values():
+                    dset.refresh()
+                tracks = self._live_columns[shard_idx]["tracks"][num_tracks:]
+            else:
+                with open_live_file(self.shard_paths[shard_idx]) as f:
+                    tracks = f[LIVE_GROUP]["tracks"][num_tracks:]
+            self._add_live_tracks(shard_idx, tracks)
+        return len(self.index) - num_samples
+
+    def _get_h5(self, episode_name):
+        shard_idx = self.episode_shard[episode_name]
+        if shard_idx not in self._h5_files:
+            self._h5_files[shard_idx] = self._open(self.shard_paths[shard_idx])
+        return self._h5_files[shard_idx]
+
+    def _get_ped_group(self, episode_name, ped_name):
+        key = (episode_name, ped_name)
+        ped_group = self._ped_cache.get(key)
+        if ped_group is not None:
+            self._ped_cache.move_to_end(key)
+            return ped_group
+
+        ped_group = self._open_ped_group(episode_name, ped_name)
+        if self.ped_cache_size > 0:
+            self._ped_cache[key] = ped_group
+            if len(self._ped_cache) > self.ped_cache_size:
+                self._ped_cache.popitem(last=False)
+        return ped_group
+
+    def _open_ped_group(self, episode_name, ped_name):
+        shard_idx = self.episode_shard[episode_name]
+        if shard_idx not in self.live_shards:
+            ped_grp = self._get_h5(episode_name)[episode_name][ped_name]
+            # Dataset handles (not the group) keep their chunk cache while they stay open
+            return {
+                "frame_id": ped_grp["frame_id"],
+                "timestamp": ped_grp["timestamp"],
+                "state": {name: ped_grp["state"][name] for name in ped_grp["state"].keys()},
+                "action": {name: ped_grp["action"][name] for name in ped_grp["action"].keys()},
+            }
+
+        if shard_idx not in self._live_columns:
+            live_grp = self._get_h5(episode_name)[LIVE_GROUP]
+            self._live_columns[shard_idx] = {name: live_grp[name] for name in live_grp.keys()}
+        start, n_steps = self.live_tracks[(episode_name, ped_name)]
+        return LivePedGroup(self._live_columns[shard_idx], start, n_steps)
 
     def __len__(self):
         return len(self.index)
     
     def __getitem__(self, idx):
-        f = self._get_h5()
+        if idx >= len(self.index):
+            self.refresh()
         episode_name, ped_name, t = self.index[idx]
-        ped_group = f[episode_name][ped_name]
+        ped_group = self._get_ped_group(episode_name, ped_name)
 
         # ----- state -----
-        bev_data = np.asarray(ped_group["state"]["bev_data"][t], dtype=np.float32)                      # (H, W, C)
+        bev_key, bev = self._read_bev(idx, episode_name, ped_group["state"], t)                         # (H, W, C) or packed
         current_location = np.asarray(ped_group["state"]["current_location"][t], dtype=np.float32)      # (2,) or (3,)
         goal_location = np.asarray(ped_group["state"]["goal_location"][t], dtype=np.float32)            # (2,) or (3,)
         velocity = np.asarray(ped_group["state"]["velocity"][t], dtype=np.float32)                      # (2,) or (3,)
@@ -530,7 +846,7 @@ class PedestrianStepDataset(Dataset):
 
         sample = {
             # inputs
-            "bev_data": torch.from_numpy(bev_data),
+            bev_key: torch.from_numpy(bev),
             "velocity_local": torch.from_numpy(velocity_local),
             "goal_rel_local": torch.from_numpy(goal_rel_local),
             "yaw_sin": torch.tensor(yaw_sin, dtype=torch.float32),
@@ -560,13 +876,50 @@ class PedestrianStepDataset(Dataset):
             "frame_id": torch.tensor(frame_id),
             "timestamp": torch.tensor(timestamp),
         }
+        if bev_key == "bev_packed":
+            sample["bev_hero_channel"] = self._hero_channel(episode_name, ped_group["state"])
 
         return sample
 
+    def _read_bev(self, idx, episode_name, state_group, t):
+        '''Return (sample key, array) of step t (dataset index idx) in the requested BEV format.'''
+        bev = self.bev_cache.get(idx) if self.bev_cache is not None else None
+        if bev is None:
+            bev = self._decode_bev(episode_name, state_group, t)
+            if self.bev_cache is not None:
+                self.bev_cache.put(idx, bev)
+
+        if self.packed_bev:
+            return "bev_packed", bev
+        return "bev_data", np.asarray(bev, dtype=self.bev_dtype)
+
+    def _decode_bev(self, episode_name, state_group, t):
+        '''uint8 BEV of step t: packed bitplanes with packed_bev, else dense (H, W, C).'''
+        if self.packed_bev and "bev_packed" in state_group:
+            return np.asarray(state_group["bev_packed"][t], dtype=np.uint8)
+
+        bev_data = read_dense_bev(state_group, t)
+        if self.packed_bev:
+            return pack_bev(bev_data, hero_channel=self._hero_channel(episode_name, state_group))
+        return bev_data
+
+    def _hero_channel(self, episode_name, state_group):
+        '''Hero channel of the shard holding episode_name (its BEV attrs, else hero_channel).'''
+        shard_idx = self.episode_shard[episode_name]
+        if shard_idx not in self._shard_hero_channel:
+            bev_dset = state_group["bev_packed"] if "bev_packed" in state_group else state_group["bev_data"]
+            self._shard_hero_channel[shard_idx] = stored_hero_channel(bev_dset.attrs, default=self.hero_channel)
+        return self._shard_hero_channel[shard_idx]
+
     def close(self):
-        if self._h5_file is not None:
-            self._h5_file.close()
-            self._h5_file = None
+        for h5_file in self._h5_files.values():
+            h5_file.close()
+        self._h5_files = {}
+        self._live_columns = {}
+        self._ped_cache = OrderedDict()
+        if getattr(self, "bev_cache", None) is not None:
+            self.bev_cache.close()
+            self.bev_cache = None
 
     def __del__(self):
         self.close()
@@ -0,0 +1,97 @@
+'''
+HDF5 compression codecs and chunk layouts for the BEV datasets.
+
+Codec names (dataset.compression.codec in sim_config.json):
+    none            no compression
+    lzf             h5py built-in LZF (fast, moderate ratio)
+    gzip-N          deflate level N in 0..9 ("gzip" alone is level 4, the h5py default)
+    blosc-lz4, blosc-zstd, zstd-N, lz4, bitshuffle-lz4
+                    only when the optional hdf5plugin package is installed
+
+Chunking (dataset.compression.chunk_samples):
+    k > 0           chunks of (k, *sample_shape): one chunk per k samples, so a random
+                    read decompresses at most k samples
+    0               let h5py pick the chunk shape (the original behavior)
+'''
+from .config_loader import load_config
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+
+DEFAULT_GZIP_LEVEL = 4
+PLUGIN_CODECS = ("blosc-lz4", "blosc-zstd", "zstd-3", "lz4", "bitshuffle-lz4")
+
+
+def available_codecs():
+    '''Codec names usable in this environment (plugin codecs need hdf5plugin).'''
+    codecs = ["none", "lzf"] + [f"gzip-{level}" for level in (1, 4, 6, 9)]
+    if hdf5plugin is not None:
+        codecs += list(PLUGIN_CODECS)
+    return codecs
+
+
+def codec_kwargs(codec, shuffle=False):
+    '''
+    Translate a codec name into h5py create_dataset keyword arguments.
+
+    Args:
+        codec: Codec name, see the module docstring.
+        shuffle: Enable the HDF5 byte-shuffle filter (built-in codecs only).
+    '''
+    codec = (codec or "none").lower()
+
+    if codec == "none":
+        return {}
+    if codec == "lzf":
+        return {"compression": "lzf", "shuffle": bool(shuffle)}
+    if codec == "gzip" or codec.startswith("gzip-"):
+        level = DEFAULT_GZIP_LEVEL if codec == "gzip" else int(codec.split("-", 1)[1])
+        if not 0 <= level <= 9:
+            raise ValueError(f"gzip level must be in 0..9, got {level}")
+        return {"compression": "gzip", "compression_opts": level, "shuffle": bool(shuffle)}
+
+    if codec.split("-")[0] in ("blosc", "zstd", "lz4", "bitshuffle"):
+        if hdf5plugin is None:
+            raise ValueError(f"Codec '{codec}' needs the optional hdf5plugin package (pip install hdf5plugin)")
+        if codec == "blosc-lz4":
+            return dict(hdf5plugin.Blosc(cname="lz4", clevel=5, shuffle=hdf5plugin.Blosc.BITSHUFFLE))
+        if codec == "blosc-zstd":
+            return dict(hdf5plugin.Blosc(cname="zstd", clevel=3, shuffle=hdf5plugin.Blosc.BITSHUFFLE))
+        if codec == "zstd" or codec.startswith("zstd-"):
+            level = 3 if codec == "zstd" else int(codec.split("-", 1)[1])
+            return dict(hdf5plugin.Zstd(clevel=level))
+        if codec == "lz4":
+            return dict(hdf5plugin.LZ4())
+        if codec == "bitshuffle-lz4":
+            return dict(hdf5plugin.Bitshuffle(cname="lz4"))
+
+    raise ValueError(f"Unknown codec '{codec}', expected one of {available_codecs()}")
+
+
+def chunk_shape(sample_shape, num_samples, chunk_samples):
+    '''
+    Chunk shape for a (num_samples, *sample_shape) dataset: (k, *sample_shape) with
+    k = min(chunk_samples, num_samples), or True (h5py auto-chunking) when chunk_samples <= 0.
+    '''
+    if chunk_samples is None or int(chunk_samples) <= 0:
+        return True
+    return (max(1, min(int(chunk_samples), int(num_samples))),) + tuple(sample_shape)
+
+
+def bev_dataset_kwargs(sample_shape, num_samples, codec=None, chunk_samples=None, shuffle=None):
+    '''
+    create_dataset keyword arguments for a BEV dataset. Unset options fall back to
+    dataset.compression in sim_config.json.
+    '''
+    config = load_config("sim_config.json")["dataset"].get("compression", {})
+    codec = config.get("codec", f"gzip-{DEFAULT_GZIP_LEVEL}") if codec is None else codec
+    chunk_samples = config.get("chunk_samples", 0) if chunk_samples is None else chunk_samples
+    shuffle = config.get("shuffle", False) if shuffle is None else shuffle
+
+    kwargs = codec_kwargs(codec, shuffle=shuffle)
+    if num_samples > 0:
+        kwargs["chunks"] = chunk_shape(sample_shape, num_samples, chunk_samples)
+    return kwargs
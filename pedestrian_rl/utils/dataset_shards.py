@@ -0,0 +1,217 @@
+'''
+Sharded dataset layout.
+
+    <dataset_dir>/
+        manifest.json           shards, sample counts and config hashes (write_manifest)
+        shard_000.h5            one HDF5 file per collector, convert_to_dataset layout
+        shard_000.json          sidecar kept up to date by the collector's ShardWriter
+        shard_001.h5
+        ...
+
+Every collector writes only its own shard and sidecar, so several collectors (one per
+CARLA server) never share an HDF5 writer. Episode ids are globally unique:
+shard_id * EPISODES_PER_SHARD + local episode index.
+'''
+import glob
+import hashlib
+import json
+import os
+import time
+
+from .config_loader import load_config
+
+
+EPISODES_PER_SHARD = 1_000_000
+MANIFEST_NAME = "manifest.json"
+
+
+def config_hash(config=None):
+    '''
+    Short hash of sim_config.json identifying the collection settings of a shard.
+    dataset.sharding is left out because it differs between collectors of one dataset.
+    '''
+    config = load_config("sim_config.json") if config is None else config
+    config = dict(config)
+    config["dataset"] = {k: v for k, v in config.get("dataset", {}).items() if k != "sharding"}
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def shard_file_name(shard_id):
+    return f"shard_{int(shard_id):03d}.h5"
+
+
+def global_episode_id(shard_id, local_episode_idx):
+    if not 0 <= local_episode_idx < EPISODES_PER_SHARD:
+        raise ValueError(f"Local episode index {local_episode_idx} out of range for one shard")
+    return int(shard_id) * EPISODES_PER_SHARD + int(local_episode_idx)
+
+
+def write_json_atomic(path, data):
+    '''Write JSON through a temporary file and os.replace so readers never see a partial file.'''
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=4)
+    os.replace(tmp_path, path)
+
+
+class ShardWriter:
+    '''
+    Writer of one collector's shard in a sharded dataset directory.
+
+    Episodes are appended to shard_<id>.h5 with convert_to_dataset under globally unique
+    episode ids, and the shard_<id>.json sidecar (episode names, sample counts, config
+    hash) is rewritten after each episode. Re-opening an existing shard continues after
+    its last recorded episode.
+
+    Attributes:
+        dataset_dir: Sharded dataset directory.
+        shard_id: Collector / shard id.
+        path: Path of the shard HDF5 file.
+        sidecar_path: Path of the shard JSON sidecar.
+        sidecar: Current sidecar content.
+
+    Methods:
+        next_episode_id():
+            Global id of the next episode written to this shard.
+
+        write_episode(episode_data, **convert_kwargs):
+            Append one episode (EpisodeBuffer or list of PedestrianStateAction) and update the sidecar.
+
+        write_episode_columns(ped_columns, **write_kwargs):
+            Append one episode given as per-pedestrian column arrays and update the sidecar.
+    '''
+
+    def __init__(self, dataset_dir, shard_id, config=None):
+        self.dataset_dir = dataset_dir
+        self.shard_id = int(shard_id)
+        self.path = os.path.join(dataset_dir, shard_file_name(shard_id))
+        self.sidecar_path = os.path.splitext(self.path)[0] + ".json"
+        self.config_hash = config_hash(config)
+        os.makedirs(dataset_dir, exist_ok=True)
+
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, "r") as file:
+                self.sidecar = json.load(file)
+            if self.sidecar.get("config_hash") != self.config_hash:
+                print(
+                    f"[ShardWriter] Warning: shard {self.shard_id} was written with config "
+                    f"{self.sidecar.get('config_hash')}, now {self.config_hash}"
+                )
+        else:
+            self.sidecar = {
+                "shard_id": self.shard_id,
+                "path": os.path.basename(self.path),
+                "config_hash": self.config_hash,
+                "num_episodes": 0,
+                "num_samples": 0,
+                "episodes": {},
+            }
+
+    def next_episode_id(self):
+        return global_episode_id(self.shard_id, self.sidecar["num_episodes"])
+
+    def write_episode(self, episode_data, **convert_kwargs):
+        '''Append one episode of samples; convert_kwargs (pack_bev_data, hero_channel) go to convert_to_dataset.'''
+        # Imported here: data_utils pulls in CARLA / torch, the manifest helpers do not
+        from .data_utils import convert_to_dataset, episode_group_name
+
+        episode_id = self.next_episode_id()
+        convert_to_dataset(episode_data=episode_data, output_path=self.path, episode_idx=episode_id, **convert_kwargs)
+        return self._record_episode(episode_group_name(episode_id), len(episode_data))
+
+    def write_episode_columns(self, ped_columns: dict, **write_kwargs):
+        '''
+        Append one episode given as {ped_id: columns}; write_kwargs (pack_bev_data, codec,
+        chunk_samples, hero_channel) are passed to data_utils.write_ped_arrays.
+        '''
+        import h5py
+        from .data_utils import INDEX_GROUP, episode_group_name, write_ped_arrays
+
+        episode_name = episode_group_name(self.next_episode_id())
+        with h5py.File(self.path, "a") as file:
+            if episode_name in file:
+                del file[episode_name]
+            if INDEX_GROUP in file:
+                del file[INDEX_GROUP]
+            episode_grp = file.create_group(episode_name)
+            for ped_id, columns in ped_columns.items():
+                write_ped_arrays(episode_grp, ped_id, columns, **write_kwargs)
+
+        num_samples = sum(len(columns["frame_id"]) for columns in ped_columns.values())
+        return self._record_episode(episode_name, num_samples)
+
+    def _record_episode(self, episode_name, num_samples):
+        self.sidecar["episodes"][episode_name] = int(num_samples)
+        self.sidecar["num_episodes"] += 1
+        self.sidecar["num_samples"] += int(num_samples)
+        self.sidecar["updated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        write_json_atomic(self.sidecar_path, self.sidecar)
+        return episode_name
+
+
+def write_manifest(dataset_dir, sidecars=None):
+    '''
+    Aggregate the shard sidecars of dataset_dir into manifest.json.
+    Raises ValueError if two shards contain the same episode.
+    '''
+    if sidecars is None:
+        sidecars = []
+        for sidecar_path in sorted(glob.glob(os.path.join(dataset_dir, "shard_*.json"))):
+            with open(sidecar_path, "r") as file:
+                sidecars.append(json.load(file))
+
+    owners = {}
+    for sidecar in sidecars:
+        for episode_name in sidecar["episodes"]:
+            if episode_name in owners:
+                raise ValueError(f"{episode_name} appears in {owners[episode_name]} and {sidecar['path']}")
+            owners[episode_name] = sidecar["path"]
+
+    config_hashes = sorted({sidecar["config_hash"] for sidecar in sidecars})
+    if len(config_hashes) > 1:
+        print(f"[write_manifest] Warning: shards were collected with different configs {config_hashes}")
+
+    manifest = {
+        "version": 1,
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "num_shards": len(sidecars),
+        "num_episodes": sum(sidecar["num_episodes"] for sidecar in sidecars),
+        "num_samples": sum(sidecar["num_samples"] for sidecar in sidecars),
+        "config_hashes": config_hashes,
+        "shards": [
+            {
+                "shard_id": sidecar["shard_id"],
+                "path": sidecar["path"],
+                "num_episodes": sidecar["num_episodes"],
+                "num_samples": sidecar["num_samples"],
+                "config_hash": sidecar["config_hash"],
+            }
+            for sidecar in sidecars
+        ],
+    }
+    write_json_atomic(os.path.join(dataset_dir, MANIFEST_NAME), manifest)
+    return manifest
+
+
+def resolve_dataset_paths(dataset_path):
+    '''
+    HDF5 files of a dataset: a single .h5 file, or the shards listed by a manifest
+    (manifest.json path or its directory; given the directory, a missing or stale
+    manifest is rebuilt from the shard sidecars).
+    '''
+    if not os.path.isdir(dataset_path) and not dataset_path.endswith(".json"):
+        return [dataset_path]
+
+    if os.path.isdir(dataset_path):
+        dataset_dir = dataset_path
+        manifest_path = os.path.join(dataset_dir, MANIFEST_NAME)
+        sidecar_mtimes = [os.path.getmtime(path) for path in glob.glob(os.path.join(dataset_dir, "shard_*.json"))]
+        if not os.path.exists(manifest_path) or max(sidecar_mtimes, default=0.0) > os.path.getmtime(manifest_path):
+            write_manifest(dataset_dir)
+    else:
+        dataset_dir = os.path.dirname(dataset_path)
+        manifest_path = dataset_path
+
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    return [os.path.join(dataset_dir, shard["path"]) for shard in manifest["shards"]]
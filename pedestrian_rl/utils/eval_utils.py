@@ -15,7 +15,9 @@ from ..utils.sim_utils import (
 )
 from ..data_collection.bev.bev_sample import BEVWrapper, BEVSample
 from ..data_collection.bev.bev_seg_sample import SemanticBEVWrapper, SemanticBEVSample
+from ..data_collection.bev.bev_render_pool import build_bev_render_pool
 from .data_utils import rotate_world_to_local_2d, rotate_local_to_world_2d
+from .spatial_index import ActorSpatialIndex
 from ..utils.td3_utils import PedestrianRLEnv, build_td3_agent
 from ..models.cnn_encoder import CNNEncoder
 from collections import defaultdict
@@ -96,6 +98,7 @@ class PolicyRunner:
         )
         self.bev_wrapper = bev_wrapper(cfg=None, world=self.world)
         self.bev_sampler = bev_sampler
+        self.bev_render_pool = build_bev_render_pool(self.bev_wrapper)
 
         # --- define prediction model ---
         self.model_class = model_class
@@ -186,7 +189,7 @@ class PolicyRunner:
 
         while spawned < self.crossroad_pedestrians.ped_num and len(spawn_points) > 0:
             spawn_location = spawn_points.pop()
-            destination = self.world.get_random_location_from_navigation()
+            destination = self.crossroad_pedestrians.get_ped_destination()
 
             if destination is None:
                 continue
@@ -255,10 +258,19 @@ class PolicyRunner:
         self.prev_frames[ped.id] = frame_id
         return current_location, velocity, speed
 
-    def _build_observation(self, ped: carla.Actor, frame_id: int):
+    def _render_bevs(self, snapshot):
+        """Render all model-controlled pedestrians' BEVs in one pool call (empty without a pool)."""
+        if self.bev_render_pool is None:
+            return {}
+        peds = list(self.target_peds.values())
+        bev_stack = self.bev_render_pool.render_many(peds, snapshot=snapshot)
+        return {ped.id: bev_stack[k] for k, ped in enumerate(peds)}
+
+    def _build_observation(self, ped: carla.Actor, frame_id: int, bev_data=None):
         """Build up observation for one target pedestrian."""
         bev_sample = self.bev_sampler(actor=ped, bev_wrapper=self.bev_wrapper)
-        bev_data = bev_sample.get_bev()
+        if bev_data is None:
+            bev_data = bev_sample.get_bev()
 
         current_location, velocity, speed = self._compute_velocity_speed(ped, frame_id)
         yaw_heading = math.radians(ped.get_transform().rotation.yaw)
@@ -371,10 +383,11 @@ class PolicyRunner:
 
         peds_debug = defaultdict(dict)
         reached_any_goal = False
+        prerendered_bevs = self._render_bevs(snapshot)
 
         # Spawn model-controlled pedestrians
         for ped_id, ped in self.target_peds.items():
-            batch, debug_state = self._build_observation(ped, frame_id)
+            batch, debug_state = self._build_observation(ped, frame_id, bev_data=prerendered_bevs.get(ped_id))
 
             with torch.no_grad():
                 outputs = self.model(batch)
@@ -433,6 +446,12 @@ class PolicyRunner:
                 self.world.tick()
             self.step_once(render_bev=render_bev)
 
+    def close(self):
+        if self.bev_render_pool is not None:
+            self.bev_render_pool.close()
+            self.bev_render_pool = None
+        self.bev_wrapper.close()
+
 
 
 class EpisodeEvaluator:
@@ -461,9 +480,12 @@ class EpisodeEvaluator:
         target_ped: carla.Actor,
         dt: float,
         stall_speed_threshold: float = 0.05,
+        lane_grid=None,
+        collision_detector=None,
     ):
         self.world = world
         self.world_map = world.get_map()
+        self.lane_grid = lane_grid
         self.target_ped = target_ped
         self.dt = float(dt)
         self.stall_speed_threshold = float(stall_speed_threshold)
@@ -479,7 +501,11 @@ class EpisodeEvaluator:
         self.min_vehicle_distance = float("inf")
 
         self.collision_sensor = None
-        self.attach_collision_sensor()
+        self.collision_detector = collision_detector
+        if self.collision_detector is not None:
+            self.collision_detector.update_vehicles()
+        else:
+            self.attach_collision_sensor()
 
     def attach_collision_sensor(self):
         bp = self.world.get_blueprint_library().find("sensor.other.collision")
@@ -510,6 +536,13 @@ class EpisodeEvaluator:
         if self.target_ped is None or not self.target_ped.is_alive:
             return
 
+        # Same step count the sensor callback would record for a collision on this tick
+        if self.collision_detector is not None and not self.collision:
+            hit = self.collision_detector.check([self.target_ped.id])
+            if hit[self.target_ped.id] is not None:
+                self.collision = True
+                self.steps_to_collision = self.episode_steps
+
         self.episode_steps += 1
 
         loc = self.target_ped.get_location()
@@ -522,22 +555,22 @@ class EpisodeEvaluator:
         if speed < self.stall_speed_threshold:
             self.stall_steps += 1
 
-        wp = self.world_map.get_waypoint(
-            loc,
-            project_to_road=False,
-            lane_type=carla.LaneType.Any
-        )
-        if wp is not None and wp.lane_type == carla.LaneType.Driving:
-            self.drivable_steps += 1
+        if self.lane_grid is not None:
+            on_driving_lane = self.lane_grid.is_driving(loc)
+        else:
+            wp = self.world_map.get_waypoint(
+                loc,
+                project_to_road=False,
+                lane_type=carla.LaneType.Any
+            )
+            on_driving_lane = wp is not None and wp.lane_type == carla.LaneType.Driving
 
-        vehicles = self.world.get_actors().filter("vehicle.*")
-        alive_vehicles = [veh for veh in vehicles if veh.is_alive]
+        if on_driving_lane:
+            self.drivable_steps += 1
 
-        if len(alive_vehicles) > 0:
-            min_dist = min(
-                veh.get_location().distance(loc)
-                for veh in alive_vehicles
-            )
+        index = ActorSpatialIndex.for_tick(self.world)
+        row, min_dist = index.nearest([loc.x, loc.y, loc.z], actor_type="vehicle")
+        if row is not None:
             self.min_vehicle_distance = min(self.min_vehicle_distance, min_dist)
 
     def get_metrics(self, controller_name: str, seed: int, episode_id: int):
@@ -0,0 +1,206 @@
+'''
+Vectorized 2D geometry kernels shared by data processing and BEV rendering.
+
+Every function takes NumPy arrays and broadcasts over leading dimensions, so one call can
+transform all points of one hero, or all points of K heroes at once:
+
+    points   : (N, 2) with hero_xy (2,) and hero_yaw scalar      -> one hero
+    points   : (K, N, 2) with hero_xy (K, 1, 2), hero_yaw (K, 1)  -> K heroes
+
+Conventions (same as the rest of the repo):
+    - yaw is in radians, CARLA world frame.
+    - local frame vectors are [right, forward].
+    - BEV images put right -> +x (column) and forward -> up (-row).
+
+This module does not import carla so it can be used by worker processes and offline tools.
+'''
+import numpy as np
+
+
+def world_to_local_2d(vectors, yaw):
+    '''
+    Rotate world-frame vectors [..., (x, y)] into the local frame [..., (right, forward)].
+    yaw must broadcast against vectors[..., 0].
+    '''
+    vectors = np.asarray(vectors, dtype=np.float64)
+    cos_yaw = np.cos(yaw)
+    sin_yaw = np.sin(yaw)
+    vx = vectors[..., 0]
+    vy = vectors[..., 1]
+
+    local_forward = vx * cos_yaw + vy * sin_yaw
+    local_right = -vx * sin_yaw + vy * cos_yaw
+    return np.stack([local_right, local_forward], axis=-1)
+
+
+def local_to_world_2d(local_vectors, yaw):
+    '''
+    Rotate local-frame vectors [..., (right, forward)] back to the world frame [..., (x, y)].
+    yaw must broadcast against local_vectors[..., 0].
+    '''
+    local_vectors = np.asarray(local_vectors, dtype=np.float64)
+    cos_yaw = np.cos(yaw)
+    sin_yaw = np.sin(yaw)
+    local_right = local_vectors[..., 0]
+    local_forward = local_vectors[..., 1]
+
+    world_x = -local_right * sin_yaw + local_forward * cos_yaw
+    world_y = local_right * cos_yaw + local_forward * sin_yaw
+    return np.stack([world_x, world_y], axis=-1)
+
+
+def world_to_bev_pixels(points, hero_xy, hero_yaw, width, height, pixel_per_meter):
+    '''
+    Project world points [..., (x, y, ...)] into the orthographic hero-centered BEV used by
+    BEVWrapper. Returns int64 pixel coordinates [..., (px, py)] (not clipped to the image).
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    delta = points[..., :2] - np.asarray(hero_xy, dtype=np.float64)[..., :2]
+    local = world_to_local_2d(delta, hero_yaw)
+
+    # int() truncation toward zero, as in the original scalar implementation
+    px = (width // 2 + local[..., 0] * pixel_per_meter).astype(np.int64)
+    py = (height // 2 - local[..., 1] * pixel_per_meter).astype(np.int64)
+    return np.stack([px, py], axis=-1)
+
+
+def pinhole_half_extent(width, height, camera_height, fov):
+    '''Ground footprint half width / half height (meters) of a top-down pinhole camera.'''
+    half_width_m = camera_height * np.tan(np.radians(fov * 0.5))
+    half_height_m = half_width_m * (float(height) / float(width))
+    return half_width_m, half_height_m
+
+
+def world_to_pinhole_pixels(points, hero_xy, hero_yaw, width, height, camera_height, fov):
+    '''
+    Project world points [..., (x, y, ...)] into the image of a top-down pinhole camera
+    mounted camera_height meters above the hero (SemanticBEVWrapper geometry).
+    Returns int64 pixel coordinates [..., (px, py)] (not clipped to the image).
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    delta = points[..., :2] - np.asarray(hero_xy, dtype=np.float64)[..., :2]
+    local = world_to_local_2d(delta, hero_yaw)
+    half_width_m, half_height_m = pinhole_half_extent(width, height, camera_height, fov)
+
+    # normalize to [-1, 1]
+    u = local[..., 0] / half_width_m
+    v = local[..., 1] / half_height_m
+
+    # np.rint rounds half to even, like Python's round()
+    px = np.rint((u + 1.0) * 0.5 * (width - 1)).astype(np.int64)
+    py = np.rint((1.0 - (v + 1.0) * 0.5) * (height - 1)).astype(np.int64)
+    return np.stack([px, py], axis=-1)
+
+
+def pinhole_pixels_to_local(pixels, width, height, camera_height, fov):
+    '''
+    Inverse of world_to_pinhole_pixels without the hero pose: map pixel coordinates
+    [..., (px, py)] of the top-down pinhole image to local ground offsets [..., (right, forward)].
+    '''
+    pixels = np.asarray(pixels, dtype=np.float64)
+    half_width_m, half_height_m = pinhole_half_extent(width, height, camera_height, fov)
+    u = 2.0 * pixels[..., 0] / (width - 1) - 1.0
+    v = 1.0 - 2.0 * pixels[..., 1] / (height - 1)
+    return np.stack([u * half_width_m, v * half_height_m], axis=-1)
+
+
+def obb_corners(centers, yaws, extents):
+    '''
+    Expand oriented boxes into their 4 world-frame corners.
+
+    Args:
+        centers: (..., 2) box centers.
+        yaws: (...,) box yaw angles in radians.
+        extents: (..., 2) half sizes along the box x (forward) and y axes.
+
+    Returns:
+        (..., 4, 2) corners ordered (-x, -y), (x, -y), (x, y), (-x, y), matching the
+        order used by BEVWrapper.draw_actor_layers.
+    '''
+    centers = np.asarray(centers, dtype=np.float64)
+    extents = np.asarray(extents, dtype=np.float64)
+    yaws = np.asarray(yaws, dtype=np.float64)
+
+    signs = np.array([[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]])
+    local = signs * extents[..., None, :]                                 # (..., 4, 2)
+
+    cos_yaw = np.cos(yaws)[..., None]
+    sin_yaw = np.sin(yaws)[..., None]
+    world_x = local[..., 0] * cos_yaw - local[..., 1] * sin_yaw
+    world_y = local[..., 0] * sin_yaw + local[..., 1] * cos_yaw
+    return np.stack([world_x, world_y], axis=-1) + centers[..., None, :]
+
+
+# ----- reference scalar implementations and equivalence checks -----
+def _reference_world_to_local(vector_xy, yaw_rad):
+    vx, vy = float(vector_xy[0]), float(vector_xy[1])
+    forward_x, forward_y = np.cos(yaw_rad), np.sin(yaw_rad)
+    right_x, right_y = -np.sin(yaw_rad), np.cos(yaw_rad)
+    return np.array([vx * right_x + vy * right_y, vx * forward_x + vy * forward_y])
+
+
+def _reference_bev_pixel(target_xy, hero_xy, yaw, width, height, pixel_per_meter):
+    local_right, local_forward = _reference_world_to_local(
+        (target_xy[0] - hero_xy[0], target_xy[1] - hero_xy[1]), yaw
+    )
+    return (
+        int(width // 2 + local_right * pixel_per_meter),
+        int(height // 2 - local_forward * pixel_per_meter),
+    )
+
+
+def _reference_pinhole_pixel(target_xy, hero_xy, yaw, width, height, camera_height, fov):
+    local_right, local_forward = _reference_world_to_local(
+        (target_xy[0] - hero_xy[0], target_xy[1] - hero_xy[1]), yaw
+    )
+    half_width_m = camera_height * np.tan(np.radians(fov * 0.5))
+    half_height_m = half_width_m * (float(height) / float(width))
+    u = local_right / half_width_m
+    v = local_forward / half_height_m
+    return (
+        int(round((u + 1.0) * 0.5 * (width - 1))),
+        int(round((1.0 - (v + 1.0) * 0.5) * (height - 1))),
+    )
+
+
+def geometry_equivalence_test(num_heroes=8, num_points=500, seed=0):
+    '''Check batched kernels against the original one-point-at-a-time implementations.'''
+    rng = np.random.default_rng(seed)
+    hero_xy = rng.uniform(-100.0, 100.0, size=(num_heroes, 2))
+    hero_yaw = rng.uniform(-np.pi, np.pi, size=num_heroes)
+    points = hero_xy[:, None, :] + rng.uniform(-15.0, 15.0, size=(num_heroes, num_points, 2))
+
+    local = world_to_local_2d(points - hero_xy[:, None, :], hero_yaw[:, None])
+    back = local_to_world_2d(local, hero_yaw[:, None]) + hero_xy[:, None, :]
+    assert np.allclose(back, points, atol=1e-9), "local_to_world_2d is not the inverse of world_to_local_2d"
+
+    bev = world_to_bev_pixels(points, hero_xy[:, None, :], hero_yaw[:, None], 160, 160, 8)
+    pinhole = world_to_pinhole_pixels(points, hero_xy[:, None, :], hero_yaw[:, None], 160, 160, 50.0, 20.0)
+
+    for k in range(num_heroes):
+        for n in range(num_points):
+            ref_local = _reference_world_to_local(points[k, n] - hero_xy[k], hero_yaw[k])
+            assert np.allclose(local[k, n], ref_local, atol=1e-9)
+            assert tuple(bev[k, n]) == _reference_bev_pixel(points[k, n], hero_xy[k], hero_yaw[k], 160, 160, 8)
+            assert tuple(pinhole[k, n]) == _reference_pinhole_pixel(
+                points[k, n], hero_xy[k], hero_yaw[k], 160, 160, 50.0, 20.0
+            )
+
+    # Pinhole pixel -> local -> pixel round trip
+    grid = np.stack(np.meshgrid(np.arange(160), np.arange(160)), axis=-1).reshape(-1, 2)
+    local_grid = pinhole_pixels_to_local(grid, 160, 160, 50.0, 20.0)
+    round_trip = world_to_pinhole_pixels(
+        local_to_world_2d(local_grid, hero_yaw[0]) + hero_xy[0], hero_xy[0], hero_yaw[0], 160, 160, 50.0, 20.0
+    )
+    assert np.array_equal(round_trip, grid), "pinhole_pixels_to_local is not the inverse projection"
+
+    # Box corners: a yaw of 90 deg maps the box x axis onto world +y
+    corners = obb_corners(np.array([[1.0, 2.0]]), np.array([np.pi / 2]), np.array([[2.0, 1.0]]))
+    expected = np.array([[[2.0, 0.0], [2.0, 4.0], [0.0, 4.0], [0.0, 0.0]]])
+    assert np.allclose(corners, expected, atol=1e-9), corners
+
+    print(f"[geometry] equivalence checks passed for {num_heroes} heroes x {num_points} points")
+
+
+if __name__ == "__main__":
+    geometry_equivalence_test()
@@ -0,0 +1,246 @@
+import os
+import time
+
+import carla
+import numpy as np
+
+from .config_loader import load_config
+
+
+class LaneTypeGrid:
+    '''
+    Precomputed raster of CARLA lane types over the scenario region.
+
+    Map.get_waypoint(..., project_to_road=False, lane_type=Any) is called every step for
+    every tracked pedestrian by the RL reward and the episode evaluator. This class samples
+    it once on a regular grid around the intersection, stores the integer lane type of
+    every cell (0 = no lane), persists the raster per town, and answers point and batched
+    point queries with NumPy indexing. Points outside the raster fall back to get_waypoint
+    when a map is available.
+
+    Attributes:
+        world_map: CARLA map object used to build the raster and for fallback queries.
+        town: Town name used in the cache file name.
+        x_min, y_min: World coordinates of the raster origin (lower corner).
+        resolution: Cell size in meters.
+        grid: (rows, cols) int32 raster of lane types, rows along y and columns along x.
+        cache_path: Path of the persisted .npz raster.
+
+    Methods:
+        for_town(world_map, margin=10.0, ...):
+            Raster covering the whole town (bounds of its waypoints), built once per town.
+
+        build():
+            Fill the raster by querying get_waypoint at every cell center.
+
+        query(x, y):
+            Return the lane type code at one world point.
+
+        query_batch(points):
+            Return lane type codes for an (N, 2+) array of world points.
+
+        query_raster(points):
+            Like query_batch but without the get_waypoint fallback; also returns the inside mask.
+
+        is_driving(location):
+            Return whether one carla.Location lies on a driving lane.
+
+        is_driving_batch(points):
+            Return a boolean array telling which points lie on driving lanes.
+
+        accuracy_report(num_samples=2000, seed=0):
+            Compare raster answers against get_waypoint on random points in the region.
+    '''
+    config = load_config("sim_config.json")["simulation"].get("lane_grid", {})
+    NO_LANE = 0
+    DRIVING = int(carla.LaneType.Driving)
+
+    def __init__(
+            self,
+            world_map: carla.Map,
+            location: carla.Location,
+            half_size: float = config.get("half_size", 60.0),
+            resolution: float = config.get("resolution", 0.25),
+            cache_dir: str = config.get("cache_dir", "datasets/cache/lane_grid"),
+        ):
+        self.world_map = world_map
+        self.town = os.path.basename(world_map.name)
+        self.resolution = float(resolution)
+        self.half_size = float(half_size)
+        self.z = float(location.z)
+        self.x_min = float(location.x) - self.half_size
+        self.y_min = float(location.y) - self.half_size
+        self.num_cells = int(np.ceil(2.0 * self.half_size / self.resolution))
+        self.cache_path = os.path.join(
+            cache_dir,
+            f"{self.town}_x{location.x:.1f}_y{location.y:.1f}_h{self.half_size:.1f}_r{self.resolution:.2f}.npz",
+        )
+
+        self.grid = None
+        self.load_or_build()
+
+    @classmethod
+    def for_town(
+            cls,
+            world_map: carla.Map,
+            margin: float = 10.0,
+            resolution: float = config.get("resolution", 0.25),
+            cache_dir: str = config.get("cache_dir", "datasets/cache/lane_grid"),
+        ):
+        '''
+        Square raster over the waypoint bounds of the whole town plus margin. The bounds are
+        rounded to whole meters so every run on the same town reuses one cache file.
+        '''
+        waypoints = world_map.generate_waypoints(2.0)
+        points = np.array([
+            [wp.transform.location.x, wp.transform.location.y, wp.transform.location.z] for wp in waypoints
+        ], dtype=np.float64)
+        lower = np.floor(points[:, :2].min(axis=0) - margin)
+        upper = np.ceil(points[:, :2].max(axis=0) + margin)
+        center = (lower + upper) / 2.0
+        half_size = float(np.ceil((upper - lower).max() / 2.0))
+        return cls(
+            world_map,
+            carla.Location(x=float(center[0]), y=float(center[1]), z=float(np.round(np.median(points[:, 2])))),
+            half_size=half_size,
+            resolution=resolution,
+            cache_dir=cache_dir,
+        )
+
+    def load_or_build(self):
+        if os.path.exists(self.cache_path):
+            with np.load(self.cache_path) as data:
+                self.grid = data["grid"].astype(np.int32)
+            print(f"[LaneTypeGrid] Loaded {self.grid.shape} raster from {self.cache_path}")
+            return
+
+        self.build()
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.savez_compressed(
+            self.cache_path,
+            grid=self.grid,
+            origin=np.array([self.x_min, self.y_min], dtype=np.float64),
+            resolution=np.float64(self.resolution),
+        )
+        print(f"[LaneTypeGrid] Saved raster to {self.cache_path}")
+
+    def _waypoint_lane_type(self, x, y):
+        wp = self.world_map.get_waypoint(
+            carla.Location(x=float(x), y=float(y), z=self.z),
+            project_to_road=False,
+            lane_type=carla.LaneType.Any,
+        )
+        return self.NO_LANE if wp is None else int(wp.lane_type)
+
+    def build(self):
+        start_time = time.time()
+        centers = self.x_min + (np.arange(self.num_cells) + 0.5) * self.resolution
+        rows = self.y_min + (np.arange(self.num_cells) + 0.5) * self.resolution
+
+        grid = np.zeros((self.num_cells, self.num_cells), dtype=np.int32)
+        for i, y in enumerate(rows):
+            for j, x in enumerate(centers):
+                grid[i, j] = self._waypoint_lane_type(x, y)
+
+        self.grid = grid
+        print(
+            f"[LaneTypeGrid] Built {grid.shape} raster at {self.resolution} m "
+            f"in {time.time() - start_time:.1f}s"
+        )
+
+    def _cell_index(self, points: np.ndarray):
+        cols = np.floor((points[:, 0] - self.x_min) / self.resolution).astype(np.int64)
+        rows = np.floor((points[:, 1] - self.y_min) / self.resolution).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.num_cells) & (cols >= 0) & (cols < self.num_cells)
+        return rows, cols, inside
+
+    def query_raster(self, points):
+        '''
+        Raster-only lookup without the get_waypoint fallback.
+        Returns (lane_types, inside); points outside the raster get NO_LANE.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, np.shape(points)[-1])
+        rows, cols, inside = self._cell_index(points)
+
+        lane_types = np.full(len(points), self.NO_LANE, dtype=np.int32)
+        lane_types[inside] = self.grid[rows[inside], cols[inside]]
+        return lane_types, inside
+
+    def query_batch(self, points) -> np.ndarray:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, np.shape(points)[-1])
+        lane_types, inside = self.query_raster(points)
+
+        # Outside the raster: fall back to the exact waypoint query
+        if self.world_map is not None and not inside.all():
+            for idx in np.flatnonzero(~inside):
+                lane_types[idx] = self._waypoint_lane_type(points[idx, 0], points[idx, 1])
+
+        return lane_types
+
+    def query(self, x, y) -> int:
+        return int(self.query_batch(np.array([[x, y]], dtype=np.float64))[0])
+
+    def is_driving_batch(self, points) -> np.ndarray:
+        return self.query_batch(points) == self.DRIVING
+
+    def is_driving(self, location: carla.Location) -> bool:
+        return self.query(location.x, location.y) == self.DRIVING
+
+    def accuracy_report(self, num_samples=2000, seed=0):
+        '''
+        Compare raster lookups with get_waypoint on uniformly random points inside the region.
+        Disagreements are expected only near lane borders (within about one cell).
+        '''
+        rng = np.random.default_rng(seed)
+        points = np.stack([
+            rng.uniform(self.x_min, self.x_min + self.num_cells * self.resolution, num_samples),
+            rng.uniform(self.y_min, self.y_min + self.num_cells * self.resolution, num_samples),
+        ], axis=-1)
+
+        start_time = time.perf_counter()
+        exact = np.asarray([self._waypoint_lane_type(x, y) for x, y in points], dtype=np.int32)
+        exact_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        approx = self.query_batch(points)
+        grid_time = time.perf_counter() - start_time
+
+        exact_driving = exact == self.DRIVING
+        approx_driving = approx == self.DRIVING
+        true_positive = int(np.sum(exact_driving & approx_driving))
+
+        report = {
+            "num_samples": int(num_samples),
+            "resolution": self.resolution,
+            "lane_type_agreement": float(np.mean(exact == approx)),
+            "driving_agreement": float(np.mean(exact_driving == approx_driving)),
+            "driving_precision": true_positive / max(int(approx_driving.sum()), 1),
+            "driving_recall": true_positive / max(int(exact_driving.sum()), 1),
+            "get_waypoint_us_per_point": exact_time / num_samples * 1e6,
+            "grid_us_per_point": grid_time / num_samples * 1e6,
+        }
+
+        print(
+            f"[LaneTypeGrid] accuracy over {num_samples} points: "
+            f"lane_type={report['lane_type_agreement']:.4f}, "
+            f"driving={report['driving_agreement']:.4f} "
+            f"(precision={report['driving_precision']:.4f}, recall={report['driving_recall']:.4f}) | "
+            f"get_waypoint={report['get_waypoint_us_per_point']:.2f} us/pt, "
+            f"grid={report['grid_us_per_point']:.3f} us/pt"
+        )
+        return report
+
+
+if __name__ == "__main__":
+    sim_config = load_config("sim_config.json")["simulation"]
+    client = carla.Client("localhost", 2000)
+    client.set_timeout(20.0)
+    world_map = client.get_world().get_map()
+
+    intersection_position = carla.Location(
+        x=sim_config["intersection"]["x"],
+        y=sim_config["intersection"]["y"],
+        z=sim_config["intersection"]["z"],
+    )
+    lane_grid = LaneTypeGrid(world_map, intersection_position)
+    lane_grid.accuracy_report()
@@ -0,0 +1,344 @@
+'''
+Single-writer / multi-reader (SWMR) live dataset.
+
+HDF5 SWMR readers see rows appended to existing datasets while the writer keeps the file
+open, but the writer may not create groups or datasets once SWMR mode is on. The live
+layout therefore keeps each column of all pedestrian tracks in one extendable dataset,
+and appends to the track table last, so a reader never sees a track whose rows are not
+flushed yet.
+
+    /live/
+        tracks              (M, 4)  int64 rows: episode id, ped id, first row, num steps
+        frame_id            (N,)
+        timestamp           (N,)
+        bev_packed          (N, C + 1, H, ceil(W / 8)), attrs bev_shape = (H, W, C)
+          or bev_data       (N, H, W, C)
+                            (both carry attrs hero_channel / hero_value)
+        current_location    (N, 3)
+        velocity            (N, 3)
+        speed               (N,)
+        yaw_heading         (N,)
+        goal_location       (N, 3)
+        target_speed        (N,)
+        target_direction    (N, 3)
+
+The collector writes it with LiveDatasetWriter (dataset.live.enabled in sim_config.json),
+and PedestrianStepDataset(live=True) reads it in SWMR mode, picking up newly completed
+episodes with refresh(). export_live_dataset rewrites a finished live file in the
+convert_to_dataset episode layout for the other dataset tools.
+'''
+import argparse
+import os
+import time
+
+import h5py
+import numpy as np
+
+from ..data_collection.bev.bev_seg_sample import SemanticBEVSample
+from .bev_packing import HERO_CHANNEL, HERO_VALUE, pack_bev, packed_bev_shape, stored_hero_channel
+from .config_loader import load_config
+from .dataset_codecs import bev_dataset_kwargs
+
+
+LIVE_GROUP = "live"
+TRACK_COLUMNS = 4
+STATE_COLUMNS = ("current_location", "velocity", "speed", "yaw_heading", "goal_location")
+ACTION_COLUMNS = ("target_speed", "target_direction")
+COLUMN_DTYPES = {
+    "frame_id": np.int32,
+    "timestamp": np.float64,
+    **{name: np.float32 for name in STATE_COLUMNS + ACTION_COLUMNS},
+}
+COLUMN_CHUNK_ROWS = 1024
+
+
+def open_live_file(path, **file_kwargs):
+    '''Open a live dataset for SWMR reading (works while a LiveDatasetWriter has it open).'''
+    return h5py.File(path, "r", libver="latest", swmr=True, **file_kwargs)
+
+
+def is_live_file(file):
+    return LIVE_GROUP in file
+
+
+def live_episode_names(file):
+    '''Episode group names of the committed tracks of an open live dataset.'''
+    from .data_utils import episode_group_name
+
+    tracks = file[LIVE_GROUP]["tracks"][()]
+    return sorted({episode_group_name(episode_id) for episode_id in np.unique(tracks[:, 0])})
+
+
+def wait_for_live_dataset(path, min_samples=1, poll_seconds=10.0, timeout_seconds=None):
+    '''
+    Block until the live dataset at path holds at least min_samples committed samples
+    (the writer creates the file with its first episode). Returns the number of samples.
+    '''
+    start_time = time.time()
+    while True:
+        num_samples = 0
+        if os.path.exists(path):
+            try:
+                with open_live_file(path) as file:
+                    if is_live_file(file):
+                        num_samples = int(np.sum(file[LIVE_GROUP]["tracks"][:, 3]))
+            except OSError:
+                # The writer has created the file but not switched SWMR mode on yet
+                pass
+        if num_samples >= min_samples:
+            return num_samples
+        if timeout_seconds is not None and time.time() - start_time > timeout_seconds:
+            raise TimeoutError(f"{path} holds {num_samples} samples after {timeout_seconds}s, waiting for {min_samples}")
+        print(f"[wait_for_live_dataset] {path}: {num_samples}/{min_samples} samples committed, waiting {poll_seconds}s")
+        time.sleep(poll_seconds)
+
+
+class LiveColumn:
+    '''
+    Rows of one track in a live column dataset, indexed like the per-pedestrian h5py
+    dataset of the episode layout (int, slice or () for all rows).
+    '''
+    __slots__ = ("dset", "start", "shape")
+
+    def __init__(self, dset, start, num_steps):
+        self.dset = dset
+        self.start = int(start)
+        self.shape = (int(num_steps),) + tuple(dset.shape[1:])
+
+    @property
+    def attrs(self):
+        return self.dset.attrs
+
+    def __getitem__(self, rows):
+        num_steps = self.shape[0]
+        if rows == () or rows is Ellipsis:
+            return self.dset[self.start:self.start + num_steps]
+        if isinstance(rows, slice):
+            first, last, step = rows.indices(num_steps)
+            return self.dset[self.start + first:self.start + last:step]
+        rows = int(rows)
+        if rows < 0:
+            rows += num_steps
+        if not 0 <= rows < num_steps:
+            raise IndexError(f"Row {rows} out of range for a track of {num_steps} steps")
+        return self.dset[self.start + rows]
+
+
+class LivePedGroup:
+    '''
+    Read-only view of one track with the ped_<id> group interface PedestrianStepDataset
+    reads. columns maps live column names to their datasets (the /live group, or dataset
+    handles a reader keeps open and refreshes).
+    '''
+    __slots__ = ("members",)
+
+    def __init__(self, columns, start, num_steps):
+        bev_key = "bev_packed" if "bev_packed" in columns else "bev_data"
+        self.members = {
+            "frame_id": LiveColumn(columns["frame_id"], start, num_steps),
+            "timestamp": LiveColumn(columns["timestamp"], start, num_steps),
+            "state": {key: LiveColumn(columns[key], start, num_steps) for key in STATE_COLUMNS + (bev_key,)},
+            "action": {key: LiveColumn(columns[key], start, num_steps) for key in ACTION_COLUMNS},
+        }
+
+    def __getitem__(self, name):
+        return self.members[name]
+
+
+class LiveDatasetWriter:
+    '''
+    SWMR writer of a live dataset (module docstring layout).
+
+    The file and its datasets are created with the first episode (the BEV shape is known
+    then) and SWMR mode is switched on; an existing live file is reopened and appended to.
+    After each episode the column rows are flushed before the track rows, which commit
+    the episode for readers. Rows past the last committed track (an episode interrupted
+    between its column appends) are truncated on reopen, and new rows start at the end
+    of the committed tracks.
+
+    Attributes:
+        path: Path of the live HDF5 file.
+        pack_bev_data: Store BEVs as bitplanes (bev_packed) instead of dense uint8.
+        hero_channel: HERO_CHANNEL of the BEV class that renders the samples (taken from
+            the BEV attrs when an existing live file is reopened).
+        file: Open h5py.File in SWMR write mode, or None before the first episode.
+        num_rows: Column rows covered by the committed tracks.
+        episode_ids: Episode id -> committed samples.
+
+    Methods:
+        write_episode(episode_idx, episode_data):
+            Append one episode (EpisodeBuffer or list of PedestrianStateAction) and commit it.
+
+        close():
+            Close the file.
+    '''
+
+    def __init__(self, path, pack_bev_data=None, codec=None, chunk_samples=None, hero_channel=HERO_CHANNEL):
+        self.path = path
+        if pack_bev_data is None:
+            pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
+        self.pack_bev_data = bool(pack_bev_data)
+        self.codec = codec
+        self.chunk_samples = chunk_samples
+        self.hero_channel = int(hero_channel)
+        self.file = None
+        self.episode_ids = {}
+        self.num_rows = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        if os.path.exists(path):
+            # SWMR readers that stay open (a running trainer) would otherwise lock a restarted writer out
+            self.file = h5py.File(path, "r+", libver="latest", locking=False)
+            if not is_live_file(self.file):
+                self.file.close()
+                raise ValueError(f"{path} exists and is not a live dataset")
+            live_grp = self.file[LIVE_GROUP]
+            self.pack_bev_data = "bev_packed" in live_grp
+            bev_dset = live_grp["bev_packed"] if self.pack_bev_data else live_grp["bev_data"]
+            self.hero_channel = stored_hero_channel(bev_dset.attrs, default=self.hero_channel)
+            tracks = live_grp["tracks"][()]
+            for episode_id, _, _, num_steps in tracks:
+                self.episode_ids[int(episode_id)] = self.episode_ids.get(int(episode_id), 0) + int(num_steps)
+
+            # Drop the rows of an episode interrupted before its tracks were committed
+            self.num_rows = int(np.max(tracks[:, 2] + tracks[:, 3])) if len(tracks) else 0
+            for name in tuple(COLUMN_DTYPES) + (bev_dset.name.rsplit("/", 1)[-1],):
+                if live_grp[name].shape[0] != self.num_rows:
+                    print(
+                        f"[LiveDatasetWriter] Truncating {name} from {live_grp[name].shape[0]} to "
+                        f"{self.num_rows} committed rows"
+                    )
+                    live_grp[name].resize(self.num_rows, axis=0)
+            self.file.swmr_mode = True
+
+    def _create(self, columns):
+        file = h5py.File(self.path, "w", libver="latest")
+        live_grp = file.create_group(LIVE_GROUP)
+        live_grp.create_dataset(
+            "tracks", shape=(0, TRACK_COLUMNS), maxshape=(None, TRACK_COLUMNS), dtype=np.int64, chunks=(256, TRACK_COLUMNS),
+        )
+        for name, dtype in COLUMN_DTYPES.items():
+            sample_shape = np.shape(columns[name])[1:]
+            live_grp.create_dataset(
+                name, shape=(0,) + sample_shape, maxshape=(None,) + sample_shape, dtype=dtype,
+                chunks=(COLUMN_CHUNK_ROWS,) + sample_shape,
+            )
+
+        dense_shape = tuple(np.shape(columns["bev_data"])[1:])
+        if self.pack_bev_data:
+            sample_shape = packed_bev_shape(*dense_shape)
+            bev_key = "bev_packed"
+        else:
+            sample_shape = dense_shape
+            bev_key = "bev_data"
+        # An extendable dataset needs chunks; auto-chunking (chunk_samples 0) is fine here
+        kwargs = bev_dataset_kwargs(sample_shape, 1 << 30, codec=self.codec, chunk_samples=self.chunk_samples)
+        bev_dset = live_grp.create_dataset(
+            bev_key, shape=(0,) + sample_shape, maxshape=(None,) + sample_shape, dtype=np.uint8, **kwargs,
+        )
+        if self.pack_bev_data:
+            bev_dset.attrs["bev_shape"] = np.asarray(dense_shape, dtype=np.int32)
+        bev_dset.attrs["hero_channel"] = self.hero_channel
+        bev_dset.attrs["hero_value"] = HERO_VALUE
+
+        # No new objects can be created from here on
+        file.swmr_mode = True
+        self.file = file
+
+    @staticmethod
+    def _write_rows(dset, start, values):
+        dset.resize(start + len(values), axis=0)
+        dset[start:] = values
+
+    def write_episode(self, episode_idx, episode_data):
+        # Imported here: data_utils imports this module for the reader side
+        from .data_utils import episode_group_name, episode_ped_columns
+
+        episode_idx = int(episode_idx)
+        if episode_idx in self.episode_ids:
+            raise ValueError(f"{episode_group_name(episode_idx)} is already in {self.path}; live datasets are append-only")
+        ped_columns = episode_ped_columns(episode_data)
+        if len(ped_columns) == 0:
+            print("[LiveDatasetWriter] No data to save.")
+            return None
+        if any("bev_data" not in columns for columns in ped_columns.values()):
+            raise ValueError("Live datasets store BEV samples; use the trajectory log for trajectory-only recording")
+        if self.file is None:
+            self._create(next(iter(ped_columns.values())))
+
+        live_grp = self.file[LIVE_GROUP]
+        # Rows are placed after the committed tracks, not after the longest column
+        first_row = self.num_rows
+        tracks = []
+        for ped_id, columns in ped_columns.items():
+            for name, dtype in COLUMN_DTYPES.items():
+                self._write_rows(live_grp[name], first_row, np.asarray(columns[name], dtype=dtype))
+            bev_data = np.asarray(columns["bev_data"], dtype=np.uint8)
+            if self.pack_bev_data:
+                self._write_rows(live_grp["bev_packed"], first_row, pack_bev(bev_data, hero_channel=self.hero_channel))
+            else:
+                self._write_rows(live_grp["bev_data"], first_row, bev_data)
+            tracks.append([episode_idx, int(ped_id), first_row, len(bev_data)])
+            first_row += len(bev_data)
+
+        # Rows first, then the track table that makes them visible to readers
+        self.file.flush()
+        self._write_rows(live_grp["tracks"], live_grp["tracks"].shape[0], np.asarray(tracks, dtype=np.int64))
+        self.file.flush()
+        self.num_rows = first_row
+
+        num_samples = sum(track[3] for track in tracks)
+        self.episode_ids[episode_idx] = num_samples
+        print(f"[LiveDatasetWriter] Committed {num_samples} samples to {self.path}::{episode_group_name(episode_idx)}")
+        return episode_group_name(episode_idx)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def export_live_dataset(live_path, output_path, pack_bev_data=None, codec=None, chunk_samples=None):
+    '''Rewrite the committed tracks of a live dataset in the convert_to_dataset episode layout.'''
+    from .data_utils import episode_group_name, read_dense_bev, write_dataset_index, write_ped_arrays
+
+    if pack_bev_data is None:
+        pack_bev_data = load_config("sim_config.json")["dataset"].get("pack_bev", False)
+
+    num_samples = 0
+    with open_live_file(live_path) as src, h5py.File(output_path, "w") as dst:
+        live_grp = src[LIVE_GROUP]
+        tracks = live_grp["tracks"][()]
+        if "bev_packed" in live_grp:
+            hero_channel = stored_hero_channel(live_grp["bev_packed"].attrs)
+        else:
+            # Dense live files without the attr come from the default SemanticBEVSample collector
+            hero_channel = stored_hero_channel(live_grp["bev_data"].attrs, default=SemanticBEVSample.HERO_CHANNEL)
+        for episode_id, ped_id, start, num_steps in tracks:
+            ped_grp = LivePedGroup(live_grp, start, num_steps)
+            columns = {name: ped_grp[name][()] for name in ("frame_id", "timestamp")}
+            columns.update({name: ped_grp["state"][name][()] for name in STATE_COLUMNS})
+            columns.update({name: ped_grp["action"][name][()] for name in ACTION_COLUMNS})
+            columns["bev_data"] = read_dense_bev(ped_grp["state"], slice(None))
+            episode_grp = dst.require_group(episode_group_name(episode_id))
+            write_ped_arrays(
+                episode_grp, int(ped_id), columns, pack_bev_data=bool(pack_bev_data), codec=codec, chunk_samples=chunk_samples,
+                hero_channel=hero_channel,
+            )
+            num_samples += int(num_steps)
+        write_dataset_index(dst)
+    print(f"[export_live_dataset] {len(tracks)} tracks / {num_samples} samples: {live_path} -> {output_path}")
+    return num_samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a live (SWMR) dataset to the episode layout.")
+    parser.add_argument("input", help="Live dataset written with dataset.live.enabled.")
+    parser.add_argument("output", help="Output dataset (.h5).")
+    parser.add_argument("--codec", default=None, help="BEV codec (default: dataset.compression).")
+    parser.add_argument("--chunk-samples", type=int, default=None)
+    parser.add_argument("--pack", dest="pack_bev", action="store_true", default=None)
+    parser.add_argument("--no-pack", dest="pack_bev", action="store_false")
+    args = parser.parse_args()
+
+    export_live_dataset(args.input, args.output, pack_bev_data=args.pack_bev, codec=args.codec, chunk_samples=args.chunk_samples)
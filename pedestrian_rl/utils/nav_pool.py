@@ -0,0 +1,162 @@
+import os
+import time
+
+import carla
+import numpy as np
+
+from .config_loader import load_config
+
+
+class NavPointPool:
+    '''
+    Pool of navigation-mesh points sampled once per town and intersection.
+
+    Every call to world.get_random_location_from_navigation() is an RPC, and rejection
+    sampling points inside a small intersection box wastes most of them. This class
+    samples the navmesh once, keeps every point (whole-map region) and the subset inside
+    the intersection box (intersection region), and persists both to an .npz file.
+    Spawn points and destinations are then drawn locally, so the episode reset path makes
+    no navigation RPCs. They are drawn from the global np.random state (seeded by
+    dataset.seed and saved / restored by CollectionCheckpoint), unless nav_pool.seed
+    gives the pool its own generator, which the checkpoint does not restore.
+
+    Attributes:
+        world: CARLA world object.
+        town: Town name used in the cache file name.
+        x, y: Center of the intersection region.
+        dist: Half side length of the intersection box.
+        num_points: Number of whole-map navmesh points kept in the pool.
+        min_region_points: Minimum number of points required inside the intersection box.
+        max_attempts: Upper bound on navigation RPCs used while building the pool.
+        cache_path: Path of the persisted .npz pool.
+        points: (N, 3) float32 array of navmesh locations.
+        region_index: Dictionary mapping region name to an index array into points.
+        rng: np.random (global state), or a numpy Generator when seed is given.
+
+    Methods:
+        load_or_build():
+            Load the pool from disk if it matches this intersection, otherwise build and save it.
+
+        build():
+            Sample navmesh points through RPC calls and index them by region.
+
+        sample_locations(num, region="intersection"):
+            Draw num points from the given region as an (num, 3) array.
+
+        sample_spawn_points(num, region="intersection"):
+            Draw num spawn transforms (z lifted by 1 m) from the given region.
+
+        sample_destination(region="map"):
+            Draw one destination carla.Location from the given region.
+    '''
+    config = load_config("sim_config.json")["simulation"]["pedestrian"].get("nav_pool", {})
+
+    def __init__(
+            self,
+            world: carla.World,
+            location: carla.Location,
+            dist: float,
+            num_points: int = config.get("num_points", 5000),
+            min_region_points: int = config.get("min_region_points", 500),
+            max_attempts: int = config.get("max_attempts", 200000),
+            cache_dir: str = config.get("cache_dir", "datasets/cache/nav_pool"),
+            seed=config.get("seed", None),
+        ):
+        self.world = world
+        self.town = os.path.basename(world.get_map().name)
+        self.x, self.y = float(location.x), float(location.y)
+        self.dist = float(dist)
+        self.num_points = int(num_points)
+        self.min_region_points = int(min_region_points)
+        self.max_attempts = int(max_attempts)
+        self.cache_path = os.path.join(
+            cache_dir,
+            f"{self.town}_x{self.x:.1f}_y{self.y:.1f}_d{self.dist:.1f}.npz",
+        )
+
+        self.points = np.zeros((0, 3), dtype=np.float32)
+        self.region_index = {}
+        self.rng = np.random if seed is None else np.random.default_rng(seed)
+
+        self.load_or_build()
+
+    def _in_region(self, points: np.ndarray) -> np.ndarray:
+        return (
+            (np.abs(points[:, 0] - self.x) <= self.dist)
+            & (np.abs(points[:, 1] - self.y) <= self.dist)
+        )
+
+    def _build_region_index(self):
+        self.region_index = {
+            "map": np.arange(len(self.points), dtype=np.int64),
+            "intersection": np.flatnonzero(self._in_region(self.points)).astype(np.int64),
+        }
+
+    def load_or_build(self):
+        if os.path.exists(self.cache_path):
+            with np.load(self.cache_path) as data:
+                self.points = data["points"].astype(np.float32)
+            self._build_region_index()
+            if len(self.region_index["intersection"]) > 0:
+                print(
+                    f"[NavPointPool] Loaded {len(self.points)} points "
+                    f"({len(self.region_index['intersection'])} in intersection) from {self.cache_path}"
+                )
+                return
+
+        self.build()
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        np.savez(self.cache_path, points=self.points)
+        print(f"[NavPointPool] Saved pool to {self.cache_path}")
+
+    def build(self):
+        start_time = time.time()
+        map_points = []
+        region_points = []
+        attempts = 0
+
+        while attempts < self.max_attempts and (
+            len(map_points) < self.num_points or len(region_points) < self.min_region_points
+        ):
+            attempts += 1
+            loc = self.world.get_random_location_from_navigation()
+            if loc is None:
+                continue
+
+            point = (loc.x, loc.y, loc.z)
+            if abs(loc.x - self.x) <= self.dist and abs(loc.y - self.y) <= self.dist:
+                region_points.append(point)
+            elif len(map_points) < self.num_points:
+                map_points.append(point)
+
+        self.points = np.asarray(map_points + region_points, dtype=np.float32).reshape(-1, 3)
+        self._build_region_index()
+
+        if len(self.region_index["intersection"]) == 0:
+            raise RuntimeError(
+                f"[NavPointPool] No navigation points found within {self.dist} m of "
+                f"({self.x}, {self.y}) after {attempts} attempts."
+            )
+
+        print(
+            f"[NavPointPool] Built {len(self.points)} points "
+            f"({len(self.region_index['intersection'])} in intersection) "
+            f"with {attempts} RPCs in {time.time() - start_time:.1f}s"
+        )
+
+    def sample_locations(self, num: int, region: str = "intersection") -> np.ndarray:
+        indices = self.region_index[region]
+        replace = num > len(indices)
+        chosen = self.rng.choice(indices, size=num, replace=replace)
+        return self.points[chosen]
+
+    def sample_spawn_points(self, num: int, region: str = "intersection") -> list:
+        spawn_points = []
+        for x, y, z in self.sample_locations(num, region):
+            location = carla.Location(x=float(x), y=float(y), z=float(z) + 1.0)
+            spawn_points.append(carla.Transform(location, carla.Rotation()))
+        return spawn_points
+
+    def sample_destination(self, region: str = "map") -> carla.Location:
+        x, y, z = self.sample_locations(1, region)[0]
+        return carla.Location(x=float(x), y=float(y), z=float(z))
@@ -0,0 +1,222 @@
+import json
+import os
+
+import numpy as np
+
+from .config_loader import load_config
+from .dataset_shards import write_json_atomic
+
+
+class SampleFilter:
+    '''
+    Collection-time thinning of near-duplicate pedestrian samples.
+
+    With sample_every_n_steps = 0 a standing or slow pedestrian produces long runs of almost
+    identical BEVs and zero-motion targets, most of which PedestrianStepDataset masks out
+    (direction_valid) anyway. Each new sample of a pedestrian is compared with the last kept
+    sample of the same pedestrian:
+        - vehicle priority: samples with a vehicle within vehicle_priority_radius of the hero
+          are always kept (0 disables),
+        - stationary (speed and target speed below stationary_speed): only every
+          keep_every_k_stationary-th sample is kept, unless the BEV changed,
+        - moving: dropped only when both the BEV (fraction of changed pixels <=
+          bev_diff_threshold) and the state (displacement, target speed, target direction)
+          barely changed (bev_diff_threshold < 0 disables).
+    Decisions use the dense BEV (only the state without one, e.g. trajectory-only recording),
+    the stored samples are unchanged. Statistics are kept per episode and only added to the
+    totals for episodes that are written (commit_episode).
+
+    Attributes:
+        stationary_speed: Speed (m/s) below which a pedestrian counts as stationary.
+        keep_every_k_stationary: Keep one of every k consecutive stationary samples.
+        bev_diff_threshold: Max fraction of changed BEV pixels of a duplicate.
+        min_displacement: Min displacement (m) since the last kept sample that counts as a change.
+        min_speed_change: Min target speed change (m/s) that counts as a change.
+        min_direction_change: Min target direction change (rad) that counts as a change.
+        vehicle_priority_radius: Vehicle distance (m) below which samples are always kept.
+        stats: Totals over committed episodes.
+
+    Methods:
+        keep(ped_info, vehicle_distance=inf):
+            Decide whether a PedestrianStateAction sample is stored.
+
+        commit_episode():
+            Add the statistics of the current episode to the totals and start a new episode.
+
+        reset_episode():
+            Discard the current episode's tracking and statistics (episode resampled).
+
+        merge_stats(other):
+            Add the totals of another SampleFilter (one filter per intersection region).
+
+        summary():
+            Totals with kept fraction and saved BEV megabytes / training samples.
+
+        save_stats(path):
+            Add the totals to the statistics JSON at path (cumulative across runs).
+    '''
+    config = load_config("sim_config.json")["dataset"].get("sample_filter", {})
+    STAT_KEYS = (
+        "seen", "kept", "kept_first", "kept_vehicle_priority", "kept_moving", "kept_stationary",
+        "dropped_duplicate", "dropped_stationary", "kept_bev_bytes", "dropped_bev_bytes",
+    )
+
+    def __init__(self,
+                 stationary_speed=config.get("stationary_speed", 0.1),
+                 keep_every_k_stationary=config.get("keep_every_k_stationary", 10),
+                 bev_diff_threshold=config.get("bev_diff_threshold", 0.002),
+                 min_displacement=config.get("min_displacement", 0.05),
+                 min_speed_change=config.get("min_speed_change", 0.05),
+                 min_direction_change=config.get("min_direction_change", 0.1),
+                 vehicle_priority_radius=config.get("vehicle_priority_radius", 15.0),
+        ):
+        self.stationary_speed = float(stationary_speed)
+        self.keep_every_k_stationary = max(1, int(keep_every_k_stationary))
+        self.bev_diff_threshold = float(bev_diff_threshold)
+        self.min_displacement = float(min_displacement)
+        self.min_speed_change = float(min_speed_change)
+        self.min_direction_change = float(min_direction_change)
+        self.vehicle_priority_radius = float(vehicle_priority_radius)
+
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+        self.reset_episode()
+
+    def reset_episode(self):
+        self._last_kept = {}
+        self._stationary_run = {}
+        self._episode_stats = dict.fromkeys(self.STAT_KEYS, 0)
+
+    def commit_episode(self):
+        for key, value in self._episode_stats.items():
+            self.stats[key] += value
+        self.reset_episode()
+
+    def merge_stats(self, other):
+        for key, value in other.stats.items():
+            self.stats[key] += value
+
+    def _state_changed(self, last, location, target_speed, target_direction):
+        if np.linalg.norm(location[:2] - last["location"][:2]) >= self.min_displacement:
+            return True
+        if abs(target_speed - last["target_speed"]) >= self.min_speed_change:
+            return True
+        norms = np.linalg.norm(target_direction[:2]) * np.linalg.norm(last["target_direction"][:2])
+        if norms > 1e-6:
+            cos_angle = np.dot(target_direction[:2], last["target_direction"][:2]) / norms
+            if np.arccos(np.clip(cos_angle, -1.0, 1.0)) >= self.min_direction_change:
+                return True
+        return False
+
+    def keep(self, ped_info, vehicle_distance=float("inf")):
+        ped_id = ped_info.ped_id
+        bev = ped_info.state["bev_data"]
+        bev = np.zeros(0, dtype=np.uint8) if bev is None else np.asarray(bev)
+        location = np.asarray(ped_info.state["current_location"], dtype=np.float32)
+        speed = float(ped_info.state["speed"])
+        target_speed = float(ped_info.action["target_speed"])
+        target_direction = np.asarray(ped_info.action["target_direction"], dtype=np.float32)
+
+        last = self._last_kept.get(ped_id)
+        stationary = speed < self.stationary_speed and target_speed < self.stationary_speed
+
+        if self.vehicle_priority_radius > 0 and vehicle_distance <= self.vehicle_priority_radius:
+            reason = "kept_vehicle_priority"
+        elif last is None:
+            reason = "kept_first"
+        else:
+            bev_changed = (
+                self.bev_diff_threshold < 0
+                or (bev.size > 0 and last["bev"].shape != bev.shape)
+                or np.count_nonzero(bev != last["bev"]) > self.bev_diff_threshold * bev.size
+            )
+            if stationary:
+                run = self._stationary_run.get(ped_id, 0) + 1
+                self._stationary_run[ped_id] = run
+                reason = "kept_stationary" if bev_changed or run >= self.keep_every_k_stationary else "dropped_stationary"
+            elif bev_changed or self._state_changed(last, location, target_speed, target_direction):
+                reason = "kept_moving"
+            else:
+                reason = "dropped_duplicate"
+
+        self._episode_stats["seen"] += 1
+        self._episode_stats[reason] += 1
+        if reason.startswith("dropped"):
+            self._episode_stats["dropped_bev_bytes"] += bev.nbytes
+            return False
+
+        self._episode_stats["kept"] += 1
+        self._episode_stats["kept_bev_bytes"] += bev.nbytes
+        self._stationary_run[ped_id] = 0
+        self._last_kept[ped_id] = {
+            "bev": bev.copy(),
+            "location": location,
+            "target_speed": target_speed,
+            "target_direction": target_direction,
+        }
+        return True
+
+    def summary(self, stats=None):
+        stats = self.stats if stats is None else stats
+        seen = max(stats["seen"], 1)
+        dropped = stats["seen"] - stats["kept"]
+        return {
+            **stats,
+            "kept_fraction": stats["kept"] / seen,
+            "dropped_fraction": dropped / seen,
+            # Raw uint8 BEV bytes; the stored size scales with the dataset codec / packing
+            "dropped_bev_mb": stats["dropped_bev_bytes"] / 1e6,
+            # Every epoch of training visits dropped / seen fewer samples
+            "epoch_samples_saved_pct": 100.0 * dropped / seen,
+        }
+
+    def save_stats(self, path):
+        totals = dict.fromkeys(self.STAT_KEYS, 0)
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                previous = json.load(file)
+            for key in self.STAT_KEYS:
+                totals[key] += int(previous.get(key, 0))
+        for key in self.STAT_KEYS:
+            totals[key] += int(self.stats[key])
+        summary = self.summary(totals)
+        write_json_atomic(path, summary)
+        return summary
+
+
+def sample_filter_test(num_steps=200, seed=0):
+    '''Synthetic walker that stands for half of the episode: check the drop decisions and stats.'''
+    from types import SimpleNamespace
+
+    rng = np.random.default_rng(seed)
+    sample_filter = SampleFilter(keep_every_k_stationary=10, vehicle_priority_radius=15.0)
+    bev = np.zeros((64, 64, 5), dtype=np.uint8)
+    bev[20:40, :, 0] = 255
+    location = np.zeros(3, dtype=np.float32)
+    decisions = []
+    for t in range(num_steps):
+        moving = t < num_steps // 2
+        speed = 1.5 if moving else 0.0
+        if moving:
+            location = location + np.array([speed * 0.5, 0.0, 0.0], dtype=np.float32)
+        ped_info = SimpleNamespace(
+            ped_id=7,
+            state={"bev_data": bev, "current_location": location, "speed": speed},
+            action={"target_speed": speed, "target_direction": np.array([1.0, 0.0, 0.0], dtype=np.float32)},
+        )
+        vehicle_distance = 10.0 if t == num_steps - 5 else float(rng.uniform(30, 60))
+        decisions.append(sample_filter.keep(ped_info, vehicle_distance=vehicle_distance))
+    sample_filter.commit_episode()
+
+    summary = sample_filter.summary()
+    stationary_kept = sum(decisions[num_steps // 2:])
+    print(f"[sample_filter_test] {summary['kept']}/{summary['seen']} kept, "
+          f"{summary['dropped_bev_mb']:.2f} MB raw BEV dropped, stationary kept {stationary_kept}")
+    assert all(decisions[:num_steps // 2]), "moving samples must be kept"
+    assert decisions[num_steps - 5], "vehicle priority sample must be kept"
+    expected_stationary = (num_steps // 2) // 10 + 1
+    assert abs(stationary_kept - expected_stationary) <= 1, stationary_kept
+    return summary
+
+
+if __name__ == "__main__":
+    sample_filter_test()
@@ -1,8 +1,9 @@
 import carla
 import time
 import numpy as np
-import math
 from .config_loader import load_config
+from .nav_pool import NavPointPool
+from .spatial_index import ActorSpatialIndex
 import random
 
 class Spector:
@@ -207,12 +208,16 @@ class CrossroadPedestrians:
         in_intersection: Whether pedestrians should be spawned only near the intersection.
         speed: Walking speed assigned to the pedestrian AI controller.
         ped_goal_loc: Dictionary mapping pedestrian ID to its goal location.
+        nav_pool: Optional NavPointPool used to draw spawn points and destinations locally.
 
     Methods:
         get_ped_spawn_points(ped_num, in_intersection=True):
             Generate valid pedestrian spawn points either inside the intersection area or
             randomly across the map.
 
+        get_ped_destination():
+            Return one walking destination on the navigation mesh.
+
         spawn_single_walker(spawn_location, destination):
             Spawn one pedestrian and its AI controller, assign a destination, and store the
             pedestrian's goal location.
@@ -228,7 +233,8 @@ class CrossroadPedestrians:
                 dist=config["intersection"]["dist"], 
                 ped_num=config["pedestrian"]["ped_num"],
                 speed_range=config["pedestrian"]["speed_range"], 
-                in_intersection=True
+                in_intersection=True,
+                use_nav_pool=config["pedestrian"].get("nav_pool", {}).get("enabled", False),
             ):
         
         self.world = world
@@ -242,9 +248,16 @@ class CrossroadPedestrians:
         self.ped_controller = {}
         self.ped_controller_type = {}
         self.ped_goal_loc = {}
+
+        # Sample the navmesh once; spawn points and goals are then drawn without RPCs
+        self.nav_pool = NavPointPool(world, location, dist) if use_nav_pool else None
     
     
     def get_ped_spawn_points(self, ped_num, in_intersection=True):
+        if self.nav_pool is not None:
+            region = "intersection" if in_intersection else "map"
+            return self.nav_pool.sample_spawn_points(ped_num, region=region)
+
         spawn_points = []
         if in_intersection: # spawn within the intersection
             while len(spawn_points) < ped_num:
@@ -272,6 +285,12 @@ class CrossroadPedestrians:
         return spawn_points
 
 
+    def get_ped_destination(self) -> carla.Location:
+        if self.nav_pool is not None:
+            return self.nav_pool.sample_destination(region="map")
+        return self.world.get_random_location_from_navigation()
+
+
     def spawn_single_walker(
             self,
             spawn_location,
@@ -358,7 +377,7 @@ class CrossroadPedestrians:
         spawn_points = self.get_ped_spawn_points(self.ped_num, self.in_intersection)
         while spawned < self.ped_num:
             spawn_location = random.choice(spawn_points)
-            destination = self.world.get_random_location_from_navigation()
+            destination = self.get_ped_destination()
             destination.z += 1
             if self.spawn_single_walker(spawn_location, destination):
                 spawned += 1
@@ -373,6 +392,11 @@ class AggressiveVehicles:
     and configures the CARLA Traffic Manager so that the spawned vehicles behave more
     aggressively, such as driving faster and ignoring traffic lights or signs.
 
+    Candidate spawn transforms and car blueprints only depend on the town, the intersection,
+    dist_to_intersection and wp_step, so they are computed once and kept in a class-level
+    cache shared by every instance in the process. Vehicles are then spawned with one
+    batched SpawnActor + SetAutopilot request.
+
     Attributes:
         client: CARLA client object.
         world: CARLA world object.
@@ -383,13 +407,24 @@ class AggressiveVehicles:
         speed_diff: Percentage speed difference applied through the Traffic Manager. (how much % slower than speed limit)
         dist_lead: Desired distance to the leading vehicle.
         wp_step: Step size used when generating waypoints for candidate vehicle spawn points.
+        tm_port: Traffic Manager port.
+        use_spawn_cache: Whether to use cached candidates and batched spawning.
 
     Methods:
+        get_spawn_candidates():
+            Return the cached (spawn transforms, car blueprints) for this intersection.
+
         aggressive_vehicles_spawn():
-            Generate nearby vehicle spawn points, spawn vehicles, enable autopilot, and apply
-            aggressive Traffic Manager settings.
+            Spawn vehicles at shuffled candidate transforms with one batched request, enable
+            autopilot, and apply aggressive Traffic Manager settings.
+
+        aggressive_vehicles_spawn_uncached():
+            Original per-reset path: regenerate all town waypoints and spawn vehicles one by one.
+            Kept for latency comparison.
     '''
     config = load_config("sim_config.json")["simulation"]["vehicle"]
+    _candidate_cache = {}
+
     def __init__(self, client, world, location, 
                  veh_num=config["veh_num"], 
                  dist_to_intersection=config["dist_to_intersection"],
@@ -397,7 +432,9 @@ class AggressiveVehicles:
                  dist_lead=config["dist_lead"], 
                  wp_step=config["wp_step"],
                  signal_ignoring_rate=config["signal_ignoring_rate"],
-                 ped_ignoring_rate=config["ped_ignoring_rate"]
+                 ped_ignoring_rate=config["ped_ignoring_rate"],
+                 tm_port=config.get("tm_port", 8000),
+                 use_spawn_cache=config.get("use_spawn_cache", True),
         ):
         
         self.client = client
@@ -411,11 +448,87 @@ class AggressiveVehicles:
         self.wp_step = wp_step
         self.signal_ignoring_rate = signal_ignoring_rate
         self.ped_ignoring_rate = ped_ignoring_rate
+        self.tm_port = tm_port
+        self.use_spawn_cache = use_spawn_cache
+
+    def _get_traffic_manager(self):
+        tm = self.client.get_trafficmanager(self.tm_port)
+        tm.set_synchronous_mode(True)
+        return tm
+
+    def _apply_tm_settings(self, tm, vehicles, bulk=False):
+        if bulk:
+            # Every TM vehicle in this scenario is ours, so global settings are equivalent
+            tm.global_percentage_speed_difference(self.speed_diff)
+            tm.set_global_distance_to_leading_vehicle(self.dist_lead)
+
+        for v in vehicles:
+            if not bulk:
+                tm.vehicle_percentage_speed_difference(v, self.speed_diff)
+                tm.distance_to_leading_vehicle(v, self.dist_lead)
+            tm.ignore_lights_percentage(v, self.signal_ignoring_rate)               # ignore traffic lights
+            tm.ignore_signs_percentage(v, self.signal_ignoring_rate)                # ignore traffic signs
+            tm.ignore_walkers_percentage(v, self.ped_ignoring_rate)                 # ignore pedestrians
+
+    def get_spawn_candidates(self):
+        cache_key = (
+            self.world_map.name,
+            round(self.location.x, 2),
+            round(self.location.y, 2),
+            float(self.dist_to_intersection),
+            float(self.wp_step),
+        )
+        if cache_key in AggressiveVehicles._candidate_cache:
+            return AggressiveVehicles._candidate_cache[cache_key]
+
+        blueprint_library = self.world.get_blueprint_library()
+        vehicles_bp = [bp for bp in blueprint_library.filter('vehicle.*') 
+                    if bp.get_attribute('base_type') == 'car']              # get vehicles with base_type='car'
+        for bp in vehicles_bp:
+            if bp.has_attribute('role_name'):
+                bp.set_attribute('role_name', 'autopilot')
+
+        veh_wps = []
+        for wp in self.world_map.generate_waypoints(self.wp_step):
+            # Only spawn on driving lanes
+            if wp.lane_type != carla.LaneType.Driving:
+                continue
+            wp_tf = wp.transform
+            # Select waypoints within a certain distance to the intersection
+            if wp_tf.location.distance(self.location) < self.dist_to_intersection:
+                veh_wps.append(carla.Transform(wp_tf.location + carla.Location(z=1.0), wp_tf.rotation))
+
+        AggressiveVehicles._candidate_cache[cache_key] = (veh_wps, vehicles_bp)
+        return veh_wps, vehicles_bp
 
     def aggressive_vehicles_spawn(self):
+        if not self.use_spawn_cache:
+            return self.aggressive_vehicles_spawn_uncached()
+
+        tm = self._get_traffic_manager()
+        veh_wps, vehicles_bp = self.get_spawn_candidates()
+        veh_spawn_points = random.sample(veh_wps, min(self.veh_num, len(veh_wps)))
+
+        # One round trip for every spawn + autopilot pair
+        SpawnActor = carla.command.SpawnActor
+        SetAutopilot = carla.command.SetAutopilot
+        FutureActor = carla.command.FutureActor
+        batch = [
+            SpawnActor(random.choice(vehicles_bp), spawn_point).then(
+                SetAutopilot(FutureActor, True, tm.get_port())
+            )
+            for spawn_point in veh_spawn_points
+        ]
+        responses = self.client.apply_batch_sync(batch, False)
+
+        vehicle_ids = [response.actor_id for response in responses if not response.error]
+        vehicles = list(self.world.get_actors(vehicle_ids))
+        self._apply_tm_settings(tm, vehicles, bulk=True)
+        return vehicles
+
+    def aggressive_vehicles_spawn_uncached(self):
         # Traffic manager
-        tm = self.client.get_trafficmanager(8000)
-        tm.set_synchronous_mode(True)
+        tm = self._get_traffic_manager()
 
         # Spawning cars around the intersection
         blueprint_library = self.world.get_blueprint_library()
@@ -441,19 +554,14 @@ class AggressiveVehicles:
         random.shuffle(veh_wps)
         veh_spawn_points = veh_wps[:self.veh_num]
         vehicles = []
-        for i in range(self.veh_num):
-            veh = self.world.try_spawn_actor(random.choice(vehicle_bp), veh_spawn_points[i])
+        for spawn_point in veh_spawn_points:
+            veh = self.world.try_spawn_actor(random.choice(vehicle_bp), spawn_point)
             if veh:
                 vehicles.append(veh)
                 veh.set_autopilot(True, tm.get_port())
 
-
-        for v in vehicles:
-            tm.vehicle_percentage_speed_difference(v, self.speed_diff)
-            tm.distance_to_leading_vehicle(v, self.dist_lead)
-            tm.ignore_lights_percentage(v, self.signal_ignoring_rate)               # ignore traffic lights
-            tm.ignore_signs_percentage(v, self.signal_ignoring_rate)                # ignore traffic signs
-            tm.ignore_walkers_percentage(v, self.ped_ignoring_rate)                 # ignore pedestrians
+        self._apply_tm_settings(tm, vehicles)
+        return vehicles
 
 def cleanup_simulation(world):
     '''Safely destroys pedestrians and vehicles.'''
@@ -478,11 +586,14 @@ def cleanup_simulation(world):
     world.tick()
 
 
-def refresh_sim(world, refresh_conditions: dict, intersection_position: carla.Location):
-    
-    all_vehicles = world.get_actors().filter("vehicle.*")
-    all_walkers = world.get_actors().filter("walker.*")
-    current_time = world.get_snapshot().timestamp.elapsed_seconds
+def refresh_sim(world, refresh_conditions: dict, intersection_position: carla.Location, vehicle_ids=None):
+    '''
+    Check the refresh conditions of one intersection. With vehicle_ids only those vehicles
+    count for deadlock detection (the vehicles of one IntersectionRegion).
+    '''
+    snapshot = world.get_snapshot()
+    index = ActorSpatialIndex.for_tick(world, snapshot=snapshot)
+    current_time = snapshot.timestamp.elapsed_seconds
     veh_stuck_count = 0
     ped_count = 0
 
@@ -498,30 +609,29 @@ def refresh_sim(world, refresh_conditions: dict, intersection_position: carla.Lo
 
     elapsed_time = current_time - start_time
 
-    # Get stuck vehicles
-    for vehicle in all_vehicles:
-        v = vehicle.get_velocity()
-        speed = math.sqrt(v.x**2 + v.y**2 + v.z**2)
-        
+    # Get stuck vehicles (speeds of all vehicles from one snapshot)
+    vehicle_rows = np.flatnonzero(index.types == ActorSpatialIndex.TYPE_CODES["vehicle"])
+    if vehicle_ids is not None:
+        vehicle_rows = vehicle_rows[np.isin(index.ids[vehicle_rows], np.asarray(list(vehicle_ids), dtype=np.int64))]
+    speeds = np.linalg.norm(index.velocity[vehicle_rows], axis=1)
+    for vehicle_id, speed in zip(index.ids[vehicle_rows].tolist(), speeds):
         if speed < veh_vel_thres:
             # Start timer if not already tracking
-            if vehicle.id not in veh_stuck_tracker:
-                veh_stuck_tracker[vehicle.id] = current_time
+            if vehicle_id not in veh_stuck_tracker:
+                veh_stuck_tracker[vehicle_id] = current_time
             
             # Increment count only if stuck over the condition (s)
-            if (current_time - veh_stuck_tracker[vehicle.id]) > veh_stuck_time_limit:
+            if (current_time - veh_stuck_tracker[vehicle_id]) > veh_stuck_time_limit:
                 veh_stuck_count += 1
         else:
             # RESET: If the vehicle moves, remove it from tracker
-            if vehicle.id in veh_stuck_tracker:
-                del veh_stuck_tracker[vehicle.id]
+            if vehicle_id in veh_stuck_tracker:
+                del veh_stuck_tracker[vehicle_id]
     
-    # Get pedestrian count in the intersection
-    for walker in all_walkers:
-        walker_dist_to_intersection = walker.get_location().distance(intersection_position)
-        # Check if walker is within the intersection area
-        if walker_dist_to_intersection < min_ped_dist:
-            ped_count += 1
+    # Get pedestrian count in the intersection (strictly closer than min_ped_dist)
+    center = [intersection_position.x, intersection_position.y, intersection_position.z]
+    walker_rows = index.query_radius(center, min_ped_dist, actor_type="walker")
+    ped_count = int(np.sum(np.linalg.norm(index.xyz[walker_rows] - center, axis=1) < min_ped_dist))
 
 
     # Determine whether refreshing
@@ -562,4 +672,125 @@ def spawn_actors(world,
 
     # Warmup world
     for _ in range(config["simulation"]["warmup_ticks"]):
-        world.tick()
\ No newline at end of file
+        world.tick()
+
+
+def build_refresh_conditions(world, stuck_detection_config):
+    '''Fresh refresh_sim state from simulation.stuck_detection, starting now.'''
+    return {
+        "time_out": stuck_detection_config["time_out"],
+        "start time": world.get_snapshot().timestamp.elapsed_seconds,
+        "vehicle": {
+            "velocity_threshold": stuck_detection_config["vehicle"]["velocity_threshold"],
+            "stuck_tracker": {},
+            "stuck_time_limit": stuck_detection_config["vehicle"]["stuck_time_limit"],
+            "stuck_count_limit": stuck_detection_config["vehicle"]["stuck_count_limit"],
+        },
+        "pedestrian": {
+            "dist": stuck_detection_config["pedestrian"]["dist"],
+            "min_peds": stuck_detection_config["pedestrian"]["min_pedestrians"],
+        },
+    }
+
+
+def get_intersections(sim_config):
+    '''
+    Intersections of the scenario: simulation.intersections when it is a non-empty list,
+    otherwise the single simulation.intersection. Missing keys of a list entry are taken
+    from simulation.intersection.
+    '''
+    default = sim_config["intersection"]
+    intersections = sim_config.get("intersections") or [default]
+    return [{**default, **intersection} for intersection in intersections]
+
+
+class IntersectionRegion:
+    '''
+    One intersection of a multi-intersection scenario with its own actors and refresh state.
+
+    Several regions share one world and are advanced by the same world.tick(). Each region
+    only destroys, respawns and checks the vehicles and pedestrians it spawned, so refreshing
+    one deadlocked region leaves the others running.
+
+    Attributes:
+        world: CARLA world object.
+        name: Region name used in log messages.
+        location: Center location of the intersection.
+        aggressive_vehicles: AggressiveVehicles of this region.
+        crossroad_pedestrians: CrossroadPedestrians of this region.
+        vehicle_ids: IDs of the vehicles spawned by the last spawn().
+        refresh_conditions: refresh_sim state of this region.
+
+    Methods:
+        walker_ids():
+            IDs of the pedestrians spawned by this region.
+
+        cleanup():
+            Destroy this region's controllers, pedestrians and vehicles.
+
+        spawn(cleanup_world=False):
+            Respawn the region's actors (clearing the whole world first if requested) and
+            reset its refresh state.
+
+        check_refresh():
+            Run refresh_sim on this region's vehicles; returns (sim_state, should_refresh).
+    '''
+    config = load_config("sim_config.json")["simulation"]
+
+    def __init__(self, client, world, intersection: dict, name="intersection", tm_port=None):
+        self.world = world
+        self.name = name
+        self.location = carla.Location(x=intersection["x"], y=intersection["y"], z=intersection["z"])
+
+        vehicle_kwargs = {} if tm_port is None else {"tm_port": tm_port}
+        if "veh_num" in intersection:
+            vehicle_kwargs["veh_num"] = intersection["veh_num"]
+        self.aggressive_vehicles = AggressiveVehicles(client, world, location=self.location, **vehicle_kwargs)
+
+        pedestrian_kwargs = {"dist": intersection["dist"]}
+        if "ped_num" in intersection:
+            pedestrian_kwargs["ped_num"] = intersection["ped_num"]
+        self.crossroad_pedestrians = CrossroadPedestrians(world, location=self.location, **pedestrian_kwargs)
+
+        self.vehicle_ids = []
+        self.refresh_conditions = build_refresh_conditions(world, self.config["stuck_detection"])
+
+    def walker_ids(self):
+        return list(self.crossroad_pedestrians.ped_goal_loc.keys())
+
+    def cleanup(self):
+        # Stop controllers first to prevent them from trying to control dead walkers
+        for controller in self.crossroad_pedestrians.ped_controller.values():
+            if isinstance(controller, carla.Actor) and controller.is_alive:
+                controller.stop()
+                controller.destroy()
+
+        for actor in self.world.get_actors(self.walker_ids() + list(self.vehicle_ids)):
+            if actor.is_alive:
+                actor.destroy()
+        self.vehicle_ids = []
+        self.world.tick()
+
+    def spawn(self, cleanup_world=False):
+        if cleanup_world:
+            cleanup_simulation(self.world)
+        else:
+            self.cleanup()
+        self.crossroad_pedestrians.reset_pedestrians()
+
+        vehicles = self.aggressive_vehicles.aggressive_vehicles_spawn()
+        self.vehicle_ids = [vehicle.id for vehicle in vehicles]
+        self.crossroad_pedestrians.pedestrians_spawn()
+
+        # Warmup world
+        for _ in range(self.config["warmup_ticks"]):
+            self.world.tick()
+        self.refresh_conditions = build_refresh_conditions(self.world, self.config["stuck_detection"])
+
+    def check_refresh(self):
+        return refresh_sim(
+            world=self.world,
+            refresh_conditions=self.refresh_conditions,
+            intersection_position=self.location,
+            vehicle_ids=self.vehicle_ids,
+        )
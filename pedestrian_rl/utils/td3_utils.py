@@ -9,9 +9,13 @@ import cv2
 import numpy as np
 
 from ..data_collection.bev.bev_sample import BEVSample, BEVWrapper
+from ..data_collection.bev.bev_render_pool import build_bev_render_pool
 from .data_utils import rotate_local_to_world_2d, rotate_world_to_local_2d
 from ..models.td3_model import TD3Agent
 from .config_loader import load_config
+from .lane_grid import LaneTypeGrid
+from .collision_utils import GeometricCollisionDetector
+from .spatial_index import ActorSpatialIndex
 from .sim_utils import (
     AggressiveVehicles,
     CrossroadPedestrians,
@@ -103,6 +107,17 @@ class PedestrianRLEnv:
             location=self.intersection_position,
         )
         self.bev_wrapper = BEVWrapper(cfg=None, world=self.world)
+        self.bev_render_pool = build_bev_render_pool(self.bev_wrapper)
+
+        # Precomputed lane-type raster replaces per-step get_waypoint() calls
+        self.lane_grid = None
+        if sim_cfg.get("lane_grid", {}).get("enabled", False):
+            self.lane_grid = LaneTypeGrid(self.world_map, self.intersection_position)
+
+        # Opt-in: "geometry" replaces the per-episode collision sensor with snapshot-based OBB tests
+        self.collision_detector = None
+        if sim_cfg.get("collision", {}).get("mode", "sensor") == "geometry":
+            self.collision_detector = GeometricCollisionDetector(self.world)
 
         stuck_detection_cfg = sim_cfg["stuck_detection"]
         self.refresh_conditions = {
@@ -166,6 +181,9 @@ class PedestrianRLEnv:
     def close(self):
         '''Close environment resources.'''
         self.destroy_collision_sensor()
+        if self.bev_render_pool is not None:
+            self.bev_render_pool.close()
+            self.bev_render_pool = None
         cv2.destroyAllWindows()
 
     @staticmethod
@@ -202,14 +220,18 @@ class PedestrianRLEnv:
 
     def get_min_vehicle_distance(self, ped_location):
         '''Get minimum distance between target pedestrian and all vehicles.'''
-        vehicles = [veh for veh in self.world.get_actors().filter("vehicle.*") if veh.is_alive]
-        if len(vehicles) == 0:
+        index = ActorSpatialIndex.for_tick(self.world)
+        row, distance = index.nearest([ped_location.x, ped_location.y, ped_location.z], actor_type="vehicle")
+        if row is None:
             return 999.0
 
-        return float(min(veh.get_location().distance(ped_location) for veh in vehicles))
+        return float(distance)
 
     def is_on_driving_lane(self, ped_location):
         '''Check if pedestrian is on drivable lane.'''
+        if self.lane_grid is not None:
+            return self.lane_grid.is_driving(ped_location)
+
         wp = self.world_map.get_waypoint(
             ped_location,
             project_to_road=False,
@@ -221,7 +243,10 @@ class PedestrianRLEnv:
         '''Build one RL observation from current CARLA state.'''
         frame_id = self.world.get_snapshot().timestamp.frame
         self.last_bev_sample = BEVSample(actor=self.target_ped, bev_wrapper=self.bev_wrapper)
-        bev_data = self.last_bev_sample.get_bev().astype(np.float32)
+        if self.bev_render_pool is not None:
+            bev_data = self.bev_render_pool.render_many([self.target_ped])[0].astype(np.float32)
+        else:
+            bev_data = self.last_bev_sample.get_bev().astype(np.float32)
 
         current_location, velocity, speed = self.compute_velocity_speed(self.target_ped, frame_id)
         yaw_heading = math.radians(self.target_ped.get_transform().rotation.yaw)
@@ -357,7 +382,7 @@ class PedestrianRLEnv:
         # ----- spawn target pedestrian first -----
         while len(spawn_points) > 0 and self.target_ped is None:
             spawn_location = spawn_points.pop()
-            destination = self.world.get_random_location_from_navigation()
+            destination = self.crossroad_pedestrians.get_ped_destination()
 
             if destination is None:
                 continue
@@ -389,7 +414,7 @@ class PedestrianRLEnv:
         background_spawned = 0
         while background_spawned < background_target and len(spawn_points) > 0:
             spawn_location = spawn_points.pop()
-            destination = self.world.get_random_location_from_navigation()
+            destination = self.crossroad_pedestrians.get_ped_destination()
 
             if destination is None:
                 continue
@@ -418,7 +443,10 @@ class PedestrianRLEnv:
             for _ in range(self.warmup_ticks):
                 self.world.tick()
 
-        self.attach_collision_sensor()
+        if self.collision_detector is not None:
+            self.collision_detector.update_vehicles()
+        else:
+            self.attach_collision_sensor()
         self.refresh_conditions["start time"] = self.world.get_snapshot().timestamp.elapsed_seconds
         self.refresh_conditions["vehicle"]["stuck_tracker"] = {}
 
@@ -480,6 +508,11 @@ class PedestrianRLEnv:
             }
             return self.last_obs, 0.0, terminated, truncated, info
 
+        if self.collision_detector is not None:
+            hit = self.collision_detector.check([self.target_ped.id])
+            if hit[self.target_ped.id] is not None:
+                self.last_collision = True
+
         obs, debug_state = self.build_observation()
         self.last_obs = obs
 
@@ -727,6 +760,8 @@ def build_td3_agent(training_config, max_speed, device='cuda'):
         exploration_speed_noise=td3_params['exploration_speed_noise'],
         exploration_direction_noise=td3_params['exploration_direction_noise'],
         replay_capacity=td3_params['replay_capacity'],
+        replay_pack_bev=td3_params.get('replay_pack_bev', False),
+        replay_hero_channel=BEVWrapper.HERO_CHANNEL,
         dropout=td3_params['dropout'],
         device=device,
     )
@@ -0,0 +1,155 @@
+'''
+Trajectory-only recording.
+
+With dataset.recording.mode = "trajectory" the collector renders no BEVs. It logs the
+compact actor state of every sampled tick together with the pedestrian samples, and
+tools/render_trajectories.py renders BEV datasets from the log and a lane-type raster of
+the whole town (LaneTypeGrid.for_town, saved once per town) for any BEV size / range /
+pedestrian sizes / layer set, in parallel and without CARLA.
+
+    <trajectory log>.h5
+        attrs: town, static_raster (raster .npz path), static_lane_codes, fixed_delta_seconds
+        /episode_xxxxxxxxx/
+            ticks/frame_id          (T,)        sampled ticks, ascending
+            ticks/timestamp         (T,)
+            ticks/actor_offsets     (T + 1,)    actors of tick t are rows offsets[t]:offsets[t + 1]
+            actors/id               (R,)
+            actors/type             (R,)        ActorSpatialIndex.TYPE_CODES
+            actors/xyz              (R, 3)
+            actors/yaw              (R,)        radians
+            actors/velocity         (R, 3)
+            actors/extent           (R, 2)      bounding-box half sizes (x, y)
+            goals/ped_id            (G,)        goal of every walker of the region
+            goals/location          (G, 3)
+            /ped_<id>/              convert_to_dataset layout without the BEV dataset
+'''
+import os
+
+import h5py
+import numpy as np
+
+
+# Positions and yaw stay float64 so offline BEVs match BEVWrapper.render_many pixel for pixel
+ACTOR_COLUMNS = {
+    "id": np.int64,
+    "type": np.int8,
+    "xyz": np.float64,
+    "yaw": np.float64,
+    "velocity": np.float32,
+    "extent": np.float32,
+}
+
+
+def scene_from_index(index, timestamp):
+    '''Actor state of one tick from its ActorSpatialIndex (shared by all samples of the tick).'''
+    return {
+        "frame_id": int(index.frame),
+        "timestamp": float(getattr(timestamp, "elapsed_seconds", timestamp)),
+        "id": index.ids,
+        "type": index.types,
+        "xyz": index.xyz,
+        "yaw": index.yaw,
+        "velocity": index.velocity,
+        "extent": index.extents,
+    }
+
+
+def load_static_raster(path):
+    '''(grid, origin_xy, resolution) of a LaneTypeGrid .npz cache file; needs no CARLA.'''
+    with np.load(path) as data:
+        return data["grid"].astype(np.int32), tuple(float(v) for v in data["origin"]), float(data["resolution"])
+
+
+class TrajectoryLogWriter:
+    '''
+    Writer of a trajectory log (module docstring layout).
+
+    Attributes:
+        path: Path of the trajectory log HDF5 file.
+
+    Methods:
+        set_attrs(**attrs):
+            Store file-level metadata (town, static raster path, lane codes, ...).
+
+        write_episode(episode_idx, episode_data, goals=None):
+            Write one episode of PedestrianStateAction samples carrying their tick scene.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def set_attrs(self, **attrs):
+        with h5py.File(self.path, "a") as file:
+            for key, value in attrs.items():
+                file.attrs[key] = value
+
+    def write_episode(self, episode_idx, episode_data, goals=None):
+        # Imported here: data_utils pulls in CARLA / torch, reading a log does not
+        from .data_utils import episode_group_name, episode_ped_columns, write_ped_arrays
+
+        scenes = {}
+        for sample in episode_data:
+            if sample.scene is None:
+                raise ValueError(f"Sample of ped {sample.ped_id} has no tick scene; record with DataSampler(record_bev=False)")
+            scenes.setdefault(sample.scene["frame_id"], sample.scene)
+        frames = sorted(scenes)
+        offsets = np.concatenate([[0], np.cumsum([len(scenes[frame]["id"]) for frame in frames])])
+
+        episode_name = episode_group_name(episode_idx)
+        with h5py.File(self.path, "a") as file:
+            if episode_name in file:
+                del file[episode_name]
+            episode_grp = file.create_group(episode_name)
+
+            ticks_grp = episode_grp.create_group("ticks")
+            ticks_grp.create_dataset("frame_id", data=np.asarray(frames, dtype=np.int64))
+            ticks_grp.create_dataset(
+                "timestamp", data=np.asarray([scenes[frame]["timestamp"] for frame in frames], dtype=np.float64)
+            )
+            ticks_grp.create_dataset("actor_offsets", data=offsets.astype(np.int64))
+
+            actors_grp = episode_grp.create_group("actors")
+            for key, dtype in ACTOR_COLUMNS.items():
+                values = np.concatenate([np.asarray(scenes[frame][key], dtype=dtype) for frame in frames])
+                actors_grp.create_dataset(key, data=values, compression="gzip")
+
+            goals = goals or {}
+            goal_locations = [
+                [loc.x, loc.y, loc.z] if hasattr(loc, "x") else np.asarray(loc, dtype=np.float32)[:3]
+                for loc in goals.values()
+            ]
+            goals_grp = episode_grp.create_group("goals")
+            goals_grp.create_dataset("ped_id", data=np.asarray(list(goals.keys()), dtype=np.int64))
+            goals_grp.create_dataset("location", data=np.asarray(goal_locations, dtype=np.float32).reshape(-1, 3))
+
+            for ped_id, columns in episode_ped_columns(episode_data).items():
+                columns.pop("bev_data", None)
+                write_ped_arrays(episode_grp, ped_id, columns)
+
+        print(
+            f"[TrajectoryLogWriter] Saved {len(episode_data)} samples / {len(frames)} ticks "
+            f"to {self.path}::{episode_name}"
+        )
+        return episode_name
+
+
+def read_trajectory_episode(episode_grp):
+    '''
+    Load one logged episode: {"frame_id", "timestamp", "actor_offsets", "actors": {...},
+    "goals": {...}, "peds": {ped_id: write_ped_arrays columns without bev_data}}.
+    '''
+    episode = {key: episode_grp["ticks"][key][()] for key in ("frame_id", "timestamp", "actor_offsets")}
+    episode["actors"] = {key: episode_grp["actors"][key][()] for key in ACTOR_COLUMNS}
+    episode["goals"] = {key: episode_grp["goals"][key][()] for key in ("ped_id", "location")}
+
+    episode["peds"] = {}
+    for ped_name, ped_grp in episode_grp.items():
+        if not ped_name.startswith("ped_"):
+            continue
+        columns = {"frame_id": ped_grp["frame_id"][()], "timestamp": ped_grp["timestamp"][()]}
+        for group_name in ("state", "action"):
+            for key, dset in ped_grp[group_name].items():
+                columns[key] = dset[()]
+        episode["peds"][int(ped_name.split("_")[1])] = columns
+    return episode